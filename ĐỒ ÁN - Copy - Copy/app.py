@@ -1,13 +1,23 @@
 """
 Flask Application - TSP Solver với Greedy Best-First Search
 """
+import threading
+import time
 import webbrowser
 from flask import Flask, render_template, jsonify, request, send_from_directory
 from flask_cors import CORS
 import os
 
-from models import OSRMDistanceCalculator, GreedyBestFirstSearchTSP, UniformCostSearchTSP, AStarTSP
-from config import DEFAULT_CITIES, SCENARIOS, API_BASE_URL
+from models import create_distance_calculator, GreedyBestFirstSearchTSP, UniformCostSearchTSP, AStarTSP, HeldKarpTSP
+from models.cache import get_shared_cache
+from models.distance_calculator import pair_flight
+from models.incremental_matrix import IncrementalDistanceMatrix
+from models.algorithms.neighbors import NeighborLists
+from models.http_client import get_remote_stats
+from models.matrix_cache import MatrixCache, has_estimates, matrix_fingerprint
+from models.matrix_store import MatrixStore
+from models.providers import get_provider_chain
+from config import DEFAULT_CITIES, SCENARIOS, API_BASE_URL, DISTANCE_PROVIDER, DISTANCE_MATRIX_SYMMETRIC, MATRIX_STORE_DIR, WARMUP_ON_STARTUP, HELD_KARP_MAX_CITIES
 
 
 app = Flask(__name__)
@@ -22,6 +32,127 @@ current_scenario = 1  # Scenario hiện tại
 current_solution = None
 solving_steps = []
 
+# Memo các ma trận đã dựng xong - dùng lại khi danh sách thành phố không đổi
+matrix_cache = MatrixCache()
+
+# Ma trận đã dựng lưu ra đĩa (.npy, đọc lại bằng mmap) - dùng lại sau khi restart
+matrix_store = MatrixStore(MATRIX_STORE_DIR) if MATRIX_STORE_DIR else None
+
+# Ma trận của danh sách thành phố hiện tại, cập nhật dần khi thêm/xóa (tạo lần đầu khi cần)
+live_matrix = None
+live_matrix_lock = threading.Lock()
+
+# Trạng thái warm-up các scenario lúc khởi động (xem /api/health)
+warmup_status = {
+    'state': 'disabled',  # disabled | running | done | failed
+    'scenarios_ready': [],
+    'scenarios_total': len(SCENARIOS),
+    'elapsed': None,
+    'error': None
+}
+
+
+def get_live_matrix():
+    global live_matrix
+    # Nhiều request đầu tiên đến cùng lúc → chỉ tạo 1 ma trận sống
+    with live_matrix_lock:
+        if live_matrix is None:
+            live_matrix = IncrementalDistanceMatrix(create_distance_calculator())
+        return live_matrix
+
+
+def sync_live_matrix():
+    """
+    Cập nhật ma trận sống theo current_cities sau khi thêm/xóa thành phố
+    
+    Chưa có ma trận sống (chưa solve lần nào) → bỏ qua: lần solve tới dựng cả ma trận 1 lần
+    thay vì để request thêm/xóa đầu tiên phải chờ lấy N² ô.
+    """
+    if live_matrix is not None:
+        live_matrix.sync(current_cities)
+
+
+def load_or_build_matrix(key, cities, compute):
+    """
+    Ma trận đã lưu trên đĩa (mmap, không copy) hoặc compute() → (matrix, info) rồi lưu lại
+    
+    Ma trận có ô ước lượng (provider lỗi) không được lưu để lần sau lấy lại số thật.
+    Luôn kèm info['neighbors'] cho solver.
+    """
+    entry = matrix_store.load(key, cities) if matrix_store is not None else None
+    if entry is not None:
+        distance_matrix, info = entry
+        print(f"\n💽 Đọc ma trận {len(cities)}×{len(cities)} đã lưu ({key[:8]}.npy)")
+    else:
+        distance_matrix, info = compute()
+        if matrix_store is not None and not has_estimates(distance_matrix):
+            matrix_store.save(key, distance_matrix, cities, {
+                'approximate_cells': info['approximate_cells'],
+                'distance_sources': distance_matrix.source_counts()
+            })
+    info['neighbors'] = NeighborLists(distance_matrix)
+    return distance_matrix, info
+
+
+def get_distance_matrix(cities):
+    """
+    Lấy ma trận khoảng cách cho danh sách thành phố, dùng memo nếu đã tính trước đó
+    
+    Returns:
+        (distance_matrix, info): info['approximate_cells'] = các ô lấy gần đúng từ cache,
+            info['neighbors'] = NeighborLists tính sẵn cho solver
+    """
+    key = matrix_fingerprint(cities, DISTANCE_PROVIDER, DISTANCE_MATRIX_SYMMETRIC)
+    
+    def build():
+        # Chỉ lấy các hàng/cột của thành phố mới so với lần trước
+        live = get_live_matrix()
+        distance_matrix = live.snapshot(cities)
+        return distance_matrix, {'approximate_cells': list(live.approximate_cells)}
+    
+    # Request cùng danh sách thành phố đang dựng dở (tab khác) → chờ và dùng chung kết quả
+    distance_matrix, info, reused = matrix_cache.get_or_compute(key, lambda: load_or_build_matrix(key, cities, build))
+    if reused:
+        print(f"\n♻️  Dùng lại ma trận {len(cities)}×{len(cities)} đã tính (memo {key[:8]})")
+    return distance_matrix, info
+
+
+def warm_up_scenarios():
+    """
+    Dựng sẵn ma trận + dữ liệu solver cho mọi scenario và lưu vào memo
+    
+    Dùng calculator riêng (không đụng live_matrix của danh sách đang sửa); ma trận
+    đã lưu trên đĩa chỉ cần map lại, cặp đã có trong cache chỉ cần đọc lại. Request Solve đến trong lúc warm-up cùng
+    scenario sẽ chờ bản đang dựng (single-flight trong MatrixCache).
+    """
+    warmup_status.update(state='running', scenarios_ready=[], error=None)
+    start = time.perf_counter()
+    try:
+        calculator = create_distance_calculator()
+        for scenario_id, cities in SCENARIOS.items():
+            key = matrix_fingerprint(cities, DISTANCE_PROVIDER, DISTANCE_MATRIX_SYMMETRIC)
+            
+            def build(cities=cities):
+                distance_matrix = calculator.get_distance_matrix(cities, symmetric=DISTANCE_MATRIX_SYMMETRIC)
+                return distance_matrix, {'approximate_cells': list(calculator.approximate_cells)}
+            
+            matrix_cache.get_or_compute(key, lambda: load_or_build_matrix(key, cities, build))
+            warmup_status['scenarios_ready'].append(scenario_id)
+        warmup_status['state'] = 'done'
+        print(f"🔥 Warm-up xong {len(SCENARIOS)} scenario ({time.perf_counter() - start:.2f}s)")
+    except Exception as e:
+        warmup_status.update(state='failed', error=str(e))
+        print(f"⚠️ Warm-up lỗi: {e}")
+    finally:
+        warmup_status['elapsed'] = round(time.perf_counter() - start, 3)
+
+
+def start_warmup():
+    """Chạy warm_up_scenarios trên thread nền (server nhận request ngay)"""
+    thread = threading.Thread(target=warm_up_scenarios, name='scenario-warmup', daemon=True)
+    thread.start()
+    return thread
+
 
 @app.route('/')
 def index():
@@ -67,6 +198,8 @@ def add_city():
         return jsonify({'error': 'Missing data'}), 400
     
     current_cities[city_name] = (float(lat), float(lng))
+    # Lấy ngay hàng + cột của thành phố mới (2·N ô) thay vì dựng lại cả ma trận khi solve
+    sync_live_matrix()
     return jsonify({'success': True, 'cities': list(current_cities.items())})
 
 
@@ -75,6 +208,7 @@ def delete_city(city_name):
     """Xóa thành phố"""
     if city_name in current_cities:
         del current_cities[city_name]
+        sync_live_matrix()
         return jsonify({'success': True, 'cities': list(current_cities.items())})
     return jsonify({'error': 'City not found'}), 404
 
@@ -113,13 +247,16 @@ def solve_tsp():
     data = request.json or {}
     algorithm = data.get('algorithm', 'greedy')  # mặc định: greedy
     
+    if algorithm == 'held-karp' and len(current_cities) > HELD_KARP_MAX_CITIES:
+        return jsonify({'error': f'Held-Karp chỉ hỗ trợ tối đa {HELD_KARP_MAX_CITIES} thành phố '
+                                 f'(hiện có {len(current_cities)})'}), 400
+    
     solving_steps = []
     
     print(f"\n🚀 Bắt đầu giải bài toán TSP với thuật toán: {algorithm.upper()}...")
     
-    # Tính ma trận khoảng cách
-    calculator = OSRMDistanceCalculator()
-    distance_matrix = calculator.get_distance_matrix(current_cities)
+    # Tính ma trận khoảng cách (hoặc dùng lại từ memo)
+    distance_matrix, matrix_info = get_distance_matrix(current_cities)
     
     # Chọn thuật toán
     city_names = list(current_cities.keys())
@@ -128,13 +265,14 @@ def solve_tsp():
         solver = UniformCostSearchTSP(distance_matrix, city_names, current_cities)
     elif algorithm == 'astar':
         solver = AStarTSP(distance_matrix, city_names, current_cities)
+    elif algorithm == 'held-karp':
+        solver = HeldKarpTSP(distance_matrix, city_names, current_cities)
     else:  # mặc định greedy
-        solver = GreedyBestFirstSearchTSP(distance_matrix, city_names, current_cities)
+        solver = GreedyBestFirstSearchTSP(distance_matrix, city_names, current_cities, neighbors=matrix_info.get('neighbors'))
     
     def step_callback(step_info):
         solving_steps.append(step_info)
     
-    import time
     # Sử dụng perf_counter() cho độ chính xác cao hơn (nanosecond precision)
     start_time = time.perf_counter()
     route, total_distance = solver.solve(start_city=0, step_callback=step_callback)
@@ -169,7 +307,11 @@ def solve_tsp():
         'algorithm': algorithm,
         'time': elapsed_time,
         'nodes_explored': solver.nodes_explored,
-        'operations': solver.operations
+        'operations': solver.operations,
+        'approximate_distances': matrix_info['approximate_cells'],
+        'symmetric_matrix': bool(getattr(distance_matrix, 'symmetric', False)),
+        'distance_sources': distance_matrix.source_counts() or matrix_info.get('distance_sources'),
+        'heuristic_cache': solver.heuristic_cache.get_stats() if isinstance(solver, AStarTSP) else None
     })
 
 
@@ -183,9 +325,8 @@ def compare_algorithms():
     
     print("\n📊 Bắt đầu so sánh các thuật toán...")
     
-    # Tính ma trận khoảng cách
-    calculator = OSRMDistanceCalculator()
-    distance_matrix = calculator.get_distance_matrix(current_cities)
+    # Tính ma trận khoảng cách (hoặc dùng lại từ memo)
+    distance_matrix, matrix_info = get_distance_matrix(current_cities)
     city_names = list(current_cities.keys())
     
     results = {}
@@ -194,14 +335,21 @@ def compare_algorithms():
     algorithms = {
         'Greedy Best-First Search': GreedyBestFirstSearchTSP,
         'Uniform Cost Search (UCS)': UniformCostSearchTSP,
-        'A* Algorithm': AStarTSP
+        'A* Algorithm': AStarTSP,
+        'Held-Karp (DP)': HeldKarpTSP
     }
+    if len(current_cities) > HELD_KARP_MAX_CITIES:
+        # Bảng DP 2^N quá lớn → bỏ Held-Karp khỏi so sánh
+        print(f"  ⚠️ Bỏ qua Held-Karp: {len(current_cities)} > {HELD_KARP_MAX_CITIES} thành phố")
+        del algorithms['Held-Karp (DP)']
     
     for name, AlgorithmClass in algorithms.items():
         print(f"\n  🔄 Đang chạy {name}...")
-        solver = AlgorithmClass(distance_matrix, city_names, current_cities)
+        if AlgorithmClass is GreedyBestFirstSearchTSP:
+            solver = AlgorithmClass(distance_matrix, city_names, current_cities, neighbors=matrix_info.get('neighbors'))
+        else:
+            solver = AlgorithmClass(distance_matrix, city_names, current_cities)
         
-        import time
         # Sử dụng perf_counter() cho độ chính xác cao hơn
         start_time = time.perf_counter()
         route, total_distance = solver.solve(start_city=0, step_callback=None)
@@ -241,6 +389,32 @@ def compare_algorithms():
     })
 
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Server sống + đã warm-up xong chưa (ready=False khi warm-up đang chạy)"""
+    ready = warmup_status['state'] in ('disabled', 'done', 'failed')
+    return jsonify({
+        'status': 'ok',
+        'ready': ready,
+        'warmup': warmup_status
+    })
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Thống kê memo ma trận, cache khoảng cách và các tầng provider"""
+    stats = {'matrix_cache': matrix_cache.get_stats()}
+    if matrix_store is not None:
+        stats['matrix_store'] = matrix_store.get_stats()
+    if DISTANCE_PROVIDER in ('osrm', 'tiered'):
+        stats['distance_cache'] = get_shared_cache().get_stats()
+        stats['pair_flight'] = pair_flight.get_stats()
+        stats['remote'] = get_remote_stats()
+    if DISTANCE_PROVIDER == 'tiered':
+        stats['provider_tiers'] = get_provider_chain().get_stats()
+    return jsonify(stats)
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset():
     """Reset lại toàn bộ"""
@@ -253,11 +427,20 @@ def reset():
     return jsonify({'success': True, 'cities': list(current_cities.items())})
 
 
-def initialize_app():
-    """Khởi tạo ứng dụng"""
+def initialize_app(use_reloader=False):
+    """
+    Khởi tạo ứng dụng
+    
+    Args:
+        use_reloader: chạy bằng app.run(debug=True) → chỉ warm-up trong process con
+            phục vụ request, không phải process theo dõi file
+    """
     global current_cities
     current_cities = DEFAULT_CITIES.copy()
     
+    if WARMUP_ON_STARTUP and (not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_warmup()
+    
     print("="*70)
     print("🚀 TRAVELING SALESMAN PROBLEM - GREEDY BEST-FIRST SEARCH")
     print("="*70)
@@ -271,6 +454,6 @@ def initialize_app():
 
 
 if __name__ == "__main__":
-    initialize_app()
+    initialize_app(use_reloader=True)
     # webbrowser.open('http://localhost:5000')  # Comment out để tránh conflict
     app.run(debug=True, port=5000, host='127.0.0.1')  # debug=True để auto-reload khi save file
@@ -42,11 +42,55 @@ DEBUG_MODE = False
 # API Base URL - Dùng cho frontend khi chạy trên port khác
 API_BASE_URL = f'http://{SERVER_HOST}:{SERVER_PORT}'  # http://localhost:5000
 
+# Nguồn khoảng cách: 'osrm' (đường bộ thật, có cache), 'geodesic' (ước lượng offline)
+# hoặc 'road_network' (đường bộ thật, offline từ file OSM local - xem ROAD_NETWORK_FILE)
+# hoặc 'tiered' (hỏi lần lượt các tầng trong PROVIDER_CHAIN)
+DISTANCE_PROVIDER = 'osrm'
+# Thứ tự các tầng của provider 'tiered': tầng trước không có ô nào thì hỏi tầng sau
+# 'memory' (LRU trong RAM), 'disk' (cache khoảng cách), 'road_network' (bỏ qua nếu thiếu ROAD_NETWORK_FILE),
+# 'osrm', 'haversine' (ước lượng, luôn trả lời được)
+PROVIDER_CHAIN = ['memory', 'disk', 'road_network', 'osrm', 'haversine']
+MEMORY_CACHE_MAX_ENTRIES = 100000  # số ô tối đa của tầng 'memory'
+
 # Cấu hình OSRM
 OSRM_BASE_URL = "http://router.project-osrm.org/route/v1/driving"
-OSRM_TIMEOUT = 10  # seconds
-OSRM_DELAY = 0.1  # delay giữa các request (seconds)
+OSRM_TABLE_URL = "http://router.project-osrm.org/table/v1/driving"
+OSRM_PROFILE = 'driving'  # routing profile, là một phần của key cache
+OSRM_TABLE_MAX_COORDINATES = 100  # giới hạn số tọa độ / 1 request table (max-table-size của server)
+OSRM_MATRIX_MODE = 'table'  # 'table': lấy cả ma trận bằng /table, 'route': gọi /route từng cặp
+DISTANCE_MATRIX_SYMMETRIC = False  # True: chỉ lấy cặp i<j rồi lật sang j>i (coi khoảng cách 2 chiều bằng nhau)
+OSRM_TIMEOUT = 10  # seconds - timeout tối đa, thực tế tự giảm theo độ trễ quan sát được
+OSRM_TIMEOUT_MIN = 1.0  # seconds - timeout thích ứng không xuống dưới mức này
+OSRM_RETRIES = 2  # số lần thử lại khi lỗi kết nối / timeout / HTTP 429, 5xx
+OSRM_BACKOFF_BASE = 0.2  # seconds - chờ ngẫu nhiên trong [0, base·2^lần thử] trước khi thử lại
+OSRM_BACKOFF_MAX = 2.0  # seconds - trần thời gian chờ giữa 2 lần thử
+OSRM_BREAKER_THRESHOLD = 5  # số lỗi liên tiếp trước khi ngừng gọi OSRM (circuit breaker mở)
+OSRM_BREAKER_COOLDOWN = 30  # seconds - thời gian nghỉ trước khi thử gọi lại 1 request
+OSRM_DELAY = 0.1  # khoảng cách trung bình giữa các request (seconds) → tốc độ = 1 / OSRM_DELAY request/s
+OSRM_MAX_WORKERS = 8  # số request chạy song song tối đa (cũng là số token burst của rate limiter)
+
+# Cấu hình cache khoảng cách
+CACHE_BACKEND = 'sqlite'  # 'sqlite' (WAL, an toàn nhiều process) hoặc 'json' (file distance_cache.json)
+CACHE_JSON_FILE = 'distance_cache.json'
+CACHE_DB_FILE = 'distance_cache.db'  # lần đầu mở sẽ tự migrate dữ liệu từ CACHE_JSON_FILE
+CACHE_COORD_PRECISION = 5  # số chữ số thập phân của tọa độ trong key cache (5 ≈ 1.1 m)
+CACHE_SNAP_TOLERANCE_M = None  # vd 200: dùng lại cache của cặp điểm trong cùng ô lưới 200 m (None = tắt)
+CACHE_WRITE_BEHIND = True  # JSON: buffer thay đổi trong RAM, ghi file theo lô
+CACHE_FLUSH_INTERVAL = 5.0  # JSON: ghi file chậm nhất sau bao nhiêu giây kể từ thay đổi đầu tiên
+CACHE_RELOAD_CHECK_INTERVAL = 1.0  # JSON: tra cứu kiểm tra mtime/size file (process khác vừa ghi) tối đa 1 lần / bao nhiêu giây
+MATRIX_STORE_DIR = 'matrix_store'  # lưu ma trận đã dựng ra .npy (đọc lại bằng mmap sau khi restart), None = tắt
+MATRIX_CACHE_SIZE = 16  # số ma trận N×N đã dựng xong giữ trong RAM (LRU theo danh sách thành phố, 0 = tắt)
+WARMUP_ON_STARTUP = False  # True: dựng sẵn ma trận mọi SCENARIOS trên thread nền khi khởi động (gọi OSRM ngay lúc start, xem /api/health)
 
 # Cấu hình thuật toán
 ANIMATION_DELAY = 0.5  # seconds giữa các bước animation
 GEODESIC_MULTIPLIER = 1.3  # nhân tố ước lượng khi OSRM fail
+GEODESIC_METHOD = 'haversine'  # 'haversine' (nhanh) hoặc 'vincenty' (ellipsoid WGS-84, chính xác hơn)
+HELD_KARP_MAX_CITIES = 20  # Held-Karp cần bộ nhớ 2^(N-1)·(N-1)·5 byte (20 thành phố ≈ 50 MB) → nhiều hơn thì trả lỗi 400
+MST_CACHE_MAX_ENTRIES = 100000  # A*: số tập chưa thăm tối đa giữ trong memo heuristic MST (mỗi entry: MST + các cạnh nối đã tính)
+VECTORIZED_PRIM_MIN_NODES = 40  # A*: Prim của heuristic dùng NumPy khi tập từ số node này trở lên (nhỏ hơn thì list Python nhanh hơn - xem tools/bench_prim.py)
+
+# Mạng lưới đường offline (DISTANCE_PROVIDER = 'road_network')
+ROAD_NETWORK_FILE = 'road_network.npz'  # .npz (tools/build_road_network.py), .osm (XML) hoặc .osm.pbf (cần pyosmium)
+ROAD_NETWORK_SNAP_MAX_M = 5000  # thành phố xa node đường gần nhất hơn mức này → dùng ước lượng đường chim bay
+ROAD_NETWORK_CH_DIR = 'road_network.ch'  # thư mục chỉ mục contraction hierarchy (build bằng tools/build_road_network.py --ch), không có → Dijkstra
@@ -1,14 +1,24 @@
 # Models package
-from .distance_calculator import OSRMDistanceCalculator
+from .distance_calculator import OSRMDistanceCalculator, GeodesicDistanceCalculator, RoadNetworkDistanceCalculator, create_distance_calculator
+from .distance_matrix import DistanceMatrix
+from .providers import ProviderChain, TieredDistanceCalculator
 
 # Expose algorithm implementations from the algorithms package
 from .algorithms.greedy import GreedyBestFirstSearchTSP
 from .algorithms.uniform_cost_search import UniformCostSearchTSP
 from .algorithms.astar import AStarTSP
+from .algorithms.held_karp import HeldKarpTSP
 
 __all__ = [
 	'OSRMDistanceCalculator',
+	'GeodesicDistanceCalculator',
+	'RoadNetworkDistanceCalculator',
+	'create_distance_calculator',
+	'DistanceMatrix',
+	'ProviderChain',
+	'TieredDistanceCalculator',
 	'GreedyBestFirstSearchTSP',
 	'UniformCostSearchTSP',
-	'AStarTSP'
+	'AStarTSP',
+	'HeldKarpTSP'
 ]
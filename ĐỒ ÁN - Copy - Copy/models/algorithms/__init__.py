@@ -2,5 +2,6 @@
 from .greedy import GreedyBestFirstSearchTSP
 from .uniform_cost_search import UniformCostSearchTSP
 from .astar import AStarTSP
+from .held_karp import HeldKarpTSP
 
-__all__ = ['GreedyBestFirstSearchTSP', 'UniformCostSearchTSP', 'AStarTSP']
+__all__ = ['GreedyBestFirstSearchTSP', 'UniformCostSearchTSP', 'AStarTSP', 'HeldKarpTSP']
@@ -1,6 +1,9 @@
 import time
 import heapq
 
+from .heuristics import MSTHeuristic
+from .state import NodeArena, distance_rows, full_mask, is_visited, state_key, city_bits, visit
+
 class AStarTSP:
     """
     A* Search CHÍNH XÁC cho TSP.
@@ -10,25 +13,30 @@ class AStarTSP:
     - g(n): chi phí thực tế từ start đến node hiện tại
     - h(n): heuristic ước lượng chi phí từ node hiện tại đến goal
     - Mỗi node/state: (thành phố hiện tại, tập thành phố đã thăm, đường đi, g(n))
+      (tập đã thăm là bitmask số nguyên, đường đi là chỉ số node trong NodeArena - xem state.py)
     - Luôn expand node có f(n) nhỏ nhất
     - Nếu h(n) admissible (không overestimate) → A* đảm bảo tối ưu
     - A* = UCS khi h(n) = 0
     
     Heuristic cho TSP:
-    - MST (Minimum Spanning Tree) của các thành phố chưa thăm + chi phí về start
+    - MST (Minimum Spanning Tree) của các thành phố chưa thăm + start
+      + cạnh ngắn nhất từ thành phố hiện tại ra tập chưa thăm
+    - MST chỉ phụ thuộc tập chưa thăm → memo LRU (heuristic_cache)
     - Đây là admissible heuristic vì MST <= actual tour cost
     """
 
     def __init__(self, distance_matrix, city_names, coordinates):
         self.distance_matrix = distance_matrix
+        self._dist = distance_rows(distance_matrix)
         self.city_names = city_names
         self.coordinates = coordinates
         self.n_cities = len(city_names)
+        self.heuristic_cache = MSTHeuristic(self._dist, self.n_cities)
         self.steps = []
         self.nodes_explored = 0
         self.operations = 0
 
-    def heuristic(self, current_city, visited_set, start_city):
+    def heuristic(self, current_city, visited_mask, start_city):
         """
         Heuristic admissible cho TSP: MST của thành phố chưa thăm
         
@@ -36,50 +44,10 @@ class AStarTSP:
         1. Thăm tất cả thành phố chưa thăm
         2. Quay về start
         
-        Sử dụng Prim's algorithm để tính MST
+        = MST(chưa thăm ∪ {start}) (Prim, memo theo tập chưa thăm - xem heuristics.py)
+        + cạnh ngắn nhất từ current_city tới 1 thành phố chưa thăm
         """
-        unvisited = [city for city in range(self.n_cities) if city not in visited_set]
-        
-        if not unvisited:
-            # Tất cả đã thăm, chỉ cần quay về start
-            return self.distance_matrix[current_city][start_city]
-        
-        # MST của unvisited cities + current + start
-        all_nodes = [current_city] + unvisited + [start_city]
-        
-        if len(all_nodes) <= 2:
-            # Chỉ có current và start
-            return self.distance_matrix[current_city][start_city]
-        
-        # Prim's algorithm để tính MST
-        mst_cost = 0
-        in_mst = [False] * len(all_nodes)
-        min_edge = [float('inf')] * len(all_nodes)
-        min_edge[0] = 0  # Bắt đầu từ current_city
-        
-        for _ in range(len(all_nodes)):
-            # Tìm node chưa trong MST có min_edge nhỏ nhất
-            u = -1
-            for i in range(len(all_nodes)):
-                if not in_mst[i] and (u == -1 or min_edge[i] < min_edge[u]):
-                    u = i
-            
-            if min_edge[u] == float('inf'):
-                break
-            
-            in_mst[u] = True
-            mst_cost += min_edge[u]
-            
-            # Update min_edge cho các node kề
-            for v in range(len(all_nodes)):
-                if not in_mst[v]:
-                    node_u = all_nodes[u]
-                    node_v = all_nodes[v]
-                    edge_cost = self.distance_matrix[node_u][node_v]
-                    if edge_cost < min_edge[v]:
-                        min_edge[v] = edge_cost
-        
-        return mst_cost
+        return self.heuristic_cache(current_city, visited_mask, start_city)
 
     def solve(self, start_city=0, step_callback=None):
         """
@@ -98,19 +66,24 @@ class AStarTSP:
         self.steps = []
         self.nodes_explored = 0
         self.operations = 0
+        self.heuristic_cache.clear()
         
-        # Initial state: (f_cost, g_cost, current_city, visited_frozenset, path)
+        # Initial state: (g_cost, current_city, visited_mask, node)
+        # node là chỉ số trong arena, đường đi = arena.path(node)
+        bits = city_bits(self.n_cities)
+        goal_mask = full_mask(self.n_cities)
         initial_g = 0
-        initial_h = self.heuristic(start_city, frozenset([start_city]), start_city)
+        initial_h = self.heuristic(start_city, visit(0, start_city), start_city)
         initial_f = initial_g + initial_h
-        initial_state = (initial_g, start_city, frozenset([start_city]), [start_city])
+        arena = NodeArena()
+        initial_state = (initial_g, start_city, visit(0, start_city), arena.add(start_city))
         
         # Priority queue: (f_cost, counter, state_tuple)
         frontier = []
         counter = 0
         heapq.heappush(frontier, (initial_f, counter, initial_state))
         
-        # Explored states: Key = (current_city, visited_frozenset), Value = g_cost
+        # Explored states: Key = state_key(visited_mask, current_city), Value = g_cost
         explored = {}
         
         # Bước khởi đầu
@@ -140,22 +113,22 @@ class AStarTSP:
             self.operations += 1
             # Lấy state có f(n) nhỏ nhất
             f_cost, _, state = heapq.heappop(frontier)
-            g_cost, current_city, visited_set, path = state[0], state[1], state[2], state[3]
+            g_cost, current_city, visited_mask, node = state[0], state[1], state[2], state[3]
             
             # Kiểm tra xem state này đã explored chưa
-            state_key = (current_city, visited_set)
-            if state_key in explored and explored[state_key] <= g_cost:
+            current_key = state_key(visited_mask, current_city, bits)
+            if current_key in explored and explored[current_key] <= g_cost:
                 continue  # Đã có đường đi tốt hơn
             
-            explored[state_key] = g_cost
+            explored[current_key] = g_cost
             self.nodes_explored += 1
             
             # Goal test: đã thăm tất cả thành phố?
-            if len(visited_set) == self.n_cities:
+            if visited_mask == goal_mask:
                 # Tìm được solution! Thêm quay về start
-                return_cost = self.distance_matrix[current_city][start_city]
+                return_cost = self._dist[current_city][start_city]
                 total_cost = g_cost + return_cost
-                final_path = list(path) + [start_city]
+                final_path = arena.path(node) + [start_city]
                 
                 best_solution = (final_path, total_cost)
                 
@@ -186,25 +159,23 @@ class AStarTSP:
             successors = []
             
             for next_city in range(self.n_cities):
-                if next_city not in visited_set:
+                if not is_visited(visited_mask, next_city):
                     self.operations += 1
                     # Tính chi phí đến next_city
-                    edge_cost = self.distance_matrix[current_city][next_city]
+                    edge_cost = self._dist[current_city][next_city]
                     new_g_cost = g_cost + edge_cost
                     
                     # Tạo successor state
-                    new_visited = visited_set | frozenset([next_city])
-                    new_path = list(path) + [next_city]
+                    new_visited = visit(visited_mask, next_city)
                     
                     # Tính heuristic h(n) cho successor
                     h_cost = self.heuristic(next_city, new_visited, start_city)
                     new_f_cost = new_g_cost + h_cost
                     
-                    successor_state = (new_g_cost, next_city, new_visited, new_path)
-                    
                     # Kiểm tra xem có nên thêm successor vào frontier không
-                    successor_key = (next_city, new_visited)
+                    successor_key = state_key(new_visited, next_city, bits)
                     if successor_key not in explored or explored[successor_key] > new_g_cost:
+                        successor_state = (new_g_cost, next_city, new_visited, arena.add(next_city, node))
                         counter += 1
                         heapq.heappush(frontier, (new_f_cost, counter, successor_state))
                         successors.append((new_f_cost, successor_state))
@@ -225,7 +196,7 @@ class AStarTSP:
                 if successors:
                     next_f, next_state = min(successors, key=lambda x: x[0])
                     next_city_idx = next_state[1]
-                    next_distance = self.distance_matrix[current_city][next_city_idx]
+                    next_distance = self._dist[current_city][next_city_idx]
                 else:
                     next_city_idx = candidates[0]['city_idx']
                     next_distance = candidates[0]['distance']
@@ -238,10 +209,10 @@ class AStarTSP:
                     'next_idx': next_city_idx,
                     'distance': next_distance,
                     'g': g_cost,
-                    'heuristic': self.heuristic(current_city, visited_set, start_city),
+                    'heuristic': self.heuristic(current_city, visited_mask, start_city),
                     'f': f_cost,
                     'total_distance': g_cost,
-                    'visited': list(path),
+                    'visited': arena.path(node),
                     'candidates': candidates,
                     'frontier_size': len(frontier)
                 })
@@ -17,13 +17,15 @@ So với A* và UCS:
 import time
 import heapq
 
+from .state import NodeArena, distance_rows, full_mask, is_visited, state_key, city_bits, unvisited_cities, visit
+
 
 class GreedyBestFirstSearchTSP:
     """Greedy Best-First Search CHÍNH XÁC cho TSP.
 
     Triển khai đúng theo lý thuyết:
     - State space search với priority queue
-    - Mỗi state = (heuristic h(n), thành phố hiện tại, visited set, đường đi)
+    - Mỗi state = (heuristic h(n), thành phố hiện tại, visited bitmask, node trong NodeArena)
     - Luôn expand state có h(n) nhỏ nhất
     - CHỈ dùng heuristic, KHÔNG dùng chi phí thực tế g(n)
     - KHÔNG đảm bảo tối ưu
@@ -32,10 +34,15 @@ class GreedyBestFirstSearchTSP:
     - Ước lượng chi phí còn lại để hoàn thành tour
     - Có thể dùng: khoảng cách đến start, MST của thành phố chưa thăm, etc.
     - Ở đây dùng: tổng khoảng cách nhỏ nhất từ các thành phố chưa thăm về start
+
+    neighbors (NeighborLists, tùy chọn): danh sách láng giềng đã sắp xếp tính sẵn
+    → heuristic chỉ duyệt tới thành phố chưa thăm gần nhất thay vì quét cả hàng
     """
 
-    def __init__(self, distance_matrix, city_names, coordinates):
+    def __init__(self, distance_matrix, city_names, coordinates, neighbors=None):
         self.distance_matrix = distance_matrix
+        self._dist = distance_rows(distance_matrix)
+        self.neighbors = neighbors
         self.city_names = city_names
         self.coordinates = coordinates
         self.n_cities = len(city_names)
@@ -43,7 +50,7 @@ class GreedyBestFirstSearchTSP:
         self.nodes_explored = 0
         self.operations = 0
 
-    def heuristic(self, current_city, visited_set, start_city):
+    def heuristic(self, current_city, visited_mask, start_city):
         """
         Heuristic h(n) cho Greedy Best-First Search
         
@@ -54,16 +61,22 @@ class GreedyBestFirstSearchTSP:
         Lưu ý: Greedy không yêu cầu heuristic admissible như A*
         Có thể dùng heuristic "lạc quan" (optimistic) hoặc "bi quan" (pessimistic)
         """
-        unvisited = [city for city in range(self.n_cities) if city not in visited_set]
+        unvisited = unvisited_cities(visited_mask, self.n_cities)
         
         if not unvisited:
             # Tất cả đã thăm, chỉ cần quay về start
-            return self.distance_matrix[current_city][start_city]
+            return self._dist[current_city][start_city]
+        
+        if self.neighbors is not None:
+            # Láng giềng đã sắp xếp: thành phố chưa thăm đầu tiên là gần nhất
+            nearest = self.neighbors.first_unvisited(self.neighbors.nearest[current_city], visited_mask)
+            nearest_to_start = self.neighbors.first_unvisited(self.neighbors.nearest_to[start_city], visited_mask)
+            return self._dist[current_city][nearest] + self._dist[nearest_to_start][start_city]
         
         # Heuristic: tổng khoảng cách nhỏ nhất từ current đến unvisited + về start
         # Cách 1: khoảng cách min từ current đến bất kỳ unvisited + về start
-        min_to_unvisited = min(self.distance_matrix[current_city][city] for city in unvisited)
-        min_from_unvisited_to_start = min(self.distance_matrix[city][start_city] for city in unvisited)
+        min_to_unvisited = min(self._dist[current_city][city] for city in unvisited)
+        min_from_unvisited_to_start = min(self._dist[city][start_city] for city in unvisited)
         
         # Ước lượng đơn giản: min edge + return to start
         return min_to_unvisited + min_from_unvisited_to_start
@@ -88,10 +101,14 @@ class GreedyBestFirstSearchTSP:
         self.nodes_explored = 0
         self.operations = 0
         
-        # Initial state: (h_cost, current_city, visited_frozenset, path, g_cost)
+        # Initial state: (current_city, visited_mask, node, g_cost)
+        # node là chỉ số trong arena, đường đi = arena.path(node)
         # g_cost chỉ để tracking, KHÔNG dùng trong việc chọn state
-        initial_h = self.heuristic(start_city, frozenset([start_city]), start_city)
-        initial_state = (start_city, frozenset([start_city]), [start_city], 0)
+        bits = city_bits(self.n_cities)
+        goal_mask = full_mask(self.n_cities)
+        initial_h = self.heuristic(start_city, visit(0, start_city), start_city)
+        arena = NodeArena()
+        initial_state = (start_city, visit(0, start_city), arena.add(start_city), 0)
         
         # Priority queue: (h_cost, counter, state_tuple)
         # Sắp xếp theo h(n) only (greedy)
@@ -100,7 +117,7 @@ class GreedyBestFirstSearchTSP:
         heapq.heappush(frontier, (initial_h, counter, initial_state))
         
         # Explored states để tránh lặp
-        # Key: (current_city, visited_frozenset)
+        # Key: state_key(visited_mask, current_city) = mask << bits | city
         explored = set()
         
         # Bước khởi đầu
@@ -128,22 +145,22 @@ class GreedyBestFirstSearchTSP:
             self.operations += 1
             # Lấy state có h(n) nhỏ nhất (GREEDY - chỉ nhìn vào heuristic)
             h_cost, _, state = heapq.heappop(frontier)
-            current_city, visited_set, path, g_cost = state[0], state[1], state[2], state[3]
+            current_city, visited_mask, node, g_cost = state[0], state[1], state[2], state[3]
             
             # Kiểm tra xem state này đã explored chưa
-            state_key = (current_city, visited_set)
-            if state_key in explored:
+            current_key = state_key(visited_mask, current_city, bits)
+            if current_key in explored:
                 continue  # Đã explore state này rồi
             
-            explored.add(state_key)
+            explored.add(current_key)
             self.nodes_explored += 1
             
             # Goal test: đã thăm tất cả thành phố?
-            if len(visited_set) == self.n_cities:
+            if visited_mask == goal_mask:
                 # Tìm được solution! Thêm quay về start
-                return_cost = self.distance_matrix[current_city][start_city]
+                return_cost = self._dist[current_city][start_city]
                 total_cost = g_cost + return_cost
-                final_path = list(path) + [start_city]
+                final_path = arena.path(node) + [start_city]
                 
                 best_solution = (final_path, total_cost)
                 
@@ -172,24 +189,22 @@ class GreedyBestFirstSearchTSP:
             successors = []
             
             for next_city in range(self.n_cities):
-                if next_city not in visited_set:
+                if not is_visited(visited_mask, next_city):
                     self.operations += 1
                     # Tính chi phí edge (chỉ để tracking, không dùng trong selection)
-                    edge_cost = self.distance_matrix[current_city][next_city]
+                    edge_cost = self._dist[current_city][next_city]
                     new_g_cost = g_cost + edge_cost
                     
                     # Tạo successor state
-                    new_visited = visited_set | frozenset([next_city])
-                    new_path = list(path) + [next_city]
+                    new_visited = visit(visited_mask, next_city)
                     
                     # Tính heuristic h(n) cho successor - ĐÂY LÀ TIÊU CHÍ DUY NHẤT
                     h_cost_successor = self.heuristic(next_city, new_visited, start_city)
                     
-                    successor_state = (next_city, new_visited, new_path, new_g_cost)
-                    
                     # Kiểm tra xem có nên thêm successor vào frontier không
-                    successor_key = (next_city, new_visited)
+                    successor_key = state_key(new_visited, next_city, bits)
                     if successor_key not in explored:
+                        successor_state = (next_city, new_visited, arena.add(next_city, node), new_g_cost)
                         counter += 1
                         # Priority theo h(n) only (GREEDY)
                         heapq.heappush(frontier, (h_cost_successor, counter, successor_state))
@@ -209,7 +224,7 @@ class GreedyBestFirstSearchTSP:
                 if successors:
                     next_h, next_state = min(successors, key=lambda x: x[0])
                     next_city_idx = next_state[0]
-                    next_distance = self.distance_matrix[current_city][next_city_idx]
+                    next_distance = self._dist[current_city][next_city_idx]
                 else:
                     next_city_idx = candidates[0]['city_idx']
                     next_distance = candidates[0]['distance']
@@ -223,7 +238,7 @@ class GreedyBestFirstSearchTSP:
                     'distance': next_distance,
                     'heuristic': h_cost,
                     'total_distance': g_cost,
-                    'visited': list(path),
+                    'visited': arena.path(node),
                     'candidates': candidates,
                     'frontier_size': len(frontier)
                 })
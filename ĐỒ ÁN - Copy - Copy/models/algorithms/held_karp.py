@@ -0,0 +1,160 @@
+"""
+Held-Karp (quy hoạch động trên tập con) CHÍNH XÁC cho TSP.
+
+THUẬT TOÁN HELD-KARP:
+- Bỏ start ra, đánh số lại m = N - 1 thành phố còn lại là 0..m-1
+- cost[mask, j] = chi phí nhỏ nhất đi từ start, thăm đúng các thành phố trong mask,
+  kết thúc tại j (j thuộc mask)
+- cost[{j}, j] = d(start, j)
+- cost[mask, j] = min_k cost[mask \\ {j}, k] + d(k, j)   (k thuộc mask \\ {j})
+- Tour tối ưu = min_j cost[tất cả, j] + d(j, start), dò ngược parent để lấy đường đi
+- O(2ⁿ·n²) phép tính, O(2ⁿ·n) bộ nhớ - biết trước, không phụ thuộc dữ liệu
+  (khác UCS / A* có frontier không giới hạn)
+
+Cài đặt:
+- Tính theo từng lớp kích thước tập con; mỗi (lớp, j) là 1 phép NumPy trên mọi
+  mask chứa j: cost[mask ^ (1 << j), :] + d[:, j] rồi argmin theo k
+- Bảng cost float32 (4 byte/ô), parent uint8 (1 byte/ô): N = 20 → ~50 MB
+"""
+import time
+
+import numpy as np
+
+from .state import distance_rows
+
+# Giá trị parent của ô cost[{j}, j]: thành phố trước j là start
+NO_PARENT = 255
+
+
+def table_bytes(n_cities):
+    """Bộ nhớ 2 bảng cost + parent (byte) cho N thành phố"""
+    m = max(n_cities - 1, 0)
+    return (1 << m) * m * (np.dtype(np.float32).itemsize + np.dtype(np.uint8).itemsize)
+
+
+class HeldKarpTSP:
+    """Held-Karp CHÍNH XÁC cho TSP.
+    
+    - Quy hoạch động trên tập con (bitmask) thay vì tìm kiếm trên cây trạng thái
+    - Đảm bảo tối ưu, thời gian và bộ nhớ chỉ phụ thuộc N
+    - Bảng parent uint8 → tối đa 256 thành phố về lý thuyết, thực tế ~20 (bộ nhớ 2ⁿ)
+    """
+    
+    def __init__(self, distance_matrix, city_names, coordinates):
+        self.distance_matrix = distance_matrix
+        self._dist = distance_rows(distance_matrix)
+        self.city_names = city_names
+        self.coordinates = coordinates
+        self.n_cities = len(city_names)
+        self.steps = []
+        self.nodes_explored = 0
+        self.operations = 0
+    
+    def _solve_tables(self, others, start_city):
+        """
+        Điền bảng cost / parent
+        
+        Returns:
+            (cost, parent): ndarray (2^m, m) float32 và uint8
+        """
+        m = len(others)
+        matrix = np.array(self._dist, dtype=np.float64).reshape(self.n_cities, self.n_cities)
+        # d[k, j] giữa các thành phố đã đánh số lại
+        d = matrix[np.ix_(others, others)].astype(np.float32)
+        
+        cost = np.full((1 << m, m), np.inf, dtype=np.float32)
+        parent = np.full((1 << m, m), NO_PARENT, dtype=np.uint8)
+        singles = 1 << np.arange(m)
+        cost[singles, np.arange(m)] = matrix[start_city, others]
+        self.nodes_explored = m
+        
+        masks = np.arange(1 << m)
+        sizes = np.zeros(1 << m, dtype=np.int64)
+        for bit in range(m):
+            sizes += (masks >> bit) & 1
+        
+        for size in range(2, m + 1):
+            layer = masks[sizes == size]
+            for j in range(m):
+                subsets = layer[(layer >> j) & 1 == 1]
+                # candidates[i, k] = cost[subsets[i] \ {j}, k] + d(k, j)
+                # (k không thuộc tập → cost = inf → không bao giờ được chọn)
+                candidates = cost[subsets ^ (1 << j)] + d[:, j]
+                best = candidates.argmin(axis=1)
+                cost[subsets, j] = candidates[np.arange(len(subsets)), best]
+                parent[subsets, j] = best
+                self.nodes_explored += len(subsets)
+                self.operations += len(subsets) * m
+        return cost, parent
+    
+    def solve(self, start_city=0, step_callback=None):
+        """
+        Held-Karp cho TSP
+        
+        Algorithm:
+        1. Điền bảng cost[mask, j] theo kích thước tập con tăng dần
+        2. Chọn thành phố cuối j tốt nhất: cost[tất cả, j] + d(j, start)
+        3. Dò ngược parent từ (tất cả, j) về start để lấy tour
+        4. Log từng bước đi của tour (cho animation)
+        """
+        self.steps = []
+        self.nodes_explored = 0
+        self.operations = 0
+        
+        if self.n_cities > NO_PARENT:
+            raise ValueError(f"Held-Karp hỗ trợ tối đa {NO_PARENT} thành phố (parent uint8)")
+        
+        others = [city for city in range(self.n_cities) if city != start_city]
+        route = [start_city]
+        if others:
+            cost, parent = self._solve_tables(others, start_city)
+            
+            # Thành phố cuối cùng trước khi về start
+            full = (1 << len(others)) - 1
+            returns = np.array([self._dist[city][start_city] for city in others])
+            j = int((cost[full] + returns).argmin())
+            
+            # Dò ngược parent: (mask, j) → (mask \ {j}, parent[mask, j])
+            order = []
+            mask = full
+            while mask:
+                order.append(others[j])
+                previous = int(parent[mask, j])
+                mask ^= 1 << j
+                j = previous
+            route += order[::-1]
+        route.append(start_city)
+        
+        # Tổng chi phí tính lại bằng float64 từ ma trận gốc (bảng DP chỉ là float32)
+        total_cost = 0
+        for step_num, (current_city, next_city) in enumerate(zip(route, route[1:])):
+            edge_cost = self._dist[current_city][next_city]
+            candidates = []
+            if step_num < len(route) - 2:
+                candidates.append({
+                    'city': self.city_names[next_city],
+                    'city_idx': next_city,
+                    'distance': edge_cost,
+                    'g': total_cost + edge_cost,
+                    'heuristic': 0  # Held-Karp không dùng heuristic
+                })
+            self.steps.append({
+                'step': step_num,
+                'current': self.city_names[current_city],
+                'current_idx': current_city,
+                'next': self.city_names[next_city],
+                'next_idx': next_city,
+                'distance': edge_cost,
+                'g': total_cost,
+                'heuristic': 0,
+                'total_distance': total_cost + edge_cost,
+                'visited': route[:step_num + 1],
+                'candidates': candidates,
+                'frontier_size': 0
+            })
+            total_cost += edge_cost
+            if step_callback:
+                step_callback(self.steps[-1])
+                time.sleep(0.3)
+        
+        return route, total_cost
@@ -0,0 +1,160 @@
+"""
+Heuristic MST cho A* có memo theo tập thành phố chưa thăm
+
+h(n) = MST(chưa thăm ∪ {start}) + cạnh ngắn nhất từ thành phố hiện tại tới 1 thành phố chưa thăm
+
+- Phần MST chỉ phụ thuộc tập chưa thăm, không phụ thuộc đường đi tới state → mỗi
+  mask chỉ chạy Prim 1 lần, lưu trong bảng LRU có giới hạn
+- Cạnh nối từ thành phố hiện tại lưu kèm trong entry của mask (theo từng thành phố)
+- Vẫn admissible: phần tour còn lại đi current → u (≥ cạnh ngắn nhất) rồi qua hết các
+  thành phố chưa thăm về start (1 cây khung của chưa thăm ∪ {start}, ≥ MST)
+- Ma trận bất đối xứng (OSRM theo chiều đi): MST tính trên min(d[i][j], d[j][i]) để
+  cây khung không bao giờ dài hơn đường đi thật theo chiều bất kỳ
+- Prim chạy bằng list Python khi tập nhỏ, bằng NumPy trên ma trận con khi tập từ
+  VECTORIZED_PRIM_MIN_NODES node trở lên (mỗi vòng 1 np.minimum thay cho k phép so sánh)
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from .state import city_bits, full_mask, state_key, unvisited_cities
+from config import MST_CACHE_MAX_ENTRIES, VECTORIZED_PRIM_MIN_NODES
+
+
+def undirected_rows(dist, n_cities):
+    """Ma trận min(d[i][j], d[j][i]) dạng list lồng nhau - trọng số cạnh vô hướng cho MST"""
+    rows = [list(dist[i]) for i in range(n_cities)]
+    for i in range(n_cities):
+        for j in range(i + 1, n_cities):
+            rows[i][j] = rows[j][i] = min(rows[i][j], rows[j][i])
+    return rows
+
+
+def prim_mst_cost(dist, nodes):
+    """
+    Tổng trọng số MST trên nodes - Prim O(k²)
+    
+    Args:
+        dist: ma trận khoảng cách đối xứng dạng list lồng nhau
+        nodes: list chỉ số thành phố
+    """
+    if len(nodes) < 2:
+        return 0
+    root = dist[nodes[0]]
+    remaining = nodes[1:]
+    min_edge = [root[v] for v in remaining]
+    mst_cost = 0
+    while remaining:
+        # Node ngoài cây có cạnh nối vào cây nhỏ nhất
+        k = min(range(len(remaining)), key=min_edge.__getitem__)
+        mst_cost += min_edge[k]
+        u = remaining[k]
+        remaining[k], min_edge[k] = remaining[-1], min_edge[-1]
+        remaining.pop()
+        min_edge.pop()
+        
+        # Update min_edge cho các node còn lại
+        row = dist[u]
+        for i, v in enumerate(remaining):
+            if row[v] < min_edge[i]:
+                min_edge[i] = row[v]
+    return mst_cost
+
+
+def prim_mst_cost_vectorized(matrix, nodes):
+    """
+    Tổng trọng số MST trên nodes - Prim trên ma trận con NumPy
+    
+    Mỗi vòng: 1 argmin chọn node vào cây, 1 np.minimum cập nhật min_edge của
+    mọi node còn lại, 1 np.maximum với vector done (inf ở node đã vào cây, 0 ở
+    node còn lại) để node đã vào cây không bao giờ được chọn lại.
+    
+    Args:
+        matrix: ndarray N×N đối xứng
+        nodes: list chỉ số thành phố
+    """
+    if len(nodes) < 2:
+        return 0
+    sub = matrix[np.ix_(nodes, nodes)]
+    done = np.zeros(len(nodes))
+    done[0] = np.inf
+    min_edge = np.maximum(sub[0], done)
+    mst_cost = 0.0
+    for _ in range(len(nodes) - 1):
+        u = int(min_edge.argmin())
+        mst_cost += min_edge[u]
+        done[u] = np.inf
+        np.minimum(min_edge, sub[u], out=min_edge)
+        np.maximum(min_edge, done, out=min_edge)
+    return float(mst_cost)
+
+
+class MSTHeuristic:
+    """
+    h(current_city, visited_mask, start_city) với memo LRU theo (tập đã thăm, start)
+    
+    Attributes:
+        hits: số lần dùng lại MST đã tính
+        misses: số lần phải chạy Prim
+        evictions: số entry bị bỏ khi memo đầy
+    """
+    
+    def __init__(self, dist, n_cities, max_entries=MST_CACHE_MAX_ENTRIES):
+        self.dist = dist
+        self.tree_dist = undirected_rows(dist, n_cities)
+        self.tree_array = np.array(self.tree_dist, dtype=float).reshape(n_cities, n_cities)
+        self.n_cities = n_cities
+        self.max_entries = max_entries
+        self.bits = city_bits(n_cities)
+        self.goal_mask = full_mask(n_cities)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def __call__(self, current_city, visited_mask, start_city):
+        if visited_mask == self.goal_mask:
+            # Tất cả đã thăm, chỉ cần quay về start
+            return self.dist[current_city][start_city]
+        
+        key = state_key(visited_mask, start_city, self.bits)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            unvisited = unvisited_cities(visited_mask, self.n_cities)
+            nodes = [start_city] + unvisited
+            if len(nodes) >= VECTORIZED_PRIM_MIN_NODES:
+                mst_cost = prim_mst_cost_vectorized(self.tree_array, nodes)
+            else:
+                mst_cost = prim_mst_cost(self.tree_dist, nodes)
+            entry = (mst_cost, unvisited, {})
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        
+        mst_cost, unvisited, connections = entry
+        connection = connections.get(current_city)
+        if connection is None:
+            row = self.dist[current_city]
+            connection = connections[current_city] = min(row[city] for city in unvisited)
+        return mst_cost + connection
+    
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+            'size': len(self._entries),
+            'evictions': self.evictions
+        }
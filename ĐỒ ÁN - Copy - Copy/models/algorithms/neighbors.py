@@ -0,0 +1,32 @@
+"""
+Danh sách láng giềng đã sắp xếp theo khoảng cách - tính 1 lần cho mỗi ma trận
+
+Heuristic của Greedy cần "thành phố chưa thăm gần nhất" ở mỗi lần mở rộng; với
+danh sách đã sắp xếp chỉ cần duyệt từ đầu tới thành phố chưa thăm đầu tiên thay
+vì quét cả hàng. Được tính sẵn khi warm-up và lưu cùng ma trận trong memo.
+"""
+import numpy as np
+
+
+class NeighborLists:
+    """
+    Attributes:
+        nearest[i]: các thành phố j != i theo thứ tự distance_matrix[i][j] tăng dần
+        nearest_to[j]: các thành phố i != j theo thứ tự distance_matrix[i][j] tăng dần
+            (cột j - dùng cho chiều "quay về" khi ma trận không đối xứng)
+    """
+    
+    def __init__(self, distance_matrix):
+        matrix = np.asarray(distance_matrix, dtype=float)
+        n = len(matrix)
+        # Đặt đường chéo = inf để thành phố không tự là láng giềng của chính nó
+        masked = matrix + np.diag(np.full(n, np.inf)) if n else matrix
+        self.nearest = np.argsort(masked, axis=1, kind='stable')[:, :n - 1].tolist()
+        self.nearest_to = np.argsort(masked, axis=0, kind='stable')[:n - 1, :].T.tolist()
+    
+    def first_unvisited(self, order, visited_mask):
+        """Thành phố đầu tiên trong order chưa thăm theo bitmask (None nếu đã thăm hết)"""
+        for city in order:
+            if not visited_mask >> city & 1:
+                return city
+        return None
@@ -0,0 +1,92 @@
+"""
+Trạng thái tìm kiếm TSP dạng bitmask số nguyên, dùng chung cho cả 3 solver
+
+- Tập thành phố đã thăm = 1 số nguyên: bit i bật ⇔ đã thăm thành phố i
+  (thay cho frozenset: thêm 1 thành phố, kiểm tra thuộc tập, hash đều là phép
+  toán trên 1 word máy)
+- Key của explored = 1 số nguyên duy nhất: mask << bits | city
+  (thay cho tuple (city, frozenset) → closed set nhỏ hơn nhiều)
+- Khoảng cách đọc từ list lồng nhau kiểu float thay vì ndarray: m[i][j] trên
+  ndarray tạo 2 object NumPy mỗi lần đọc, so sánh float64 trong heap cũng chậm hơn
+- Đường đi không lưu trong từng state: state chỉ giữ chỉ số node trong NodeArena
+  (node = thành phố + chỉ số node cha), đường đi dựng lại khi cần (goal, log bước)
+"""
+from array import array
+
+import numpy as np
+
+# Chỉ số node cha của node gốc
+NO_PARENT = -1
+
+# Số bit dành cho chỉ số thành phố trong state_key (đủ cho 64 thành phố)
+CITY_BITS = 6
+
+
+def city_bits(n_cities):
+    """Số bit cho chỉ số thành phố: CITY_BITS, tăng thêm nếu nhiều hơn 64 thành phố"""
+    return max(CITY_BITS, (n_cities - 1).bit_length())
+
+
+def full_mask(n_cities):
+    """Mask khi đã thăm tất cả thành phố"""
+    return (1 << n_cities) - 1
+
+
+def visit(mask, city):
+    """Mask sau khi thăm thêm city"""
+    return mask | (1 << city)
+
+
+def is_visited(mask, city):
+    return mask >> city & 1
+
+
+def state_key(mask, city, bits=CITY_BITS):
+    """Key số nguyên của trạng thái (đang ở city, đã thăm mask)"""
+    return mask << bits | city
+
+
+def unvisited_cities(mask, n_cities):
+    """Các thành phố chưa thăm, theo thứ tự chỉ số tăng dần"""
+    return [city for city in range(n_cities) if not mask >> city & 1]
+
+
+def distance_rows(distance_matrix):
+    """Ma trận dạng list[list[float]] cho vòng lặp tìm kiếm (list có sẵn được giữ nguyên)"""
+    if isinstance(distance_matrix, np.ndarray):
+        return distance_matrix.tolist()
+    return distance_matrix
+
+
+class NodeArena:
+    """
+    Kho node tìm kiếm dạng 2 mảng song song: cities[k], parents[k]
+    
+    Mỗi successor chỉ tốn 2 số nguyên (8 byte) thay vì 1 list đường đi dài N
+    → bộ nhớ frontier giảm cỡ N lần, tạo successor là O(1) thay vì O(N).
+    """
+    
+    __slots__ = ('cities', 'parents')
+    
+    def __init__(self):
+        self.cities = array('i')
+        self.parents = array('i')
+    
+    def __len__(self):
+        return len(self.cities)
+    
+    def add(self, city, parent=NO_PARENT):
+        """Thêm node (đi tới city từ node parent), trả về chỉ số node mới"""
+        self.cities.append(city)
+        self.parents.append(parent)
+        return len(self.cities) - 1
+    
+    def path(self, node):
+        """Đường đi từ gốc tới node: [start_city, ..., city của node]"""
+        cities, parents = self.cities, self.parents
+        path = []
+        while node != NO_PARENT:
+            path.append(cities[node])
+            node = parents[node]
+        path.reverse()
+        return path
@@ -4,6 +4,7 @@ Uniform Cost Search (UCS) CHÍNH XÁC cho TSP.
 THUẬT TOÁN UCS ĐÚNG:
 - UCS là thuật toán tìm kiếm theo chiều rộng có ưu tiên (Best-First Search)
 - Mỗi node/state đại diện cho: (thành phố hiện tại, tập thành phố đã thăm, đường đi, chi phí g(n))
+  (tập đã thăm là bitmask số nguyên, đường đi là chỉ số node trong NodeArena - xem state.py)
 - Luôn mở rộng (expand) node có chi phí g(n) nhỏ nhất
 - Duy trì priority queue (frontier) chứa TẤT CẢ các state có thể
 - Khi tìm được goal state (đã thăm tất cả thành phố), trả về solution
@@ -12,13 +13,15 @@ THUẬT TOÁN UCS ĐÚNG:
 import time
 import heapq
 
+from .state import NodeArena, distance_rows, full_mask, is_visited, state_key, city_bits, visit
+
 
 class UniformCostSearchTSP:
     """Uniform Cost Search (UCS) CHÍNH XÁC cho TSP.
     
     Triển khai đúng theo lý thuyết:
     - State space search với priority queue
-    - Mỗi state = (chi phí g(n), thành phố hiện tại, visited set, đường đi)
+    - Mỗi state = (chi phí g(n), thành phố hiện tại, visited bitmask, node trong NodeArena)
     - Luôn expand state có g(n) nhỏ nhất
     - KHÔNG sử dụng heuristic h(n)
     - Đảm bảo tối ưu
@@ -26,6 +29,7 @@ class UniformCostSearchTSP:
 
     def __init__(self, distance_matrix, city_names, coordinates):
         self.distance_matrix = distance_matrix
+        self._dist = distance_rows(distance_matrix)
         self.city_names = city_names
         self.coordinates = coordinates
         self.n_cities = len(city_names)
@@ -50,9 +54,13 @@ class UniformCostSearchTSP:
         self.nodes_explored = 0
         self.operations = 0
         
-        # Initial state: (g_cost, current_city, visited_frozenset, path)
-        # Sử dụng frozenset để visited có thể hash (dùng làm key)
-        initial_state = (0, start_city, frozenset([start_city]), [start_city])
+        # Initial state: (g_cost, current_city, visited_mask, node)
+        # visited là bitmask: bit i bật ⇔ đã thăm thành phố i
+        # node là chỉ số trong arena, đường đi = arena.path(node)
+        bits = city_bits(self.n_cities)
+        goal_mask = full_mask(self.n_cities)
+        arena = NodeArena()
+        initial_state = (0, start_city, visit(0, start_city), arena.add(start_city))
         
         # Priority queue: (g_cost, counter, state_tuple)
         # counter để đảm bảo FIFO khi g_cost bằng nhau
@@ -61,7 +69,7 @@ class UniformCostSearchTSP:
         heapq.heappush(frontier, (0, counter, initial_state))
         
         # Lưu trạng thái đã explored để tránh lặp
-        # Key: (current_city, visited_frozenset), Value: g_cost
+        # Key: state_key(visited_mask, current_city) = mask << bits | city, Value: g_cost
         explored = {}
         
         # Bước khởi đầu
@@ -88,22 +96,22 @@ class UniformCostSearchTSP:
             self.operations += 1
             # Lấy state có g(n) nhỏ nhất
             g_cost, _, state = heapq.heappop(frontier)
-            current_city, visited_set, path = state[1], state[2], state[3]
+            current_city, visited_mask, node = state[1], state[2], state[3]
             
             # Kiểm tra xem state này đã explored chưa
-            state_key = (current_city, visited_set)
-            if state_key in explored and explored[state_key] <= g_cost:
+            current_key = state_key(visited_mask, current_city, bits)
+            if current_key in explored and explored[current_key] <= g_cost:
                 continue  # Đã có đường đi tốt hơn đến state này
             
-            explored[state_key] = g_cost
+            explored[current_key] = g_cost
             self.nodes_explored += 1
             
             # Goal test: đã thăm tất cả thành phố?
-            if len(visited_set) == self.n_cities:
+            if visited_mask == goal_mask:
                 # Tìm được solution! Thêm quay về start
-                return_cost = self.distance_matrix[current_city][start_city]
+                return_cost = self._dist[current_city][start_city]
                 total_cost = g_cost + return_cost
-                final_path = list(path) + [start_city]
+                final_path = arena.path(node) + [start_city]
                 
                 best_solution = (final_path, total_cost)
                 
@@ -133,20 +141,19 @@ class UniformCostSearchTSP:
             successors = []
             
             for next_city in range(self.n_cities):
-                if next_city not in visited_set:
+                if not is_visited(visited_mask, next_city):
                     self.operations += 1
                     # Tính chi phí đến next_city
-                    edge_cost = self.distance_matrix[current_city][next_city]
+                    edge_cost = self._dist[current_city][next_city]
                     new_g_cost = g_cost + edge_cost
                     
                     # Tạo successor state
-                    new_visited = visited_set | frozenset([next_city])
-                    new_path = list(path) + [next_city]
-                    successor_state = (new_g_cost, next_city, new_visited, new_path)
+                    new_visited = visit(visited_mask, next_city)
                     
                     # Kiểm tra xem có nên thêm successor vào frontier không
-                    successor_key = (next_city, new_visited)
+                    successor_key = state_key(new_visited, next_city, bits)
                     if successor_key not in explored or explored[successor_key] > new_g_cost:
+                        successor_state = (new_g_cost, next_city, new_visited, arena.add(next_city, node))
                         counter += 1
                         heapq.heappush(frontier, (new_g_cost, counter, successor_state))
                         successors.append(successor_state)
@@ -166,7 +173,7 @@ class UniformCostSearchTSP:
                 if successors:
                     next_state = min(successors, key=lambda x: x[0])
                     next_city_idx = next_state[1]
-                    next_distance = self.distance_matrix[current_city][next_city_idx]
+                    next_distance = self._dist[current_city][next_city_idx]
                 else:
                     next_city_idx = candidates[0]['city_idx']
                     next_distance = candidates[0]['distance']
@@ -181,7 +188,7 @@ class UniformCostSearchTSP:
                     'g': g_cost,
                     'heuristic': 0,
                     'total_distance': g_cost,
-                    'visited': list(path),
+                    'visited': arena.path(node),
                     'candidates': candidates,
                     'frontier_size': len(frontier)
                 })
@@ -1,63 +1,697 @@
 """
 Cache cho kết quả OSRM API - tránh gọi lại nhiều lần
 """
+import atexit
 import json
 import os
 import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+from .geo import haversine_km, grid_cell, neighbour_cells, bounding_box
+from config import (CACHE_BACKEND, CACHE_JSON_FILE, CACHE_DB_FILE, CACHE_WRITE_BEHIND, CACHE_FLUSH_INTERVAL,
+                    CACHE_RELOAD_CHECK_INTERVAL, CACHE_COORD_PRECISION, OSRM_PROFILE, SCENARIOS)
+
+
+LEGACY_KEY_SEPARATOR = '__to__'  # key cũ theo tên: "Hà Nội__to__Bangkok"
+
+
+def make_pair_key(coord1, coord2, profile=None):
+    """
+    Key cache theo tọa độ (làm tròn CACHE_COORD_PRECISION chữ số) + routing profile
+    
+    Ví dụ: "21.02850,105.85420;13.75630,100.50180@driving"
+    Tên thành phố KHÔNG nằm trong key → đổi tên không làm mất cache,
+    đổi tọa độ (cùng tên) không trả về khoảng cách cũ.
+    """
+    p = CACHE_COORD_PRECISION
+    return (f"{coord1[0]:.{p}f},{coord1[1]:.{p}f};"
+            f"{coord2[0]:.{p}f},{coord2[1]:.{p}f}@{profile or OSRM_PROFILE}")
+
+
+def parse_pair_key(key):
+    """
+    Tách key theo tọa độ → ((lat1, lng1), (lat2, lng2), profile)
+    
+    Returns:
+        tuple hoặc None nếu là key cũ theo tên
+    """
+    if LEGACY_KEY_SEPARATOR in key or '@' not in key:
+        return None
+    coords, profile = key.rsplit('@', 1)
+    start, end = coords.split(';')
+    coord1 = tuple(float(v) for v in start.split(','))
+    coord2 = tuple(float(v) for v in end.split(','))
+    return coord1, coord2, profile
+
+
+def _entry_distance(entry):
+    """Khoảng cách (km) của 1 entry JSON - hỗ trợ cả định dạng cũ (chỉ là số)"""
+    if entry is None:
+        return None
+    if isinstance(entry, dict):
+        return entry.get('km')
+    return entry
+
+
+def _make_entry(distance, names=None):
+    """Entry JSON: khoảng cách + tên 2 thành phố (chỉ là metadata)"""
+    entry = {'km': distance}
+    if names:
+        entry['from'], entry['to'] = names
+    return entry
+
+
+def _snap_match(coord1, coord2, tolerance_m, candidates):
+    """
+    Chọn entry đã cache có 2 đầu mút cách điểm cần tra ≤ tolerance_m (gần nhất),
+    rồi hiệu chỉnh theo độ lệch thực tế
+    
+    Hiệu chỉnh: giữ nguyên hệ số đường đi / đường chim bay của cặp điểm đã cache,
+        d = d_cached × haversine(A, B) / haversine(A', B')
+    
+    Args:
+        candidates: iterable (key, distance, cached_coord1, cached_coord2)
+    
+    Returns:
+        dict {'distance', 'cached_distance', 'correction_km', 'tolerance_m', 'offset_m', 'matched_key'}
+        hoặc None
+    """
+    best = None
+    for key, distance, cached1, cached2 in candidates:
+        offset = (haversine_km(coord1, cached1) * 1000, haversine_km(coord2, cached2) * 1000)
+        if max(offset) > tolerance_m:
+            continue
+        if best is None or sum(offset) < sum(best[4]):
+            best = (key, distance, cached1, cached2, offset)
+    if best is None:
+        return None
+    
+    key, distance, cached1, cached2, offset = best
+    cached_straight = haversine_km(cached1, cached2)
+    # 2 điểm quá gần nhau → hệ số không ổn định, không dùng lại
+    if cached_straight * 1000 < 2 * tolerance_m:
+        return None
+    corrected = distance * haversine_km(coord1, coord2) / cached_straight
+    return {
+        'distance': corrected,
+        'cached_distance': distance,
+        'correction_km': corrected - distance,
+        'tolerance_m': tolerance_m,
+        'offset_m': [round(offset[0], 1), round(offset[1], 1)],
+        'matched_key': key
+    }
+
+
+def known_city_coordinates():
+    """Tên → tọa độ của mọi thành phố có trong config.SCENARIOS (dùng để migrate key cũ)"""
+    cities = {}
+    for scenario_cities in SCENARIOS.values():
+        cities.update(scenario_cities)
+    return cities
+
 
 class DistanceCache:
-    """Cache khoảng cách giữa các thành phố"""
+    """
+    Cache khoảng cách giữa các thành phố (file JSON)
+    
+    Write-behind: set() chỉ cập nhật dict trong RAM và đánh dấu dirty, file được ghi khi
+    - hết CACHE_FLUSH_INTERVAL giây kể từ lần set() đầu tiên chưa ghi
+    - gọi flush() (get_distance_matrix gọi ở cuối mỗi ma trận)
+    - interpreter thoát (atexit)
+    Mỗi lần ghi là atomic: ghi file tạm rồi os.replace → crash giữa chừng không làm hỏng file.
+    
+    Nhiều process dùng chung file:
+    - Trước khi ghi, nếu file đã bị process khác ghi (mtime/size khác lần trước) thì đọc
+      lại và gộp entry trên đĩa với key dirty của process này → không làm mất phần ghi
+      của nhau. Không có khóa file giữa các process nên 2 lần ghi trùng đúng lúc vẫn có
+      thể mất 1 bên - nhiều process ghi thường xuyên thì dùng CACHE_BACKEND = 'sqlite'.
+    - get / has / get_approx đọc lại file khi mtime/size thay đổi (os.stat tối đa 1 lần
+      mỗi reload_check_interval giây).
+    """
     
-    def __init__(self, cache_file='distance_cache.json'):
+    def __init__(self, cache_file=CACHE_JSON_FILE, write_behind=CACHE_WRITE_BEHIND,
+                 flush_interval=CACHE_FLUSH_INTERVAL, reload_check_interval=CACHE_RELOAD_CHECK_INTERVAL):
         self.cache_file = Path(__file__).parent.parent / cache_file
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.reload_check_interval = reload_check_interval
+        self._checked_at = time.monotonic()
+        self._lock = threading.RLock()
+        self._dirty = set()  # key đã thay đổi nhưng chưa ghi file
+        self._removed = set()  # key đã xóa (migrate key cũ) - không lấy lại từ file khi gộp
+        self._timer = None
+        self._file_stamp = None  # (mtime_ns, size) của file lúc load/ghi gần nhất
+        self.writes = 0  # số lần ghi file
+        self.bytes_written = 0
+        self.reloads = 0
+        self._grid_indexes = {}  # tolerance_m → {(ô đi, ô đến, profile): [key, ...]}
         self.cache = self._load_cache()
+        if self.write_behind:
+            atexit.register(self.flush)
+    
+    def _stat_stamp(self):
+        """(mtime_ns, size) của file cache, None nếu chưa có file"""
+        try:
+            st = os.stat(self.cache_file)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
     
     def _load_cache(self):
         """Load cache từ file"""
         if self.cache_file.exists():
             try:
+                self._file_stamp = self._stat_stamp()
                 with open(self.cache_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
-            except:
+            except (OSError, ValueError) as e:
+                # File hỏng: giữ lại bản .corrupt để kiểm tra thay vì lặng lẽ bỏ qua
+                corrupt_file = self.cache_file.with_name(self.cache_file.name + '.corrupt')
+                print(f"⚠️ Cache {self.cache_file.name} bị hỏng ({e}), đã chuyển sang {corrupt_file.name}")
+                try:
+                    os.replace(self.cache_file, corrupt_file)
+                except OSError:
+                    pass
                 return {}
         return {}
     
-    def _save_cache(self):
-        """Save cache vào file"""
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.cache, f, indent=2, ensure_ascii=False)
+    def _save_cache(self, merge=True):
+        """
+        Save cache vào file - ghi file tạm rồi os.replace (atomic)
+        
+        merge: file đã bị process khác ghi kể từ lần đọc/ghi trước → gộp trước khi ghi đè
+        """
+        with self._lock:
+            if merge and self._stat_stamp() not in (None, self._file_stamp):
+                self._merge_from_disk()
+            data = json.dumps(self.cache, indent=2, ensure_ascii=False).encode('utf-8')
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_file.parent, prefix=self.cache_file.name, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.cache_file)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._dirty = set()
+            self._removed = set()
+            self._file_stamp = self._stat_stamp()
+            self.writes += 1
+            self.bytes_written += len(data)
+    
+    def reload_if_changed(self):
+        """
+        Đọc lại file nếu process khác đã ghi (mtime hoặc size khác lần trước)
+        
+        Chỉ tốn 1 lần os.stat khi file không đổi. Các key đang dirty trong RAM được giữ lại.
+        
+        Returns:
+            bool: True nếu đã đọc lại file
+        """
+        stamp = self._stat_stamp()
+        if stamp is None or stamp == self._file_stamp:
+            return False
+        with self._lock:
+            if stamp == self._file_stamp:
+                return False
+            self._merge_from_disk()
+            return True
+    
+    def _merge_from_disk(self):
+        """Gộp entry trên đĩa vào RAM - key dirty (chưa ghi) của process này được ưu tiên"""
+        pending = {key: self.cache[key] for key in self._dirty if key in self.cache}
+        merged = dict(self.cache)
+        merged.update(self._load_cache())
+        merged.update(pending)
+        for key in self._removed:
+            merged.pop(key, None)
+        self.cache = merged
+        self._grid_indexes = {}
+        self.reloads += 1
     
-    def _make_key(self, city1, city2):
-        """Tạo key duy nhất cho cặp thành phố"""
-        # Sử dụng tên thành phố để tạo key (không phụ thuộc vào tọa độ)
-        return f"{city1}__to__{city2}"
+    def _check_reload(self):
+        """Trước khi tra cứu: đọc lại file nếu process khác đã ghi (kiểm tra tối đa 1 lần / reload_check_interval giây)"""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_check_interval:
+            self._checked_at = now
+            self.reload_if_changed()
     
-    def get(self, city1, city2):
+    def _mark_dirty(self, keys):
+        """Đánh dấu có thay đổi chưa ghi; ghi ngay nếu tắt write-behind"""
+        with self._lock:
+            self._dirty.update(keys)
+            if not self.write_behind:
+                self._save_cache()
+            elif self._timer is None and self.flush_interval:
+                self._timer = threading.Timer(self.flush_interval, self._timer_flush)
+                self._timer.daemon = True
+                self._timer.start()
+    
+    def _timer_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush()
+    
+    def flush(self):
+        """Ghi các thay đổi đang buffer xuống file (không làm gì nếu không có gì thay đổi)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self._save_cache()
+    
+    def _make_key(self, coord1, coord2, profile=None):
+        """Tạo key duy nhất cho cặp tọa độ (xem make_pair_key)"""
+        return make_pair_key(coord1, coord2, profile)
+    
+    def get(self, coord1, coord2, profile=None):
         """Lấy khoảng cách từ cache"""
-        key = self._make_key(city1, city2)
-        return self.cache.get(key)
+        self._check_reload()
+        key = self._make_key(coord1, coord2, profile)
+        return _entry_distance(self.cache.get(key))
+    
+    def set(self, coord1, coord2, distance, names=None, profile=None):
+        """
+        Lưu khoảng cách vào cache
+        
+        Args:
+            names: (tên điểm đi, tên điểm đến) - chỉ lưu làm metadata
+        """
+        key = self._make_key(coord1, coord2, profile)
+        with self._lock:
+            self.cache[key] = _make_entry(distance, names)
+            self._index_add(key)
+            self._mark_dirty([key])
     
-    def set(self, city1, city2, distance):
-        """Lưu khoảng cách vào cache"""
-        key = self._make_key(city1, city2)
-        self.cache[key] = distance
-        self._save_cache()
+    def set_many(self, items, profile=None):
+        """
+        Lưu nhiều khoảng cách cùng lúc - tối đa MỘT lần ghi file
+        
+        Args:
+            items: iterable các tuple (coord1, coord2, distance) hoặc (coord1, coord2, distance, names)
+        """
+        keys = []
+        with self._lock:
+            for coord1, coord2, distance, *names in items:
+                key = self._make_key(coord1, coord2, profile)
+                self.cache[key] = _make_entry(distance, names[0] if names else None)
+                self._index_add(key)
+                keys.append(key)
+            if keys:
+                self._mark_dirty(keys)
+        return len(keys)
     
-    def has(self, city1, city2):
+    def has(self, coord1, coord2, profile=None):
         """Kiểm tra xem đã có trong cache chưa"""
-        key = self._make_key(city1, city2)
+        self._check_reload()
+        key = self._make_key(coord1, coord2, profile)
         return key in self.cache
     
+    def _index_add(self, key, indexes=None):
+        """Thêm key vào các chỉ mục lưới đã dựng"""
+        indexes = self._grid_indexes if indexes is None else indexes
+        if not indexes:
+            return
+        parsed = parse_pair_key(key)
+        if not parsed:
+            return
+        coord1, coord2, profile = parsed
+        for tolerance_m, index in indexes.items():
+            cell_key = (grid_cell(coord1, tolerance_m), grid_cell(coord2, tolerance_m), profile)
+            index.setdefault(cell_key, []).append(key)
+    
+    def get_approx(self, coord1, coord2, tolerance_m, profile=None):
+        """
+        Tra cache gần đúng: dùng lại khoảng cách của cặp điểm đã cache có mỗi đầu
+        cách điểm cần tra ≤ tolerance_m (vd 200 m), có hiệu chỉnh theo độ lệch
+        
+        Entry được tìm qua chỉ mục lưới ô cạnh tolerance_m (xét 3×3 ô quanh mỗi điểm).
+        
+        Returns:
+            dict (xem _snap_match) hoặc None
+        """
+        profile = profile or OSRM_PROFILE
+        self._check_reload()
+        with self._lock:
+            index = self._grid_indexes.get(tolerance_m)
+            if index is None:
+                # Dựng chỉ mục lưới lần đầu cho tolerance này
+                index = {}
+                self._grid_indexes[tolerance_m] = index
+                for key in self.cache:
+                    self._index_add(key, {tolerance_m: index})
+            candidates = []
+            keys = [
+                key
+                for cell1 in neighbour_cells(grid_cell(coord1, tolerance_m))
+                for cell2 in neighbour_cells(grid_cell(coord2, tolerance_m))
+                for key in index.get((cell1, cell2, profile), ())
+            ]
+            for key in keys:
+                distance = _entry_distance(self.cache.get(key))
+                if distance is not None:
+                    cached1, cached2, _ = parse_pair_key(key)
+                    candidates.append((key, distance, cached1, cached2))
+        return _snap_match(coord1, coord2, tolerance_m, candidates)
+    
+    def migrate_legacy_keys(self, known_coordinates, profile=None):
+        """
+        Chuyển key cũ theo tên ("A__to__B") sang key theo tọa độ
+        
+        Chỉ migrate được cặp có cả 2 tên trong known_coordinates; các key còn lại
+        được giữ nguyên (không bao giờ được đọc nữa) để không mất dữ liệu.
+        
+        Returns:
+            int: số entry đã chuyển
+        """
+        migrated = {}
+        with self._lock:
+            for key, entry in list(self.cache.items()):
+                if LEGACY_KEY_SEPARATOR not in key:
+                    continue
+                name1, name2 = key.split(LEGACY_KEY_SEPARATOR, 1)
+                if name1 in known_coordinates and name2 in known_coordinates:
+                    new_key = self._make_key(known_coordinates[name1], known_coordinates[name2], profile)
+                    migrated[new_key] = _make_entry(_entry_distance(entry), (name1, name2))
+                    del self.cache[key]
+                    self._removed.add(key)
+            for new_key, entry in migrated.items():
+                # Không ghi đè entry theo tọa độ đã có (mới hơn)
+                self.cache.setdefault(new_key, entry)
+            self._grid_indexes = {}
+            if migrated:
+                self._mark_dirty(migrated.keys())
+                self.flush()
+        return len(migrated)
+    
     def clear(self):
         """Xóa toàn bộ cache"""
-        self.cache = {}
-        self._save_cache()
+        with self._lock:
+            self.cache = {}
+            self._dirty = set()
+            self._grid_indexes = {}
+            self._save_cache(merge=False)
     
     def get_stats(self):
         """Thống kê cache"""
         return {
             'total_entries': len(self.cache),
-            'cache_file': str(self.cache_file)
+            'cache_file': str(self.cache_file),
+            'backend': 'json',
+            'dirty_entries': len(self._dirty),
+            'file_writes': self.writes,
+            'reloads': self.reloads
         }
+
+
+class SQLiteDistanceCache:
+    """
+    Cache khoảng cách lưu trong SQLite - cùng API get/set/has với DistanceCache
+    
+    - WAL mode: nhiều process đọc song song, ghi không chặn đọc
+    - Khóa chính (key) → lookup có index, không cần load cả file vào RAM
+    - set_many / transaction(): gom nhiều insert, commit 1 lần cho cả ma trận
+    - Lần đầu mở: tự động migrate dữ liệu từ distance_cache.json (nếu có)
+    """
+    
+    METADATA_COLUMNS = [
+        ('src_lat', 'REAL'), ('src_lng', 'REAL'),
+        ('dst_lat', 'REAL'), ('dst_lng', 'REAL'),
+        ('profile', 'TEXT'),
+        ('src_name', 'TEXT'), ('dst_name', 'TEXT')
+    ]
+    UPSERT_SQL = (
+        'INSERT OR REPLACE INTO distances '
+        '(key, distance, src_lat, src_lng, dst_lat, dst_lng, profile, src_name, dst_name) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    )
+    
+    def __init__(self, db_file=CACHE_DB_FILE, json_file=CACHE_JSON_FILE):
+        self.cache_file = Path(__file__).parent.parent / db_file
+        self.json_file = Path(__file__).parent.parent / json_file
+        # Mỗi thread 1 connection (sqlite3.Connection không dùng chung giữa các thread)
+        self._local = threading.local()
+        self._init_db()
+    
+    def _connect(self):
+        """Lấy connection của thread hiện tại"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None → tự quản lý BEGIN/COMMIT
+            conn = sqlite3.connect(self.cache_file, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.in_transaction = False
+        return conn
+    
+    def _init_db(self):
+        """Tạo bảng và migrate từ JSON (chỉ 1 lần)"""
+        conn = self._connect()
+        # BEGIN IMMEDIATE: nhiều process cùng khởi động → chỉ 1 process kiểm tra / thêm cột
+        # tại 1 thời điểm, process sau đọc lại table_info khi đã có đủ cột
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS distances (
+                    key TEXT PRIMARY KEY,
+                    distance REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            # Các cột metadata (thêm bằng ALTER TABLE để nâng cấp được DB cũ)
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(distances)')}
+            for column, column_type in self.METADATA_COLUMNS:
+                if column not in existing:
+                    conn.execute(f'ALTER TABLE distances ADD COLUMN {column} {column_type}')
+            # Index cho tra cứu gần đúng theo vùng tọa độ (get_approx)
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_distances_src
+                ON distances (profile, src_lat, src_lng)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._migrate_from_json()
+    
+    def _migrate_from_json(self):
+        """Import distance_cache.json vào SQLite - an toàn khi nhiều process cùng khởi động"""
+        conn = self._connect()
+        # BEGIN IMMEDIATE: chỉ 1 process giữ quyền ghi → không migrate 2 lần
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if not done:
+                entries = {}
+                if self.json_file.exists():
+                    try:
+                        with open(self.json_file, 'r', encoding='utf-8') as f:
+                            entries = json.load(f)
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️ Không đọc được {self.json_file.name} để migrate: {e}")
+                rows = []
+                for key, entry in entries.items():
+                    parsed = parse_pair_key(key)
+                    if parsed:
+                        coord1, coord2, profile = parsed
+                        names = (entry.get('from'), entry.get('to')) if isinstance(entry, dict) else None
+                        rows.append(self._make_row(coord1, coord2, _entry_distance(entry), names, profile))
+                    else:
+                        # Key cũ theo tên - migrate_legacy_keys() sẽ chuyển sau
+                        rows.append((key, _entry_distance(entry)) + (None,) * len(self.METADATA_COLUMNS))
+                conn.executemany(self.UPSERT_SQL.replace('OR REPLACE', 'OR IGNORE'), rows)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(len(entries)),))
+                if entries:
+                    print(f"📦 Đã migrate {len(entries)} khoảng cách từ {self.json_file.name} sang SQLite")
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    
+    def _make_key(self, coord1, coord2, profile=None):
+        """Tạo key duy nhất cho cặp tọa độ (giống DistanceCache)"""
+        return make_pair_key(coord1, coord2, profile)
+    
+    def _make_row(self, coord1, coord2, distance, names=None, profile=None):
+        src_name, dst_name = names if names else (None, None)
+        return (self._make_key(coord1, coord2, profile), distance,
+                coord1[0], coord1[1], coord2[0], coord2[1],
+                profile or OSRM_PROFILE, src_name, dst_name)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Gom mọi set() bên trong vào 1 transaction, commit 1 lần khi thoát
+        
+        Ví dụ:
+            with cache.transaction():
+                for ...: cache.set(a, b, d)
+        """
+        conn = self._connect()
+        if self._local.in_transaction:
+            # Transaction lồng nhau → dùng chung transaction ngoài
+            yield self
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.in_transaction = True
+        try:
+            yield self
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._local.in_transaction = False
+    
+    def get(self, coord1, coord2, profile=None):
+        """Lấy khoảng cách từ cache"""
+        row = self._connect().execute(
+            'SELECT distance FROM distances WHERE key = ?', (self._make_key(coord1, coord2, profile),)
+        ).fetchone()
+        return row[0] if row else None
+    
+    def set(self, coord1, coord2, distance, names=None, profile=None):
+        """Lưu khoảng cách vào cache (autocommit nếu không nằm trong transaction())"""
+        self._connect().execute(self.UPSERT_SQL, self._make_row(coord1, coord2, distance, names, profile))
+    
+    def set_many(self, items, profile=None):
+        """
+        Lưu nhiều khoảng cách - 1 transaction, 1 lần commit
+        
+        Args:
+            items: iterable các tuple (coord1, coord2, distance) hoặc (coord1, coord2, distance, names)
+        """
+        rows = [
+            self._make_row(coord1, coord2, distance, names[0] if names else None, profile)
+            for coord1, coord2, distance, *names in items
+        ]
+        if rows:
+            with self.transaction():
+                self._connect().executemany(self.UPSERT_SQL, rows)
+        return len(rows)
+    
+    def has(self, coord1, coord2, profile=None):
+        """Kiểm tra xem đã có trong cache chưa"""
+        return self.get(coord1, coord2, profile) is not None
+    
+    def get_approx(self, coord1, coord2, tolerance_m, profile=None):
+        """
+        Tra cache gần đúng trong bán kính tolerance_m (giống DistanceCache.get_approx)
+        
+        Lọc bằng bounding box quanh 2 điểm trên index (profile, src_lat, src_lng)
+        """
+        (src_lat, src_lng), (dst_lat, dst_lng) = bounding_box(coord1, tolerance_m), bounding_box(coord2, tolerance_m)
+        rows = self._connect().execute(
+            '''
+            SELECT key, distance, src_lat, src_lng, dst_lat, dst_lng FROM distances
+            WHERE profile = ?
+              AND src_lat BETWEEN ? AND ? AND src_lng BETWEEN ? AND ?
+              AND dst_lat BETWEEN ? AND ? AND dst_lng BETWEEN ? AND ?
+            ''',
+            (profile or OSRM_PROFILE, *src_lat, *src_lng, *dst_lat, *dst_lng)
+        ).fetchall()
+        candidates = [
+            (key, distance, (lat1, lng1), (lat2, lng2))
+            for key, distance, lat1, lng1, lat2, lng2 in rows
+        ]
+        return _snap_match(coord1, coord2, tolerance_m, candidates)
+    
+    def migrate_legacy_keys(self, known_coordinates, profile=None):
+        """
+        Chuyển các dòng có key cũ theo tên ("A__to__B") sang key theo tọa độ
+        
+        Returns:
+            int: số dòng đã chuyển
+        """
+        conn = self._connect()
+        with self.transaction():
+            legacy = conn.execute(
+                'SELECT key, distance FROM distances WHERE instr(key, ?) > 0', (LEGACY_KEY_SEPARATOR,)
+            ).fetchall()
+            rows, old_keys = [], []
+            for key, distance in legacy:
+                name1, name2 = key.split(LEGACY_KEY_SEPARATOR, 1)
+                if name1 in known_coordinates and name2 in known_coordinates:
+                    rows.append(self._make_row(known_coordinates[name1], known_coordinates[name2],
+                                               distance, (name1, name2), profile))
+                    old_keys.append((key,))
+            # INSERT OR IGNORE: không ghi đè entry theo tọa độ đã có (mới hơn)
+            conn.executemany(self.UPSERT_SQL.replace('OR REPLACE', 'OR IGNORE'), rows)
+            conn.executemany('DELETE FROM distances WHERE key = ?', old_keys)
+        return len(rows)
+    
+    def flush(self):
+        """Không cần làm gì - mỗi transaction đã được commit (giữ để cùng API với DistanceCache)"""
+    
+    def reload_if_changed(self):
+        """SQLite luôn đọc dữ liệu mới nhất → không cần reload"""
+        return False
+    
+    def clear(self):
+        """Xóa toàn bộ cache (giữ cờ đã migrate để không import lại JSON cũ)"""
+        self._connect().execute('DELETE FROM distances')
+    
+    def get_stats(self):
+        """Thống kê cache"""
+        total = self._connect().execute('SELECT COUNT(*) FROM distances').fetchone()[0]
+        return {
+            'total_entries': total,
+            'cache_file': str(self.cache_file),
+            'backend': 'sqlite'
+        }
+
+
+_shared_caches = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_cache(backend=None):
+    """
+    Cache dùng chung cho cả process (tạo lần đầu khi gọi)
+    
+    Thay vì mỗi request tạo DistanceCache() mới (json.load cả file), mọi
+    OSRMDistanceCalculator dùng chung 1 object; file chỉ được đọc lại khi
+    mtime/size thay đổi.
+    """
+    backend = backend or CACHE_BACKEND
+    with _shared_lock:
+        cache = _shared_caches.get(backend)
+        if cache is None:
+            cache = _shared_caches[backend] = create_distance_cache(backend)
+            migrated = cache.migrate_legacy_keys(known_city_coordinates())
+            if migrated:
+                print(f"🔑 Đã chuyển {migrated} entry cache từ key theo tên sang key theo tọa độ")
+            return cache
+    cache.reload_if_changed()
+    return cache
+
+
+def create_distance_cache(backend=None):
+    """
+    Tạo cache theo cấu hình CACHE_BACKEND
+    
+    Args:
+        backend: 'sqlite' hoặc 'json' (mặc định lấy từ config)
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == 'sqlite':
+        return SQLiteDistanceCache()
+    if backend == 'json':
+        return DistanceCache()
+    raise ValueError(f"CACHE_BACKEND không hợp lệ: {backend}")
@@ -0,0 +1,265 @@
+"""
+Contraction Hierarchy (CH) trên RoadNetwork: tiền xử lý 1 lần, truy vấn nhiều-nhiều rất nhanh
+
+- build(): co lần lượt từng node theo thứ tự "ít quan trọng trước", thêm cạnh tắt
+  (shortcut) khi đường ngắn nhất đi qua node bị co; độ ưu tiên = edge difference
+  + số hàng xóm đã co, cập nhật lười
+- Kết quả gồm 2 graph CSR: cạnh đi lên (forward) và cạnh đi xuống đảo chiều (backward),
+  lưu mỗi mảng 1 file .npy trong 1 thư mục → load bằng np.load(mmap_mode='r')
+- many_to_many(): thuật toán bucket - mỗi đích chạy 1 tìm kiếm ngược đi lên và ghi
+  (đích, khoảng cách) vào bucket của các node gặp; mỗi nguồn chạy 1 tìm kiếm xuôi
+  đi lên và quét bucket của các node gặp
+"""
+import heapq
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+
+ARRAY_NAMES = ('rank', 'up_indptr', 'up_indices', 'up_weights', 'down_indptr', 'down_indices', 'down_weights')
+
+
+def _to_csr(adjacency):
+    """list[list[(node, weight)]] → (indptr, indices, weights)"""
+    indptr = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    np.cumsum([len(edges) for edges in adjacency], out=indptr[1:])
+    indices = np.fromiter((v for edges in adjacency for v, _ in edges), dtype=np.int64, count=indptr[-1])
+    weights = np.fromiter((w for edges in adjacency for _, w in edges), dtype=float, count=indptr[-1])
+    return indptr, indices, weights
+
+
+class ContractionHierarchy:
+    """
+    Chỉ mục CH - node id trùng với node id của RoadNetwork đã dùng để build
+    
+    Attributes:
+        rank: thứ tự co của từng node (node co sau = quan trọng hơn)
+        up_*: CSR các cạnh u → v với rank[v] > rank[u] (tìm kiếm xuôi từ nguồn)
+        down_*: CSR các cạnh u → v với rank[u] > rank[v], lưu đảo chiều tại v
+            (tìm kiếm ngược từ đích)
+    """
+    
+    def __init__(self, rank, up_indptr, up_indices, up_weights, down_indptr, down_indices, down_weights):
+        # np.asarray: bỏ lớp np.memmap (chậm khi slice) nhưng vẫn trỏ vào vùng nhớ map từ file
+        self.rank = np.asarray(rank)
+        self.up = tuple(np.asarray(a) for a in (up_indptr, up_indices, up_weights))
+        self.down = tuple(np.asarray(a) for a in (down_indptr, down_indices, down_weights))
+        # Danh sách kề đã đọc, theo từng node - chỉ các node truy vấn chạm tới mới được nạp
+        self._adjacency = {'up': {}, 'down': {}}
+    
+    @property
+    def n_nodes(self):
+        return len(self.rank)
+    
+    @property
+    def n_edges(self):
+        return len(self.up[1]) + len(self.down[1])
+    
+    @classmethod
+    def build(cls, network, witness_limit=50, verbose=True):
+        """
+        Tiền xử lý CH từ RoadNetwork
+        
+        Args:
+            witness_limit: số node tối đa mỗi lần tìm đường thay thế (witness search).
+                Nhỏ → build nhanh hơn nhưng thêm shortcut thừa (vẫn đúng)
+        """
+        n = network.n_nodes
+        out = [dict() for _ in range(n)]
+        inn = [dict() for _ in range(n)]
+        for u in range(n):
+            for k in range(network.indptr[u], network.indptr[u + 1]):
+                v, w = int(network.indices[k]), float(network.weights[k])
+                if v != u and w < out[u].get(v, math.inf):
+                    out[u][v] = w
+                    inn[v][u] = w
+        final_out = [dict(edges) for edges in out]
+        deleted_neighbours = [0] * n
+        contracted = bytearray(n)
+        rank = np.zeros(n, dtype=np.int64)
+        
+        def witness_distances(source, excluded, targets, limit):
+            # Dijkstra giới hạn trên graph còn lại, bỏ qua node đang co
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            remaining = set(targets)
+            settled = 0
+            while heap and remaining and settled < witness_limit:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if d > limit:
+                    break
+                settled += 1
+                remaining.discard(x)
+                for y, w in out[x].items():
+                    nd = d + w
+                    if y != excluded and nd <= limit and nd < dist.get(y, math.inf):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+        
+        def needed_shortcuts(v):
+            shortcuts = []
+            for u, w_in in inn[v].items():
+                candidates = {w: w_in + w_out for w, w_out in out[v].items() if w != u}
+                if not candidates:
+                    continue
+                dist = witness_distances(u, v, candidates, max(candidates.values()))
+                shortcuts.extend((u, w, c) for w, c in candidates.items() if dist.get(w, math.inf) > c)
+            return shortcuts
+        
+        def priority(v, shortcuts):
+            return len(shortcuts) - len(inn[v]) - len(out[v]) + deleted_neighbours[v]
+        
+        heap = [(priority(v, needed_shortcuts(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # Cập nhật lười: tính lại độ ưu tiên, nếu không còn nhỏ nhất thì đẩy lại vào heap
+            shortcuts = needed_shortcuts(v)
+            current = priority(v, shortcuts)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+            
+            for u, w, c in shortcuts:
+                if c < out[u].get(w, math.inf):
+                    out[u][w] = c
+                    inn[w][u] = c
+                if c < final_out[u].get(w, math.inf):
+                    final_out[u][w] = c
+            for u in inn[v]:
+                del out[u][v]
+                deleted_neighbours[u] += 1
+            for w in out[v]:
+                del inn[w][v]
+                deleted_neighbours[w] += 1
+            out[v], inn[v] = {}, {}
+            contracted[v] = 1
+            rank[v] = order
+            order += 1
+            if verbose and order % 10000 == 0:
+                print(f"  ⛓️  Đã co {order:,}/{n:,} node")
+        
+        up = [[] for _ in range(n)]
+        down = [[] for _ in range(n)]
+        for u, edges in enumerate(final_out):
+            for w, c in edges.items():
+                if rank[w] > rank[u]:
+                    up[u].append((w, c))
+                else:
+                    down[w].append((u, c))
+        return cls(rank, *_to_csr(up), *_to_csr(down))
+    
+    def save(self, directory):
+        """Ghi mỗi mảng ra 1 file .npy (load lại được bằng mmap) + meta.json"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = dict(zip(ARRAY_NAMES, (self.rank, *self.up, *self.down)))
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'n_nodes': self.n_nodes, 'n_edges': self.n_edges}, f)
+    
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Đọc chỉ mục đã lưu; mmap=True → dữ liệu được map từ file, chỉ nạp phần cần đọc"""
+        mode = 'r' if mmap else None
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode) for name in ARRAY_NAMES))
+    
+    def _neighbours(self, direction, u):
+        """[(v, km), ...] của node u trong graph 'up' hoặc 'down' (đọc từ mảng CSR lần đầu)"""
+        cache = self._adjacency[direction]
+        edges = cache.get(u)
+        if edges is None:
+            indptr, indices, weights = self.up if direction == 'up' else self.down
+            start, end = int(indptr[u]), int(indptr[u + 1])
+            edges = cache[u] = list(zip(indices[start:end].tolist(), weights[start:end].tolist()))
+        return edges
+    
+    def _upward_search(self, node, direction):
+        """
+        Dijkstra chỉ đi theo các cạnh lên node rank cao hơn → {node: km}
+        
+        direction='up': tìm kiếm xuôi từ nguồn, 'down': tìm kiếm ngược từ đích.
+        Stall-on-demand: node u bị "chặn" nếu tới được nó ngắn hơn qua 1 node rank cao
+        hơn đã gặp (cạnh của graph còn lại) → không mở rộng u và bỏ u khỏi kết quả
+        (khoảng cách của u chưa đúng, đường ngắn nhất không bao giờ gặp nhau tại u).
+        """
+        stall_direction = 'down' if direction == 'up' else 'up'
+        dist = {node: 0.0}
+        stalled = set()
+        heap = [(0.0, node)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if any(dist.get(x, math.inf) + w < d for x, w in self._neighbours(stall_direction, u)):
+                stalled.add(u)
+                continue
+            for v, w in self._neighbours(direction, u):
+                nd = d + w
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        for u in stalled:
+            del dist[u]
+        return dist
+    
+    def many_to_many(self, sources, targets):
+        """
+        Ma trận khoảng cách len(sources) × len(targets) (km, inf nếu không có đường)
+        
+        Args:
+            sources, targets: list node id
+        """
+        # 1. Tìm kiếm ngược từ mỗi đích → bucket[node] = (các chỉ số đích, khoảng cách)
+        buckets = {}
+        for t_index, target in enumerate(targets):
+            for node, d in self._upward_search(target, 'down').items():
+                bucket = buckets.setdefault(node, ([], []))
+                bucket[0].append(t_index)
+                bucket[1].append(d)
+        
+        # 2. Tìm kiếm xuôi từ mỗi nguồn, chỉ giữ các node có bucket
+        meetings = {}
+        for s_index, source in enumerate(sources):
+            for node, d in self._upward_search(source, 'up').items():
+                if node in buckets:
+                    meeting = meetings.setdefault(node, ([], []))
+                    meeting[0].append(s_index)
+                    meeting[1].append(d)
+        
+        # 3. Mỗi node gặp nhau cập nhật 1 khối nguồn × đích bằng NumPy (min-plus)
+        result = np.full((len(sources), len(targets)), np.inf)
+        for node, (s_indices, s_dist) in meetings.items():
+            t_indices, t_dist = buckets[node]
+            block = np.ix_(s_indices, t_indices)
+            result[block] = np.minimum(result[block], np.add.outer(s_dist, t_dist))
+        return result
+    
+    def distance(self, source, target):
+        """Khoảng cách 1 cặp (km), inf nếu không có đường"""
+        return float(self.many_to_many([source], [target])[0][0])
+
+
+_hierarchies = {}
+_hierarchies_lock = threading.Lock()
+
+
+def load_contraction_hierarchy(directory):
+    """Chỉ mục CH dùng chung cho cả process theo thư mục (mmap, chỉ mở file 1 lần)"""
+    directory = os.path.abspath(directory)
+    with _hierarchies_lock:
+        hierarchy = _hierarchies.get(directory)
+        if hierarchy is None:
+            hierarchy = _hierarchies[directory] = ContractionHierarchy.load(directory)
+            print(f"⛓️  Đã tải contraction hierarchy {os.path.basename(directory)}: "
+                  f"{hierarchy.n_nodes:,} node, {hierarchy.n_edges:,} cạnh")
+        return hierarchy
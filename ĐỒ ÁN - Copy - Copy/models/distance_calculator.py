@@ -1,24 +1,81 @@
 """
 Module tính toán khoảng cách sử dụng OSRM API với caching
 """
-import requests
+import asyncio
+import math
+import os
 import numpy as np
-import time
-from geopy.distance import geodesic
-from .cache import DistanceCache
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from .cache import get_shared_cache, make_pair_key
+from .contraction_hierarchy import load_contraction_hierarchy
+from .distance_matrix import DistanceMatrix, matrix_pairs
+from .geo import estimate_distance_matrix
+from .http_client import get_session, request_json, RemoteUnavailable, TokenBucket
+from .road_network import load_road_network
+from .single_flight import SingleFlight
+from config import (CACHE_SNAP_TOLERANCE_M, DISTANCE_MATRIX_SYMMETRIC, DISTANCE_PROVIDER, GEODESIC_METHOD, GEODESIC_MULTIPLIER, OSRM_BASE_URL, OSRM_PROFILE, OSRM_TABLE_URL, OSRM_TABLE_MAX_COORDINATES, OSRM_MATRIX_MODE,
+                    OSRM_TIMEOUT, OSRM_DELAY, OSRM_MAX_WORKERS, OSRM_RETRIES, ROAD_NETWORK_CH_DIR, ROAD_NETWORK_FILE, ROAD_NETWORK_SNAP_MAX_M)
+
+
+# Rate limiter dùng chung cho cả process: trung bình 1 request / OSRM_DELAY giây
+_rate_limiter = TokenBucket(rate=1 / OSRM_DELAY if OSRM_DELAY else 0, capacity=OSRM_MAX_WORKERS)
+
+# Các cặp tọa độ đang được lấy từ OSRM - request song song cần cùng cặp thì chờ thay vì gọi lại
+pair_flight = SingleFlight()
 
 
 class OSRMDistanceCalculator:
     """
     Tính khoảng cách MIỄN PHÍ bằng OSRM với cache để tránh gọi lại
+    
+    Hai chế độ lấy ma trận:
+    - 'table': gọi /table/v1/driving, lấy cả ma trận (hoặc từng khối lớn) trong 1 request
+    - 'route': gọi /route/v1/driving cho từng cặp (n·(n−1) request, chạy song song)
+    
+    Mọi request dùng chung 1 Session keep-alive, chạy trên thread pool giới hạn
+    OSRM_MAX_WORKERS luồng và đi qua token bucket (thay cho time.sleep cố định).
+    
+    Server chậm / mất kết nối: timeout tự co giãn theo độ trễ quan sát được (tối đa
+    timeout), lỗi tạm thời được thử lại với backoff + jitter, và sau OSRM_BREAKER_THRESHOLD
+    lỗi liên tiếp circuit breaker ngừng gọi server → các ô còn lại dùng fallback ngay
+    thay vì chờ hết timeout từng ô (xem models/http_client.py).
+    
+    snap_tolerance_m (vd 200): ô không có trong cache sẽ thử dùng lại khoảng cách của
+    cặp điểm đã cache nằm trong cùng 2 ô lưới, các ô dùng lại được liệt kê trong
+    self.approximate_cells kèm tolerance và mức hiệu chỉnh.
+    
+    symmetric=True (get_distance_matrix): chỉ lấy các cặp i<j rồi lật sang j>i,
+    mỗi cặp không thứ tự chỉ có 1 entry cache → giảm một nửa số request và kích thước cache.
+    
+    Cặp đang được 1 lần tính khác (thread khác) lấy từ OSRM sẽ chờ kết quả đó
+    thay vì gửi request trùng (pair_flight).
+    
+    Sau mỗi lần gọi, cell_sources = {(i, j): 'disk' | 'osrm' | 'estimate'} cho biết ô
+    lấy từ cache, từ OSRM hay là ước lượng; get_distance_matrix gắn thêm DistanceMatrix.sources.
     """
     
-    def __init__(self, use_cache=True):
-        self.base_url = "http://router.project-osrm.org/route/v1/driving"
+    def __init__(self, use_cache=True, base_url=None, table_url=None, mode=None, max_table_size=None,
+                 max_workers=None, timeout=None, rate_limiter=None, snap_tolerance_m=CACHE_SNAP_TOLERANCE_M,
+                 retries=OSRM_RETRIES):
+        self.base_url = base_url or OSRM_BASE_URL
+        self.table_url = table_url or OSRM_TABLE_URL
+        self.mode = mode or OSRM_MATRIX_MODE
+        self.profile = OSRM_PROFILE
+        self.max_table_size = max_table_size or OSRM_TABLE_MAX_COORDINATES
+        self.max_workers = max_workers or OSRM_MAX_WORKERS
+        self.timeout = timeout or OSRM_TIMEOUT
+        self.rate_limiter = rate_limiter or _rate_limiter
+        self.retries = retries
+        self.session = get_session(pool_size=self.max_workers)
         self.use_cache = use_cache
-        self.cache = DistanceCache() if use_cache else None
+        self.cache = get_shared_cache() if use_cache else None
+        self.snap_tolerance_m = snap_tolerance_m
         self.cache_hits = 0
         self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
     
     def get_distance(self, coord1, coord2):
         """
@@ -27,15 +84,16 @@ class OSRMDistanceCalculator:
         Args:
             coord1: (lat, lng)
             coord2: (lat, lng)
-            
+        
         Returns:
             float: Khoảng cách tính bằng km, hoặc None nếu lỗi
         """
         url = f"{self.base_url}/{coord1[1]},{coord1[0]};{coord2[1]},{coord2[0]}"
         
         try:
-            response = requests.get(url, params={'overview': 'false'}, timeout=10)
-            data = response.json()
+            data = self._request(url, {'overview': 'false'})
+            if data is None:
+                return None
             
             if data['code'] == 'Ok':
                 distance_meters = data['routes'][0]['distance']
@@ -47,63 +105,748 @@ class OSRMDistanceCalculator:
             print(f"✗ Lỗi khi gọi OSRM: {e}")
             return None
     
-    def get_distance_matrix(self, coordinates_dict):
+    def _request(self, url, params):
+        """GET qua circuit breaker + retry, trả về JSON hoặc None nếu server không trả lời được"""
+        try:
+            return request_json(self.session, url, params, rate_limiter=self.rate_limiter,
+                                retries=self.retries, max_timeout=self.timeout)
+        except RemoteUnavailable as e:
+            # Breaker đang mở → không in từng ô (breaker đã báo khi mở)
+            if not e.circuit_open:
+                print(f"✗ Lỗi khi gọi OSRM: {e}")
+            return None
+    
+    def get_distance_table(self, sources, destinations):
+        """
+        Lấy khối khoảng cách sources × destinations bằng MỘT request /table
+        
+        Args:
+            sources: list [(lat, lng), ...]
+            destinations: list [(lat, lng), ...]
+        
+        Returns:
+            list[list[float|None]]: khoảng cách km (None nếu không có đường),
+            hoặc None nếu cả request lỗi
+        """
+        # Gộp tọa độ, nếu sources và destinations trùng nhau thì chỉ gửi 1 lần
+        if sources == destinations:
+            coords = list(sources)
+            source_idx = list(range(len(sources)))
+            dest_idx = source_idx
+        else:
+            coords = list(sources) + list(destinations)
+            source_idx = list(range(len(sources)))
+            dest_idx = list(range(len(sources), len(coords)))
+        
+        coord_str = ';'.join(f"{lng},{lat}" for lat, lng in coords)
+        url = f"{self.table_url}/{coord_str}"
+        params = {
+            'annotations': 'distance',
+            'sources': ';'.join(map(str, source_idx)),
+            'destinations': ';'.join(map(str, dest_idx))
+        }
+        
+        try:
+            data = self._request(url, params)
+            if data is None:
+                return None
+            
+            if data['code'] == 'Ok':
+                return [
+                    [d / 1000 if d is not None else None for d in row]
+                    for row in data['distances']
+                ]
+            else:
+                print(f"⚠️ OSRM table error: {data.get('message', 'Unknown')}")
+                return None
+        except Exception as e:
+            print(f"✗ Lỗi khi gọi OSRM table: {e}")
+            return None
+    
+    def _table_blocks(self, n):
+        """
+        Chia n điểm thành các khối để mỗi request table không vượt giới hạn tọa độ
+        
+        Nếu n <= max_table_size → 1 khối duy nhất (cả ma trận trong 1 request).
+        Ngược lại mỗi tile gồm 1 khối nguồn + 1 khối đích nên mỗi khối tối đa max_table_size // 2.
+        """
+        if n <= self.max_table_size:
+            return [range(n)]
+        block_size = max(1, self.max_table_size // 2)
+        return [range(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+    
+    def get_distance_matrix(self, coordinates_dict, mode=None, symmetric=None):
         """
         Tạo ma trận khoảng cách cho tất cả các điểm với caching
         
         Args:
             coordinates_dict: {city_name: (lat, lng), ...}
+            mode: 'table' hoặc 'route' (mặc định lấy theo self.mode)
+            symmetric: True → chỉ lấy i<j rồi lật sang j>i (mặc định DISTANCE_MATRIX_SYMMETRIC)
         
         Returns:
-            numpy.ndarray: Ma trận khoảng cách
+            DistanceMatrix: Ma trận khoảng cách (ndarray, .symmetric cho biết chế độ)
         """
+        if symmetric is None:
+            symmetric = DISTANCE_MATRIX_SYMMETRIC
+        if (mode or self.mode) == 'table':
+            return self._get_distance_matrix_table(coordinates_dict, symmetric)
+        
         city_names = list(coordinates_dict.keys())
+        coords = [coordinates_dict[name] for name in city_names]
         n = len(city_names)
         distance_matrix = np.zeros((n, n))
+        pairs = matrix_pairs(coords, symmetric)
         
-        total_requests = n * (n - 1)
+        total_requests = len(pairs)
         self.cache_hits = 0
         self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
         
         print(f"\n🔍 Đang tính toán ma trận khoảng cách (OSRM API với Cache)...")
         print(f"   Tổng số cặp: {total_requests}")
         
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    city1 = city_names[i]
-                    city2 = city_names[j]
-                    coord1 = coordinates_dict[city1]
-                    coord2 = coordinates_dict[city2]
-                    
-                    # Kiểm tra cache trước
-                    if self.use_cache and self.cache.has(city1, city2):
-                        distance = self.cache.get(city1, city2)
-                        self.cache_hits += 1
-                        distance_matrix[i][j] = distance
-                        print(f"  💾 {city1} → {city2}: {distance:.2f} km (cached)")
-                    else:
-                        # Gọi API
-                        distance = self.get_distance(coord1, coord2)
-                        self.api_calls += 1
-                        
-                        if distance:
-                            distance_matrix[i][j] = distance
-                            # Lưu vào cache
-                            if self.use_cache:
-                                self.cache.set(city1, city2, distance)
-                            print(f"  ✓ {city1} → {city2}: {distance:.2f} km")
-                        else:
-                            # Fallback: dùng khoảng cách đường chim bay × 1.3
-                            distance = geodesic(coord1, coord2).kilometers * 1.3
-                            distance_matrix[i][j] = distance
-                            if self.use_cache:
-                                self.cache.set(city1, city2, distance)
-                            print(f"  ≈ {city1} → {city2}: {distance:.2f} km (ước lượng)")
-                        
-                        # Delay chỉ khi gọi API
-                        time.sleep(0.1)
-        
-        print(f"✓ Hoàn thành! Cache hits: {self.cache_hits}/{total_requests} ({self.cache_hits/total_requests*100:.1f}%)")
+        # 1. Kiểm tra cache trước
+        missing = self._read_cache(city_names, coords, distance_matrix, pairs)
+        
+        # 2. Gọi API song song cho các cặp chưa có (rate limiter điều tiết tốc độ)
+        fetched, _ = self.fetch_distances(coords, missing, 'route')
+        results = [fetched.get(pair) for pair in missing]
+        
+        # 3. Điền kết quả (fallback nếu lỗi) và lưu cache 1 lần
+        self._store_results(city_names, coords, distance_matrix, missing, results)
+        
+        self._print_summary(total_requests)
+        return self._finish_matrix(distance_matrix, pairs, symmetric, self.cell_sources)
+    
+    async def get_distance_matrix_async(self, coordinates_dict, max_concurrency=None, timeout=None, symmetric=None, mode=None):
+        """
+        Phiên bản asyncio của get_distance_matrix
+        
+        Các ô chưa có trong cache được chia thành request giống bản sync (table: các
+        request 1×k / k×1, route: từng cặp), mỗi request là 1 coroutine. Cặp đang được
+        request khác lấy (pair_flight) thì chờ kết quả đó thay vì gọi lại. Có thể await
+        từ server async hoặc chạy bằng asyncio.run() trong script.
+        
+        Giới hạn (HTTP vẫn dùng requests - blocking, chạy trên thread pool riêng):
+        - Không bao giờ có quá max_concurrency request OSRM cùng lúc: 1 chỗ chỉ được trả
+          khi thread chạy xong request, kể cả khi coroutine đã thôi chờ
+        - timeout tính từ lúc request bắt đầu chạy; quá hạn → các ô của request đó dùng
+          fallback, nhưng thread vẫn chạy nốt request HTTP đang dở (tối đa self.timeout
+          mỗi lần thử) và giữ chỗ tới khi xong
+        - Hủy (cancel): request chưa bắt đầu bị bỏ, request đang chạy được chạy nốt nhưng
+          bỏ kết quả; các cặp đã nhận trong pair_flight trả None cho bên đang chờ
+        
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            max_concurrency: số request đồng thời tối đa (mặc định self.max_workers)
+            timeout: timeout cho mỗi request, giây (mặc định self.timeout)
+            symmetric: như get_distance_matrix
+            mode: 'table' hoặc 'route' (mặc định lấy theo self.mode)
+        
+        Returns:
+            DistanceMatrix: Ma trận khoảng cách (giống hệt bản sync)
+        """
+        if symmetric is None:
+            symmetric = DISTANCE_MATRIX_SYMMETRIC
+        city_names = list(coordinates_dict.keys())
+        coords = [coordinates_dict[name] for name in city_names]
+        n = len(city_names)
+        distance_matrix = np.zeros((n, n))
+        pairs = matrix_pairs(coords, symmetric)
+        
+        total_requests = len(pairs)
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
+        
+        print(f"\n🔍 Đang tính toán ma trận khoảng cách (OSRM API async với Cache)...")
+        print(f"   Tổng số cặp: {total_requests}")
+        
+        missing = self._read_cache(city_names, coords, distance_matrix, pairs)
+        
+        keys = {pair: make_pair_key(coords[pair[0]], coords[pair[1]], self.profile) for pair in missing}
+        owned, waiting = pair_flight.claim(keys.values())
+        owned = set(owned)
+        leaders = {}
+        for pair, key in keys.items():
+            if key in owned:
+                leaders.setdefault(key, pair)
+        units = self._request_units(list(leaders.values()), mode)
+        
+        concurrency = max_concurrency or self.max_workers
+        request_timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        slots = asyncio.Semaphore(concurrency)
+        fetched = {}
+        
+        async def fetch(unit):
+            await slots.acquire()
+            future = loop.run_in_executor(executor, self._fetch_unit, coords, unit, mode)
+            # Trả chỗ khi thread chạy xong, không phải khi coroutine thôi chờ
+            future.add_done_callback(lambda _: slots.release())
+            try:
+                fetched.update(await asyncio.wait_for(asyncio.shield(future), timeout=request_timeout))
+            except asyncio.TimeoutError:
+                print(f"  ⏱️ Request {unit}: quá {request_timeout}s")
+        
+        async def wait_other(key, future):
+            try:
+                return key, await asyncio.wait_for(asyncio.wrap_future(future), timeout=request_timeout)
+            except asyncio.TimeoutError:
+                return key, None
+        
+        try:
+            await asyncio.gather(*(fetch(unit) for unit in units))
+            shared = dict(await asyncio.gather(*(wait_other(key, future) for key, future in waiting.items())))
+        finally:
+            pair_flight.resolve({key: fetched.get(pair) for key, pair in leaders.items()})
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        by_key = {key: fetched.get(pair) for key, pair in leaders.items()}
+        by_key.update(shared)
+        results = [by_key[keys[pair]] for pair in missing]
+        self._store_results(city_names, coords, distance_matrix, missing, results)
+        # _store_results đếm 1 call / ô, ở chế độ table là 1 call / request
+        self.api_calls = len(units)
+        
+        self._print_summary(total_requests)
+        return self._finish_matrix(distance_matrix, pairs, symmetric, self.cell_sources)
+    
+    def get_distances(self, coordinates_dict, pairs, mode=None):
+        """
+        Chỉ tính các ô (i, j) được yêu cầu thay vì cả ma trận
+        
+        Dùng khi thêm 1 thành phố (chỉ cần hàng + cột mới).
+        Cache được đọc trước; ở chế độ 'table' các ô thiếu được gom thành các
+        request 1×k / k×1 (xem _table_stars), ở chế độ 'route' gọi song song từng cặp.
+        
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...} - chỉ số i, j theo thứ tự này
+            pairs: list [(i, j), ...]
+            mode: 'table' hoặc 'route' (mặc định lấy theo self.mode)
+        
+        Returns:
+            dict {(i, j): km}
+        """
+        city_names = list(coordinates_dict.keys())
+        coords = [coordinates_dict[name] for name in city_names]
+        n = len(city_names)
+        distance_matrix = np.zeros((n, n))
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
+        
+        missing = self._read_cache(city_names, coords, distance_matrix, pairs, verbose=False)
+        fetched, requests = self.fetch_distances(coords, missing, mode)
+        self._store_results(city_names, coords, distance_matrix, missing, [fetched.get(pair) for pair in missing])
+        # _store_results đếm 1 call / ô, ở chế độ table là 1 call / request
+        self.api_calls = requests
+        print(f"  🔍 {len(pairs)} ô: cache {self.cache_hits}, API calls {self.api_calls}")
+        return {(i, j): float(distance_matrix[i][j]) for i, j in pairs}
+    
+    def fetch_distances(self, coords, pairs, mode=None):
+        """
+        Gọi OSRM cho các ô (i, j) - không đọc/ghi cache, không fallback
+        
+        Ở chế độ 'table' các ô được gom thành các request 1×k / k×1 (xem _table_stars),
+        ở chế độ 'route' gọi song song từng cặp. Ô đang được thread khác lấy thì chờ
+        kết quả của thread đó.
+        
+        Args:
+            coords: list [(lat, lng), ...]
+        
+        Returns:
+            (dict {(i, j): km} chỉ gồm các ô lấy được, số request đã gửi)
+        """
+        requests = []
+        
+        def fetch(owned):
+            found, count = self._fetch_remote(coords, owned, mode)
+            requests.append(count)
+            return found
+        
+        results = self._fetch_coalesced(coords, pairs, fetch)
+        return {pair: distance for pair, distance in results.items() if distance}, sum(requests)
+    
+    def _fetch_coalesced(self, coords, pairs, fetch):
+        """
+        Chỉ gọi fetch(list cặp) → {(i, j): km} cho các cặp chưa có thread nào đang lấy
+        
+        Các cặp trùng tọa độ chỉ lấy 1 lần; cặp đang được thread khác lấy thì chờ Future
+        của nó. Kết quả (kể cả None khi lỗi) luôn được trả cho các thread đang chờ.
+        
+        Returns:
+            dict {(i, j): km hoặc None} cho mọi cặp trong pairs
+        """
+        keys = {pair: make_pair_key(coords[pair[0]], coords[pair[1]], self.profile) for pair in pairs}
+        owned, waiting = pair_flight.claim(keys.values())
+        owned = set(owned)
+        leaders = {}
+        for pair, key in keys.items():
+            if key in owned:
+                leaders.setdefault(key, pair)
+        
+        fetched = {}
+        try:
+            if leaders:
+                fetched = fetch(list(leaders.values()))
+        finally:
+            pair_flight.resolve({key: fetched.get(pair) for key, pair in leaders.items()})
+        
+        by_key = {key: fetched.get(pair) for key, pair in leaders.items()}
+        by_key.update({key: future.result() for key, future in waiting.items()})
+        return {pair: by_key[key] for pair, key in keys.items()}
+    
+    def _fetch_remote(self, coords, pairs, mode=None):
+        """fetch_distances không gộp request: (dict {(i, j): km}, số request)"""
+        if not pairs:
+            return {}, 0
+        units = self._request_units(pairs, mode)
+        fetched = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for found in executor.map(lambda unit: self._fetch_unit(coords, unit, mode), units):
+                fetched.update(found)
+        return fetched, len(units)
+    
+    def _request_units(self, pairs, mode=None):
+        """Chia các ô thành các request OSRM độc lập: table → (sources, destinations), route → từng cặp (i, j)"""
+        if (mode or self.mode) == 'table':
+            return self._table_stars(pairs, self.max_table_size - 1)
+        return list(pairs)
+    
+    def _fetch_unit(self, coords, unit, mode=None):
+        """Gửi 1 request của _request_units → {(i, j): km} các ô lấy được"""
+        if (mode or self.mode) == 'table':
+            sources, destinations = unit
+            table = self.get_distance_table([coords[i] for i in sources], [coords[j] for j in destinations])
+            if not table:
+                return {}
+            return {(i, j): table[a][b] for a, i in enumerate(sources) for b, j in enumerate(destinations) if table[a][b]}
+        i, j = unit
+        distance = self.get_distance(coords[i], coords[j])
+        return {unit: distance} if distance else {}
+    
+    @staticmethod
+    def _table_stars(pairs, limit):
+        """
+        Gom các ô rời rạc thành các request table dạng "ngôi sao": 1 nguồn × k đích hoặc k nguồn × 1 đích
+        
+        Tham lam: mỗi bước chọn điểm xuất hiện nhiều nhất (làm nguồn hoặc làm đích) trong
+        các ô còn lại. Thêm 1 thành phố → đúng 2 request (hàng mới + cột mới).
+        
+        Args:
+            limit: số điểm tối đa ở phía "k" của 1 request (max_table_size − 1)
+        
+        Returns:
+            list[(sources, destinations)]
+        """
+        remaining = set(pairs)
+        stars = []
+        while remaining:
+            (src, out_count), = Counter(i for i, _ in remaining).most_common(1)
+            (dst, in_count), = Counter(j for _, j in remaining).most_common(1)
+            if out_count >= in_count:
+                covered = sorted(pair for pair in remaining if pair[0] == src)
+                stars.extend(([src], [j for _, j in covered[k:k + limit]]) for k in range(0, len(covered), limit))
+            else:
+                covered = sorted(pair for pair in remaining if pair[1] == dst)
+                stars.extend(([i for i, _ in covered[k:k + limit]], [dst]) for k in range(0, len(covered), limit))
+            remaining.difference_update(covered)
+        return stars
+    
+    @staticmethod
+    def _finish_matrix(distance_matrix, pairs, symmetric, cell_sources=None):
+        """
+        Chế độ đối xứng: lật các ô đã tính (i, j) sang (j, i), gắn metadata cho kết quả
+        
+        cell_sources: {(i, j): nguồn} → DistanceMatrix.sources (lật theo cùng cách)
+        """
+        sources = None
+        if cell_sources is not None:
+            sources = np.full(distance_matrix.shape, None, dtype=object)
+            for (i, j), source in cell_sources.items():
+                sources[i][j] = source
+        if symmetric:
+            for i, j in pairs:
+                distance_matrix[j][i] = distance_matrix[i][j]
+                if sources is not None:
+                    sources[j][i] = sources[i][j]
+        return DistanceMatrix(distance_matrix, symmetric=symmetric, sources=sources)
+    
+    def _read_cache(self, city_names, coords, distance_matrix, pairs, verbose=True):
+        """
+        Điền các ô đã có trong cache (key theo tọa độ) vào distance_matrix
+        
+        Nếu bật snap_tolerance_m, ô không có trong cache sẽ thử tra gần đúng theo ô lưới.
+        
+        Args:
+            pairs: các ô (i, j) cần tính (xem matrix_pairs)
+        
+        Returns:
+            list[(i, j)]: các cặp còn thiếu, cần gọi API
+        """
+        missing = []
+        for i, j in pairs:
+            city1, city2 = city_names[i], city_names[j]
+            distance = self.cache.get(coords[i], coords[j], self.profile) if self.use_cache else None
+            if distance is not None:
+                self.cache_hits += 1
+                self.cell_sources[(i, j)] = 'disk'
+                distance_matrix[i][j] = distance
+                if verbose:
+                    print(f"  💾 {city1} → {city2}: {distance:.2f} km (cached)")
+                continue
+            
+            if self.use_cache and self.snap_tolerance_m:
+                approx = self.cache.get_approx(coords[i], coords[j], self.snap_tolerance_m, self.profile)
+                if approx:
+                    self.cache_hits += 1
+                    self.cell_sources[(i, j)] = 'disk'
+                    distance_matrix[i][j] = approx['distance']
+                    self.approximate_cells.append({'from': city1, 'to': city2, **approx})
+                    print(f"  🎯 {city1} → {city2}: {approx['distance']:.2f} km "
+                          f"(cache lưới {approx['tolerance_m']}m, hiệu chỉnh {approx['correction_km']:+.2f} km)")
+                    continue
+            
+            missing.append((i, j))
+        return missing
+    
+    def _store_results(self, city_names, coords, distance_matrix, pairs, results):
+        """
+        Điền kết quả API vào ma trận (fallback đường chim bay nếu lỗi) và ghi cache 1 lần
+        
+        Ô ước lượng không được ghi cache → lần sau (OSRM đã hoạt động lại) lấy lại số thật.
+        """
+        new_entries = []
+        estimates = None
+        for (i, j), distance in zip(pairs, results):
+            self.api_calls += 1
+            city1, city2 = city_names[i], city_names[j]
+            if distance:
+                print(f"  ✓ {city1} → {city2}: {distance:.2f} km")
+                self.cell_sources[(i, j)] = 'osrm'
+                new_entries.append((coords[i], coords[j], distance, (city1, city2)))
+            else:
+                # Fallback: đường chim bay × GEODESIC_MULTIPLIER, tính cả ma trận 1 lần khi cần
+                if estimates is None:
+                    estimates = estimate_distance_matrix(coords)
+                distance = estimates[i][j]
+                print(f"  ≈ {city1} → {city2}: {distance:.2f} km (ước lượng)")
+                self.cell_sources[(i, j)] = 'estimate'
+            distance_matrix[i][j] = distance
+        
+        if self.use_cache and new_entries:
+            self.cache.set_many(new_entries, profile=self.profile)
+            self.cache.flush()
+        return new_entries
+    
+    def _print_summary(self, total_requests):
+        hit_rate = self.cache_hits / total_requests * 100 if total_requests else 100.0
+        print(f"✓ Hoàn thành! Cache hits: {self.cache_hits}/{total_requests} ({hit_rate:.1f}%)")
         print(f"  API calls: {self.api_calls}, Cached: {self.cache_hits}\n")
-        return distance_matrix
+    
+    def _get_distance_matrix_table(self, coordinates_dict, symmetric=False):
+        """
+        Chế độ 'table': đọc cache trước, sau đó lấy các ô còn thiếu theo từng tile
+        bằng /table/v1/driving và ghi toàn bộ kết quả mới vào cache trong 1 lần
+        
+        Chế độ đối xứng: chỉ lấy n·(n−1)/2 ô (i, j) của matrix_pairs, mỗi ô đọc đúng
+        chiều i → j của cặp (thứ tự theo canonical_pair) → giá trị khớp key cache
+        của chiều đó, kể cả khi đường 2 chiều dài khác nhau.
+        """
+        city_names = list(coordinates_dict.keys())
+        coords = [coordinates_dict[name] for name in city_names]
+        n = len(city_names)
+        distance_matrix = np.zeros((n, n))
+        pairs = matrix_pairs(coords, symmetric)
+        
+        total_requests = len(pairs)
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
+        
+        print(f"\n🔍 Đang tính toán ma trận khoảng cách (OSRM Table với Cache)...")
+        print(f"   Tổng số cặp: {total_requests}")
+        
+        # 1. Đọc cache - đánh dấu các ô còn thiếu (ô sẽ đọc từ kết quả table)
+        missing_pairs = self._read_cache(city_names, coords, distance_matrix, pairs, verbose=False)
+        
+        # 2. Gọi /table song song cho các tile có ô thiếu (bỏ các ô thread khác đang lấy)
+        def fetch_tiles(owned_pairs):
+            missing = np.zeros((n, n), dtype=bool)
+            for i, j in owned_pairs:
+                missing[i][j] = True
+            blocks = self._table_blocks(n)
+            tiles = [
+                (src_block, dst_block)
+                for src_block in blocks
+                for dst_block in blocks
+                if missing[np.ix_(src_block, dst_block)].any()
+            ]
+            
+            def fetch_tile(tile):
+                src_block, dst_block = tile
+                return self.get_distance_table([coords[i] for i in src_block], [coords[j] for j in dst_block])
+            
+            fetched = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for (src_block, dst_block), table in zip(tiles, executor.map(fetch_tile, tiles)):
+                    self.api_calls += 1
+                    print(f"  📡 Tile {len(src_block)}×{len(dst_block)}: {'OK' if table else 'lỗi'}")
+                    if not table:
+                        continue
+                    for a, i in enumerate(src_block):
+                        for b, j in enumerate(dst_block):
+                            if missing[i][j]:
+                                fetched[(i, j)] = table[a][b]
+            return {pair: fetched.get(pair) for pair in owned_pairs}
+        
+        fetched = self._fetch_coalesced(coords, missing_pairs, fetch_tiles)
+        
+        new_entries = []
+        estimates = None
+        for i, j in missing_pairs:
+            distance = fetched.get((i, j))
+            if distance:
+                self.cell_sources[(i, j)] = 'osrm'
+                new_entries.append((coords[i], coords[j], distance, (city_names[i], city_names[j])))
+            else:
+                # Fallback: đường chim bay × GEODESIC_MULTIPLIER (tính vector hóa 1 lần)
+                if estimates is None:
+                    estimates = estimate_distance_matrix(coords)
+                distance = estimates[i][j]
+                print(f"  ≈ {city_names[i]} → {city_names[j]}: {distance:.2f} km (ước lượng)")
+                self.cell_sources[(i, j)] = 'estimate'
+            distance_matrix[i][j] = distance
+        
+        # 3. Ghi cache 1 lần cho cả ma trận (chỉ ô lấy được từ OSRM, không ghi ô ước lượng)
+        if self.use_cache and new_entries:
+            self.cache.set_many(new_entries, profile=self.profile)
+            self.cache.flush()
+        
+        hit_rate = self.cache_hits / total_requests * 100 if total_requests else 100.0
+        print(f"✓ Hoàn thành! Cache hits: {self.cache_hits}/{total_requests} ({hit_rate:.1f}%)")
+        print(f"  Table requests: {self.api_calls}, Ô mới: {len(new_entries)}, "
+              f"Ước lượng: {len(missing_pairs) - len(new_entries)}, Cached: {self.cache_hits}"
+              f" (gần đúng: {len(self.approximate_cells)})\n")
+        return self._finish_matrix(distance_matrix, pairs, symmetric, self.cell_sources)
+
+
+class GeodesicDistanceCalculator:
+    """
+    Provider offline: ước lượng cả ma trận = đường chim bay × GEODESIC_MULTIPLIER
+    
+    Không gọi mạng, không dùng cache - toàn bộ N×N tính trong 1 lần gọi NumPy.
+    Cùng interface với OSRMDistanceCalculator.
+    """
+    
+    def __init__(self, method=GEODESIC_METHOD, multiplier=GEODESIC_MULTIPLIER):
+        self.method = method
+        self.multiplier = multiplier
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+    
+    def get_distance(self, coord1, coord2):
+        """Khoảng cách ước lượng (km) giữa 2 điểm"""
+        return float(estimate_distance_matrix([coord1, coord2], self.method, self.multiplier)[0][1])
+    
+    def get_distance_matrix(self, coordinates_dict, mode=None, symmetric=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+        
+        Returns:
+            DistanceMatrix: Ma trận khoảng cách ước lượng (luôn đối xứng)
+        """
+        coords = list(coordinates_dict.values())
+        distance_matrix = estimate_distance_matrix(coords, self.method, self.multiplier)
+        print(f"\n📐 Ma trận ước lượng {len(coords)}×{len(coords)} ({self.method} × {self.multiplier})\n")
+        return DistanceMatrix(distance_matrix, symmetric=True)
+    
+    def get_distances(self, coordinates_dict, pairs, mode=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            pairs: list [(i, j), ...]
+        
+        Returns:
+            dict {(i, j): km}
+        """
+        if not pairs:
+            return {}
+        coords = np.asarray(list(coordinates_dict.values()), dtype=float)
+        # Chỉ tính trên các điểm có mặt trong pairs
+        used = sorted({i for pair in pairs for i in pair})
+        position = {index: k for k, index in enumerate(used)}
+        estimates = estimate_distance_matrix(coords[used], self.method, self.multiplier)
+        return {(i, j): float(estimates[position[i]][position[j]]) for i, j in pairs}
+
+
+class RoadNetworkDistanceCalculator:
+    """
+    Provider offline theo mạng lưới đường thật từ bản trích OSM local (xem models/road_network.py)
+    
+    - Mỗi thành phố được gắn vào node đường gần nhất (trong snap_max_m mét)
+    - Có chỉ mục contraction hierarchy (ch_dir) → cả ma trận bằng 1 truy vấn bucket nhiều-nhiều
+    - Không có → mỗi nguồn chạy 1 lần Dijkstra nhiều đích (cả hàng của ma trận)
+    - Không gọi mạng → không có độ trễ, ma trận lần đầu luôn cho kết quả cố định
+    
+    Cặp không gắn được vào graph hoặc không có đường đi sẽ dùng fallback đường
+    chim bay × GEODESIC_MULTIPLIER như OSRMDistanceCalculator. Cùng interface với
+    OSRMDistanceCalculator (api_calls = số lần truy vấn CH / chạy Dijkstra).
+    graph_file / ch_dir tương đối được tính từ thư mục project (giống file cache).
+    """
+    
+    def __init__(self, graph_file=ROAD_NETWORK_FILE, snap_max_m=ROAD_NETWORK_SNAP_MAX_M, ch_dir=ROAD_NETWORK_CH_DIR):
+        base_dir = Path(__file__).parent.parent
+        graph_file = str(base_dir / graph_file)
+        ch_dir = str(base_dir / ch_dir) if ch_dir else ch_dir
+        self.network = load_road_network(graph_file)
+        self.snap_max_m = snap_max_m
+        self.hierarchy = None
+        if ch_dir and os.path.isdir(ch_dir):
+            hierarchy = load_contraction_hierarchy(ch_dir)
+            if hierarchy.n_nodes == self.network.n_nodes:
+                self.hierarchy = hierarchy
+            else:
+                print(f"⚠️ Chỉ mục CH {ch_dir} không khớp {graph_file} - dùng Dijkstra")
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
+    
+    def _snap(self, coords):
+        """Node gần nhất cho từng tọa độ (None nếu xa graph hơn snap_max_m)"""
+        return [self.network.nearest_node(coord, self.snap_max_m)[0] for coord in coords]
+    
+    def get_distance(self, coord1, coord2):
+        """Khoảng cách đường bộ (km) giữa 2 điểm, None nếu không có đường"""
+        source, target = self._snap([coord1, coord2])
+        if source is None or target is None:
+            return None
+        if self.hierarchy is not None:
+            distance = self.hierarchy.distance(source, target)
+            return distance if math.isfinite(distance) else None
+        return self.network.shortest_distances(source, [target]).get(target)
+    
+    def get_distances(self, coordinates_dict, pairs, mode=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            pairs: list [(i, j), ...]
+        
+        Returns:
+            dict {(i, j): km}
+        """
+        city_names = list(coordinates_dict.keys())
+        coords = [coordinates_dict[name] for name in city_names]
+        reached = self.road_distances(coords, pairs)
+        
+        results = {}
+        estimates = None
+        self.cell_sources = {}
+        for i, j in pairs:
+            distance = reached.get((i, j))
+            self.cell_sources[(i, j)] = 'road_network'
+            if distance is None:
+                if estimates is None:
+                    estimates = estimate_distance_matrix(coords)
+                distance = estimates[i][j]
+                print(f"  ≈ {city_names[i]} → {city_names[j]}: {distance:.2f} km (ước lượng)")
+                self.cell_sources[(i, j)] = 'estimate'
+            results[(i, j)] = float(distance)
+        return results
+    
+    def road_distances(self, coords, pairs):
+        """
+        Khoảng cách theo graph cho các ô (i, j) - không fallback
+        
+        Args:
+            coords: list [(lat, lng), ...]
+        
+        Returns:
+            dict {(i, j): km} chỉ gồm các ô gắn được vào graph và có đường đi
+        """
+        nodes = self._snap(coords)
+        self.api_calls = 0
+        snapped = [(i, j) for i, j in pairs if nodes[i] is not None and nodes[j] is not None]
+        if self.hierarchy is not None:
+            return self._query_hierarchy(nodes, snapped)
+        return self._query_dijkstra(nodes, snapped)
+    
+    def _query_dijkstra(self, nodes, pairs):
+        """Gom các đích theo nguồn → 1 lần Dijkstra cho mỗi nguồn"""
+        targets_by_source = {}
+        for i, j in pairs:
+            targets_by_source.setdefault(i, []).append(j)
+        reached = {}
+        for i, targets in targets_by_source.items():
+            self.api_calls += 1
+            found = self.network.shortest_distances(nodes[i], {nodes[j] for j in targets})
+            reached.update({(i, j): found[nodes[j]] for j in targets if nodes[j] in found})
+        return reached
+    
+    def _query_hierarchy(self, nodes, pairs):
+        """1 truy vấn bucket nhiều-nhiều cho mọi nguồn × mọi đích trong pairs"""
+        if not pairs:
+            return {}
+        sources = sorted({i for i, _ in pairs})
+        targets = sorted({j for _, j in pairs})
+        table = self.hierarchy.many_to_many([nodes[i] for i in sources], [nodes[j] for j in targets])
+        self.api_calls += 1
+        row = {i: k for k, i in enumerate(sources)}
+        col = {j: k for k, j in enumerate(targets)}
+        return {
+            (i, j): float(table[row[i]][col[j]])
+            for i, j in pairs
+            if math.isfinite(table[row[i]][col[j]])
+        }
+    
+    def get_distance_matrix(self, coordinates_dict, mode=None, symmetric=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            symmetric: True → chỉ tính i<j rồi lật (mặc định DISTANCE_MATRIX_SYMMETRIC)
+        
+        Returns:
+            DistanceMatrix: Ma trận khoảng cách đường bộ
+        """
+        if symmetric is None:
+            symmetric = DISTANCE_MATRIX_SYMMETRIC
+        coords = list(coordinates_dict.values())
+        n = len(coords)
+        pairs = matrix_pairs(coords, symmetric)
+        distance_matrix = np.zeros((n, n))
+        for (i, j), distance in self.get_distances(coordinates_dict, pairs).items():
+            distance_matrix[i][j] = distance
+        method = 'truy vấn CH' if self.hierarchy is not None else 'lần Dijkstra'
+        print(f"\n🗺️  Ma trận đường bộ offline {n}×{n}: {self.api_calls} {method}\n")
+        return OSRMDistanceCalculator._finish_matrix(distance_matrix, pairs, symmetric, self.cell_sources)
+
+
+def create_distance_calculator(provider=None):
+    """
+    Tạo calculator theo cấu hình DISTANCE_PROVIDER
+    
+    Args:
+        provider: 'osrm', 'geodesic', 'road_network' hoặc 'tiered' (mặc định lấy từ config)
+    """
+    provider = provider or DISTANCE_PROVIDER
+    if provider == 'osrm':
+        return OSRMDistanceCalculator()
+    if provider == 'geodesic':
+        return GeodesicDistanceCalculator()
+    if provider == 'road_network':
+        return RoadNetworkDistanceCalculator()
+    if provider == 'tiered':
+        # Import tại chỗ: models.providers dùng các calculator của module này
+        from .providers import TieredDistanceCalculator
+        return TieredDistanceCalculator()
+    raise ValueError(f"DISTANCE_PROVIDER không hợp lệ: {provider}")
@@ -0,0 +1,68 @@
+"""
+Ma trận khoảng cách kèm thông tin về cách tạo ra nó
+"""
+from collections import Counter
+
+import numpy as np
+
+
+class DistanceMatrix(np.ndarray):
+    """
+    numpy.ndarray N×N + metadata, dùng như ndarray bình thường (m[i][j], m[i, j], ...)
+    
+    Attributes:
+        symmetric: True nếu ma trận được lấy ở chế độ đối xứng (chỉ tính i<j rồi
+            lật sang j>i) → m[i][j] == m[j][i], solver có thể cắt tỉa theo đối xứng
+        sources: mảng object N×N tên tầng provider đã cho ra từng ô (None nếu không rõ)
+    """
+    
+    def __new__(cls, data, symmetric=False, sources=None):
+        obj = np.asarray(data, dtype=float).view(cls)
+        obj.symmetric = symmetric
+        obj.sources = sources
+        return obj
+    
+    def __array_finalize__(self, obj):
+        # Gọi khi view / slice / copy → giữ lại metadata của ma trận gốc
+        self.symmetric = getattr(obj, 'symmetric', False)
+        sources = getattr(obj, 'sources', None)
+        # Slice đổi kích thước → sources của ma trận gốc không còn khớp từng ô
+        self.sources = sources if sources is not None and sources.shape == self.shape else None
+    
+    def __reduce__(self):
+        # Giữ metadata khi pickle (vd chuyển qua multiprocessing)
+        reconstruct, args, state = super().__reduce__()
+        return reconstruct, args, (state, self.symmetric, self.sources)
+    
+    def __setstate__(self, state):
+        nd_state, self.symmetric, self.sources = state
+        super().__setstate__(nd_state)
+    
+    def source_counts(self):
+        """{tên tầng: số ô} của các ô ngoài đường chéo, None nếu không có sources"""
+        if self.sources is None:
+            return None
+        off_diagonal = ~np.eye(len(self.sources), dtype=bool)
+        return dict(Counter(source for source in self.sources[off_diagonal].tolist() if source is not None))
+
+
+def canonical_pair(i, j, coords):
+    """
+    Thứ tự chuẩn của cặp không thứ tự {i, j}: điểm có tọa độ nhỏ hơn đứng trước
+    
+    Dùng cho chế độ đối xứng → mỗi cặp chỉ có 1 key cache dù thứ tự thành phố thay đổi.
+    """
+    return (i, j) if tuple(coords[i]) <= tuple(coords[j]) else (j, i)
+
+
+def matrix_pairs(coords, symmetric=False):
+    """
+    Các ô cần tính của ma trận N×N
+    
+    - symmetric=False: mọi cặp (i, j), i != j → n·(n−1) ô
+    - symmetric=True:  mỗi cặp không thứ tự 1 lần (theo canonical_pair) → n·(n−1)/2 ô
+    """
+    n = len(coords)
+    if symmetric:
+        return [canonical_pair(i, j, coords) for i in range(n) for j in range(i + 1, n)]
+    return [(i, j) for i in range(n) for j in range(n) if i != j]
@@ -0,0 +1,152 @@
+"""
+Các hàm hình học trên mặt cầu: khoảng cách đường chim bay, chia lưới tọa độ
+"""
+import math
+
+import numpy as np
+
+from config import GEODESIC_METHOD, GEODESIC_MULTIPLIER
+
+
+EARTH_RADIUS_KM = 6371.0088
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def haversine_km(coord1, coord2):
+    """Khoảng cách đường chim bay (km) giữa 2 điểm (lat, lng)"""
+    lat1, lng1 = map(math.radians, coord1)
+    lat2, lng2 = map(math.radians, coord2)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_cell(coord, cell_size_m):
+    """
+    Ô lưới (kích thước xấp xỉ cell_size_m × cell_size_m mét) chứa điểm coord
+    
+    Chiều cao ô theo vĩ độ cố định; chiều rộng theo kinh độ tính tại tâm hàng
+    (co lại theo cos(lat)) → ô gần vuông ở mọi vĩ độ.
+    
+    Returns:
+        (row, col): chỉ số ô
+    """
+    dlat = cell_size_m / METERS_PER_DEGREE_LAT
+    row = math.floor(coord[0] / dlat)
+    col = math.floor(coord[1] / _cell_width_deg(row, dlat, cell_size_m))
+    return row, col
+
+
+def neighbour_cells(cell):
+    """9 ô lưới xung quanh (kể cả chính nó) - mọi điểm cách ≤ 1 cạnh ô đều nằm trong đó"""
+    row, col = cell
+    return [(row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)]
+
+
+def bounding_box(coord, radius_m):
+    """Hình chữ nhật lat/lng bao quanh vòng tròn bán kính radius_m: ((lat_min, lat_max), (lng_min, lng_max))"""
+    dlat = radius_m / METERS_PER_DEGREE_LAT
+    dlng = radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(coord[0])), 1e-6))
+    return (coord[0] - dlat, coord[0] + dlat), (coord[1] - dlng, coord[1] + dlng)
+
+
+def _cell_width_deg(row, dlat, cell_size_m):
+    center_lat = (row + 0.5) * dlat
+    return cell_size_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(center_lat)), 1e-6))
+
+
+# WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+
+def haversine_matrix(coords):
+    """
+    Ma trận khoảng cách đường chim bay N×N (km) - tính 1 lần bằng NumPy broadcasting
+    
+    Args:
+        coords: list [(lat, lng), ...] hoặc ndarray shape (N, 2)
+    """
+    points = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lng = points[:, 0], points[:, 1]
+    dlat = lat[None, :] - lat[:, None]
+    dlng = lng[None, :] - lng[:, None]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def haversine_pairs_km(lat1, lng1, lat2, lng2):
+    """Khoảng cách đường chim bay (km) theo từng phần tử của các mảng tọa độ (độ)"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def vincenty_matrix(coords, max_iter=200, tol=1e-12):
+    """
+    Ma trận khoảng cách trắc địa N×N (km) trên ellipsoid WGS-84 (Vincenty inverse, vector hóa)
+    
+    Chính xác hơn haversine (~0.5%) nhưng chậm hơn vài lần. Cặp điểm gần đối cực
+    không hội tụ sẽ lấy giá trị haversine.
+    """
+    points = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lng = points[:, 0], points[:, 1]
+    u = np.arctan((1 - WGS84_F) * np.tan(lat))
+    sin_u1, cos_u1 = np.sin(u)[:, None], np.cos(u)[:, None]
+    sin_u2, cos_u2 = np.sin(u)[None, :], np.cos(u)[None, :]
+    big_l = lng[None, :] - lng[:, None]
+    lam = big_l.copy()
+    converged = np.zeros(lam.shape, dtype=bool)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+            cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Đường xích đạo: cos²α = 0 → cos2σm = 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+            c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+            lam_new = big_l + (1 - c) * WGS84_F * sin_alpha * (
+                sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            converged = np.abs(lam_new - lam) < tol
+            lam = lam_new
+            if converged.all():
+                break
+        
+        u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (
+            cos_2sigma_m + big_b / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        distance_km = WGS84_B * big_a * (sigma - delta_sigma) / 1000
+    
+    distance_km = np.where(sin_sigma == 0, 0.0, distance_km)
+    bad = ~converged | ~np.isfinite(distance_km)
+    if bad.any():
+        distance_km = np.where(bad, haversine_matrix(coords), distance_km)
+    return distance_km
+
+
+def estimate_distance_matrix(coords, method=GEODESIC_METHOD, multiplier=GEODESIC_MULTIPLIER):
+    """
+    Ước lượng khoảng cách đường bộ N×N = đường chim bay × multiplier
+    
+    Args:
+        method: 'haversine' (nhanh) hoặc 'vincenty' (chính xác hơn)
+    """
+    if method == 'vincenty':
+        straight = vincenty_matrix(coords)
+    elif method == 'haversine':
+        straight = haversine_matrix(coords)
+    else:
+        raise ValueError(f"GEODESIC_METHOD không hợp lệ: {method}")
+    return straight * multiplier
@@ -0,0 +1,288 @@
+"""
+HTTP client dùng chung cho các request OSRM
+
+- 1 requests.Session keep-alive cho cả process (tái sử dụng kết nối TCP)
+- TokenBucket giới hạn tốc độ gọi API thay cho time.sleep cố định
+- CircuitBreaker: ngừng gọi server sau K lỗi liên tiếp, thử lại sau thời gian nghỉ
+- AdaptiveTimeout: timeout theo độ trễ quan sát được (kiểu RTO của TCP)
+- request_json: gọi GET có retry, backoff lũy thừa + jitter
+"""
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (OSRM_BACKOFF_BASE, OSRM_BACKOFF_MAX, OSRM_BREAKER_COOLDOWN, OSRM_BREAKER_THRESHOLD,
+                    OSRM_RETRIES, OSRM_TIMEOUT, OSRM_TIMEOUT_MIN)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size=10):
+    """
+    Lấy Session dùng chung (tạo lần đầu khi gọi)
+    
+    Args:
+        pool_size: số kết nối keep-alive tối đa cho mỗi host
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter (thread-safe)
+    
+    Mỗi request lấy 1 token. Token được nạp lại với tốc độ `rate` token/giây,
+    tối đa `capacity` token → cho phép gửi dồn `capacity` request rồi giữ tốc độ trung bình = rate.
+    """
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Chờ cho đến khi lấy được 1 token"""
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RemoteUnavailable(Exception):
+    """
+    Server không trả lời được
+    
+    circuit_open=True: breaker đang mở nên request không được gửi đi,
+    ngược lại: đã gửi nhưng mọi lần thử đều lỗi.
+    """
+    
+    def __init__(self, message, circuit_open=False):
+        super().__init__(message)
+        self.circuit_open = circuit_open
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho 1 server (thread-safe)
+    
+    Mỗi "lỗi" là 1 request đã hết số lần thử (xem request_json), không phải từng lần thử.
+    
+    - closed: gọi bình thường, đếm lỗi liên tiếp
+    - open: sau failure_threshold lỗi liên tiếp → từ chối ngay mọi request trong cooldown giây
+    - half_open: hết cooldown → cho đúng 1 request thăm dò; thành công → closed, lỗi → open lại
+    """
+    
+    def __init__(self, name, failure_threshold=OSRM_BREAKER_THRESHOLD, cooldown=OSRM_BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+        self.lock = threading.Lock()
+    
+    def allow(self):
+        """True nếu được phép gửi request lúc này"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+    
+    @property
+    def is_open(self):
+        with self.lock:
+            return self.state == 'open'
+    
+    def record_success(self):
+        with self.lock:
+            if self.state != 'closed':
+                print(f"✓ {self.name} hoạt động lại - đóng circuit breaker")
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self._probing = False
+    
+    def record_failure(self):
+        with self.lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                    print(f"⛔ {self.name} lỗi {self.consecutive_failures} lần liên tiếp - "
+                          f"ngừng gọi trong {self.cooldown}s")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._probing = False
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'rejected': self.rejected
+            }
+
+
+class AdaptiveTimeout:
+    """
+    Timeout theo độ trễ quan sát được: srtt + 4·rttvar (như RTO của TCP, RFC 6298)
+    
+    Chưa có mẫu nào → max_timeout. Request quá hạn → nhân đôi timeout hiện tại
+    (server đang chậm hơn ước lượng). Kết quả luôn nằm trong [min_timeout, max_timeout].
+    """
+    
+    def __init__(self, min_timeout=OSRM_TIMEOUT_MIN, max_timeout=OSRM_TIMEOUT, alpha=0.125, beta=0.25):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self.beta = beta
+        self.srtt = None
+        self.rttvar = None
+        self._timeout = max_timeout
+        self.lock = threading.Lock()
+    
+    @property
+    def timeout(self):
+        with self.lock:
+            return self._timeout
+    
+    def observe(self, seconds):
+        """Ghi nhận độ trễ của 1 request thành công"""
+        with self.lock:
+            if self.srtt is None:
+                self.srtt, self.rttvar = seconds, seconds / 2
+            else:
+                self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - seconds)
+                self.srtt = (1 - self.alpha) * self.srtt + self.alpha * seconds
+            self._timeout = min(self.max_timeout, max(self.min_timeout, self.srtt + 4 * self.rttvar))
+    
+    def observe_timeout(self):
+        with self.lock:
+            self._timeout = min(self.max_timeout, self._timeout * 2)
+    
+    def get_stats(self):
+        with self.lock:
+            return {
+                'timeout': round(self._timeout, 3),
+                'srtt_ms': round(self.srtt * 1000, 1) if self.srtt is not None else None
+            }
+
+
+def backoff_delay(attempt, base=OSRM_BACKOFF_BASE, cap=OSRM_BACKOFF_MAX):
+    """Thời gian chờ trước lần thử lại thứ attempt (1, 2, ...): full jitter trong [0, min(cap, base·2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+_breakers = {}
+_timeouts = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(url):
+    """Circuit breaker dùng chung theo host của url"""
+    host = urlsplit(url).netloc
+    with _registry_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def get_adaptive_timeout(url):
+    """AdaptiveTimeout dùng chung theo host + service của url (/route và /table có độ trễ khác nhau)"""
+    parts = urlsplit(url)
+    key = (parts.netloc, parts.path.strip('/').split('/')[0])
+    with _registry_lock:
+        if key not in _timeouts:
+            _timeouts[key] = AdaptiveTimeout()
+        return _timeouts[key]
+
+
+def get_remote_stats():
+    """Trạng thái circuit breaker và timeout hiện tại của mọi server đã gọi"""
+    with _registry_lock:
+        breakers, timeouts = dict(_breakers), dict(_timeouts)
+    return {
+        'circuit_breakers': {host: breaker.get_stats() for host, breaker in breakers.items()},
+        'timeouts': {f"{host}/{service}": policy.get_stats() for (host, service), policy in timeouts.items()}
+    }
+
+
+def request_json(session, url, params=None, rate_limiter=None, breaker=None, timeout_policy=None,
+                 retries=OSRM_RETRIES, max_timeout=None):
+    """
+    GET url → JSON, có circuit breaker, timeout thích ứng và retry
+    
+    Lỗi kết nối, timeout, HTTP 429/5xx được thử lại tối đa retries lần (chờ backoff_delay
+    giữa các lần); hết số lần thử mới tính 1 lỗi cho breaker. Breaker bị request khác
+    mở trong lúc chờ → dừng thử lại ngay. Response khác (kể cả OSRM báo lỗi như NoRoute)
+    được trả về nguyên vẹn và tính là thành công.
+    
+    Raises:
+        RemoteUnavailable: breaker đang mở, hoặc mọi lần thử đều lỗi
+    """
+    breaker = breaker or get_circuit_breaker(url)
+    timeout_policy = timeout_policy or get_adaptive_timeout(url)
+    if not breaker.allow():
+        raise RemoteUnavailable(f"circuit breaker {breaker.name} đang mở", circuit_open=True)
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_delay(attempt))
+            if breaker.is_open:
+                break
+        if rate_limiter:
+            rate_limiter.acquire()
+        timeout = timeout_policy.timeout
+        if max_timeout:
+            timeout = min(timeout, max_timeout)
+        start = time.monotonic()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+            if response.status_code == 429 or response.status_code >= 500:
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            data = response.json()
+        except requests.Timeout as e:
+            timeout_policy.observe_timeout()
+            last_error = e
+            continue
+        except (requests.RequestException, ValueError) as e:
+            last_error = e
+            continue
+        timeout_policy.observe(time.monotonic() - start)
+        breaker.record_success()
+        return data
+    breaker.record_failure()
+    raise RemoteUnavailable(f"{breaker.name}: {last_error}") from last_error
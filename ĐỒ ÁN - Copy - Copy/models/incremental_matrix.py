@@ -0,0 +1,203 @@
+"""
+Ma trận khoảng cách cập nhật dần theo từng lần thêm / xóa thành phố
+"""
+import threading
+
+import numpy as np
+
+from config import DISTANCE_MATRIX_SYMMETRIC
+from .distance_matrix import DistanceMatrix, canonical_pair
+
+# Nguồn của ô ước lượng → lấy lại khi sync, không giữ mãi
+ESTIMATED_SOURCES = ('estimate', 'haversine')
+
+
+class IncrementalDistanceMatrix:
+    """
+    Ma trận N×N sống cùng danh sách thành phố hiện tại
+    
+    - Thêm thành phố: chỉ lấy hàng + cột mới (2·N ô, hoặc N ô ở chế độ đối xứng)
+    - Xóa thành phố: dồn hàng/cột phía sau lên, không gọi API
+    - names[k] ↔ index[name] luôn khớp với thứ tự của coordinates_dict
+    
+    Dữ liệu nằm trong buffer có dung lượng dư (tăng gấp đôi khi đầy) → thêm
+    thành phố không phải cấp phát lại cả ma trận mỗi lần.
+    
+    Nếu calculator ghi lại cell_sources ('osrm', 'road_network', 'tiered'), nguồn của từng ô
+    được giữ trong buffer song song → DistanceMatrix.sources. Ô ước lượng ('estimate' /
+    'haversine', lúc provider lỗi) được lấy lại ở lần sync / thêm thành phố kế tiếp.
+    
+    Args:
+        calculator: object có get_distances(coordinates_dict, pairs)
+        symmetric: chỉ lấy 1 ô cho mỗi cặp rồi lật (giống get_distance_matrix)
+    """
+    
+    def __init__(self, calculator, symmetric=DISTANCE_MATRIX_SYMMETRIC, capacity=16):
+        self.calculator = calculator
+        self.symmetric = symmetric
+        self.names = []
+        self.coordinates = {}
+        self.index = {}
+        self.approximate_cells = []
+        self.cells_fetched = 0
+        self._buffer = np.zeros((capacity, capacity))
+        self._sources = np.full((capacity, capacity), None, dtype=object)
+        self._lock = threading.RLock()
+    
+    def __len__(self):
+        return len(self.names)
+    
+    @property
+    def matrix(self):
+        """View N×N trên buffer (thay đổi theo các lần sửa sau) - dùng to_array() nếu cần giữ lại"""
+        n = len(self.names)
+        sources = self._sources[:n, :n] if hasattr(self.calculator, 'cell_sources') else None
+        return DistanceMatrix(self._buffer[:n, :n], symmetric=self.symmetric, sources=sources)
+    
+    def to_array(self):
+        """Bản sao độc lập của ma trận hiện tại"""
+        with self._lock:
+            matrix = self.matrix
+            copy = matrix.copy()
+            copy.sources = None if matrix.sources is None else matrix.sources.copy()
+            return copy
+    
+    def sync(self, coordinates_dict):
+        """
+        Đưa ma trận về đúng danh sách coordinates_dict (thêm / xóa / đổi tọa độ / đổi thứ tự)
+        
+        Returns:
+            (added, removed): danh sách tên thành phố đã thêm, đã xóa
+        """
+        with self._lock:
+            removed = [
+                name for name in self.names
+                if name not in coordinates_dict or tuple(coordinates_dict[name]) != tuple(self.coordinates[name])
+            ]
+            for name in removed:
+                self.remove(name)
+            added = {name: coords for name, coords in coordinates_dict.items() if name not in self.index}
+            if added:
+                self.add_many(added)
+            else:
+                self.refresh_estimates()
+            if self.names != list(coordinates_dict):
+                self._reorder(list(coordinates_dict))
+            return list(added), removed
+    
+    def snapshot(self, coordinates_dict):
+        """sync() rồi trả về bản sao ma trận - cả 2 bước trong cùng 1 lock"""
+        with self._lock:
+            self.sync(coordinates_dict)
+            return self.to_array()
+    
+    def add(self, name, coords):
+        self.add_many({name: coords})
+    
+    def add_many(self, cities):
+        """Thêm các thành phố mới vào cuối, chỉ lấy các ô có liên quan tới chúng"""
+        with self._lock:
+            old_n = len(self.names)
+            for name, coords in cities.items():
+                self.index[name] = len(self.names)
+                self.names.append(name)
+                self.coordinates[name] = tuple(coords)
+            n = len(self.names)
+            self._ensure_capacity(n)
+            
+            if old_n == 0:
+                # Ma trận rỗng (khởi động / đổi scenario) → lấy cả ma trận theo cách thường
+                matrix = self.calculator.get_distance_matrix(self.coordinates_dict(), symmetric=self.symmetric)
+                self._buffer[:n, :n] = matrix
+                sources = getattr(matrix, 'sources', None)
+                self._sources[:n, :n] = sources if sources is not None else None
+                self.cells_fetched += n * (n - 1)
+                self.approximate_cells.extend(getattr(self.calculator, 'approximate_cells', []))
+            else:
+                pairs = [(i, j) for i in range(n) for j in range(n)
+                         if i != j and (i >= old_n or j >= old_n)]
+                # Ô ước lượng của các thành phố cũ đi cùng request với hàng/cột mới
+                self._fetch(pairs + self._estimated_pairs(old_n))
+                for k in range(old_n, n):
+                    self._buffer[k][k] = 0.0
+    
+    def refresh_estimates(self):
+        """
+        Lấy lại các ô đang là ước lượng (provider lỗi lúc lấy lần trước)
+        
+        Returns:
+            số ô đã gửi đi lấy lại
+        """
+        with self._lock:
+            pairs = self._estimated_pairs(len(self.names))
+            if pairs:
+                self._fetch(pairs)
+            return len(pairs)
+    
+    def remove(self, name):
+        """Xóa thành phố: dồn các hàng/cột phía sau lên 1 vị trí"""
+        with self._lock:
+            k = self.index.pop(name)
+            n = len(self.names)
+            self._buffer[k:n - 1, :n] = self._buffer[k + 1:n, :n]
+            self._buffer[:n - 1, k:n - 1] = self._buffer[:n - 1, k + 1:n]
+            self._sources[k:n - 1, :n] = self._sources[k + 1:n, :n]
+            self._sources[:n - 1, k:n - 1] = self._sources[:n - 1, k + 1:n]
+            del self.names[k]
+            del self.coordinates[name]
+            for other in self.names[k:]:
+                self.index[other] -= 1
+            self.approximate_cells = [
+                cell for cell in self.approximate_cells if name not in (cell['from'], cell['to'])
+            ]
+    
+    def _estimated_pairs(self, n):
+        """Các ô (i, j) với i, j < n có nguồn là ước lượng"""
+        sources = self._sources[:n, :n]
+        estimated = np.isin(sources, ESTIMATED_SOURCES)
+        if self.symmetric:
+            estimated = np.triu(estimated | estimated.T, 1)
+        return [(int(i), int(j)) for i, j in zip(*np.nonzero(estimated))]
+    
+    def _fetch(self, pairs):
+        """Lấy các ô qua calculator.get_distances rồi ghi vào buffer (kèm nguồn)"""
+        coords_list = [self.coordinates[name] for name in self.names]
+        if self.symmetric:
+            pairs = sorted({canonical_pair(i, j, coords_list) for i, j in pairs})
+        
+        distances = self.calculator.get_distances(self.coordinates_dict(), pairs)
+        cell_sources = getattr(self.calculator, 'cell_sources', {})
+        for (i, j), distance in distances.items():
+            self._buffer[i][j] = distance
+            self._sources[i][j] = cell_sources.get((i, j))
+            if self.symmetric:
+                self._buffer[j][i] = distance
+                self._sources[j][i] = self._sources[i][j]
+        self.cells_fetched += len(pairs)
+        self.approximate_cells.extend(getattr(self.calculator, 'approximate_cells', []))
+    
+    def coordinates_dict(self):
+        """{city_name: (lat, lng)} theo đúng thứ tự hàng/cột"""
+        return {name: self.coordinates[name] for name in self.names}
+    
+    def _ensure_capacity(self, n):
+        capacity = len(self._buffer)
+        if n <= capacity:
+            return
+        while capacity < n:
+            capacity *= 2
+        buffer = np.zeros((capacity, capacity))
+        old = len(self._buffer)
+        buffer[:old, :old] = self._buffer
+        self._buffer = buffer
+        sources = np.full((capacity, capacity), None, dtype=object)
+        sources[:old, :old] = self._sources
+        self._sources = sources
+    
+    def _reorder(self, names):
+        order = [self.index[name] for name in names]
+        n = len(order)
+        self._buffer[:n, :n] = self._buffer[np.ix_(order, order)]
+        self._sources[:n, :n] = self._sources[np.ix_(order, order)]
+        self.names = list(names)
+        self.index = {name: k for k, name in enumerate(self.names)}
@@ -0,0 +1,132 @@
+"""
+Memo (LRU) các ma trận khoảng cách đã tính xong, key = fingerprint của danh sách thành phố
+
+Bấm "Solve" nhiều lần hoặc chạy Compare sau Solve với cùng danh sách thành phố
+sẽ dùng lại ma trận thay vì tra cache từng cặp và dựng lại N×N.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .single_flight import SingleFlight
+from config import CACHE_COORD_PRECISION, MATRIX_CACHE_SIZE
+
+
+def matrix_fingerprint(coordinates_dict, *context):
+    """
+    Hash của các tuple (name, lat, lng) THEO THỨ TỰ (thứ tự = chỉ số hàng/cột của ma trận)
+    
+    Args:
+        coordinates_dict: {city_name: (lat, lng), ...}
+        context: thông tin khác ảnh hưởng tới ma trận (provider, chế độ đối xứng, ...)
+    """
+    digest = hashlib.sha1()
+    for item in context:
+        digest.update(f"{item}|".encode('utf-8'))
+    for name, (lat, lng) in coordinates_dict.items():
+        digest.update(f"{name}\x1f{lat:.{CACHE_COORD_PRECISION}f}\x1f{lng:.{CACHE_COORD_PRECISION}f}\x1e".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def has_estimates(matrix):
+    """True nếu ma trận có ô ước lượng (provider lỗi → 'estimate' / tầng 'haversine')"""
+    counts = getattr(matrix, 'source_counts', lambda: None)() or {}
+    return 'estimate' in counts or 'haversine' in counts
+
+
+class MatrixCache:
+    """
+    LRU cache (thread-safe) cho các ma trận đã dựng xong
+    
+    Giá trị lưu là (matrix, info): matrix được đặt read-only để solver không vô tình
+    sửa bản dùng chung, info là dict metadata đi kèm (vd các ô gần đúng).
+    
+    get_or_compute: nhiều request cùng fingerprint đến cùng lúc chỉ dựng ma trận 1 lần,
+    các request còn lại chờ và dùng chung kết quả (đếm trong 'coalesced'). Ma trận có
+    ô ước lượng không được lưu → lần sau dựng lại để lấy số thật khi provider hoạt động lại.
+    
+    Args:
+        max_size: số ma trận tối đa giữ trong RAM (0 = tắt memo)
+    """
+    
+    def __init__(self, max_size=MATRIX_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.skipped = 0
+    
+    def get(self, key):
+        """Lấy (matrix, info) theo fingerprint, None nếu chưa có"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, matrix, info=None):
+        """Lưu ma trận, loại bỏ ma trận dùng lâu nhất khi vượt max_size"""
+        if self.max_size <= 0:
+            return
+        matrix.flags.writeable = False
+        with self._lock:
+            self._entries[key] = (matrix, info or {})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_compute(self, key, compute):
+        """
+        Trả về ma trận trong memo, hoặc gọi compute() → (matrix, info) rồi lưu lại
+        (trừ ma trận có ô ước lượng)
+        
+        Đang có request khác dựng cùng key → chờ kết quả của request đó.
+        
+        Returns:
+            (matrix, info, hit): hit=True nếu lấy từ memo hoặc từ request đang dựng
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry[0], entry[1], True
+        
+        def build():
+            # Request vừa dựng xong có thể đã lưu vào memo trước khi ta nhận key
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            matrix, info = compute()
+            if has_estimates(matrix):
+                self.skipped += 1
+            else:
+                self.put(key, matrix, info)
+            return matrix, info or {}
+        
+        (matrix, info), shared = self._flight.do(key, build)
+        return matrix, info, shared
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self):
+        """Thống kê memo (hit_rate theo %, như thống kê của provider và heuristic MST)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'skipped': self.skipped,
+                'hit_rate': round(self.hits / lookups * 100, 1) if lookups else 0.0,
+                'coalesced': self._flight.coalesced
+            }
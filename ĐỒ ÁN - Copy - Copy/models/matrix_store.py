@@ -0,0 +1,110 @@
+"""
+Lưu ma trận đã dựng xong ra đĩa dạng .npy + file JSON đi kèm, key = fingerprint
+
+- {fingerprint}.npy: ma trận float64 N×N, đọc lại bằng np.load(mmap_mode='r') →
+  không copy, nhiều worker process dùng chung 1 bản trong page cache của OS
+- {fingerprint}.json: tên + tọa độ thành phố (để kiểm tra), chế độ đối xứng và
+  metadata nhỏ (các ô gần đúng, số ô theo tầng provider)
+
+Với hàng nghìn điểm, mở 1 file .npy nhanh hơn nhiều so với tra hàng triệu entry
+trong cache khoảng cách và không làm tăng RAM riêng của từng worker.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from .distance_matrix import DistanceMatrix
+from config import MATRIX_STORE_DIR
+
+
+class MatrixStore:
+    """
+    Thư mục chứa các ma trận đã lưu
+    
+    Args:
+        directory: thư mục lưu (tạo khi ghi lần đầu), đường dẫn tương đối tính từ
+            thư mục project (giống file cache) chứ không theo thư mục đang chạy
+    """
+    
+    def __init__(self, directory=MATRIX_STORE_DIR):
+        self.directory = str(Path(__file__).parent.parent / directory)
+        self.loads = 0
+        self.saves = 0
+    
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return f"{base}.npy", f"{base}.json"
+    
+    def has(self, key):
+        return all(os.path.exists(path) for path in self._paths(key))
+    
+    def load(self, key, coordinates_dict=None):
+        """
+        Đọc ma trận (memory-mapped, read-only)
+        
+        Args:
+            coordinates_dict: nếu có → chỉ trả về khi tên + tọa độ trong file JSON khớp
+        
+        Returns:
+            (DistanceMatrix, info) hoặc None nếu chưa lưu / không khớp / file hỏng
+        """
+        npy_path, json_path = self._paths(key)
+        try:
+            with open(json_path, encoding='utf-8') as f:
+                sidecar = json.load(f)
+            data = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        
+        n = len(sidecar['cities'])
+        if data.shape != (n, n):
+            return None
+        if coordinates_dict is not None and sidecar['cities'] != [
+            [name, list(coords)] for name, coords in coordinates_dict.items()
+        ]:
+            return None
+        
+        self.loads += 1
+        # np.asarray: bỏ lớp np.memmap nhưng vẫn trỏ vào vùng nhớ map từ file
+        matrix = DistanceMatrix(np.asarray(data), symmetric=sidecar.get('symmetric', False))
+        return matrix, sidecar.get('info', {})
+    
+    def save(self, key, matrix, coordinates_dict, info=None):
+        """
+        Ghi ma trận + file JSON (ghi ra file tạm rồi đổi tên → process khác không bao giờ đọc file dở)
+        
+        Args:
+            info: metadata dạng JSON được (vd {'approximate_cells': [...]})
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        npy_path, json_path = self._paths(key)
+        sidecar = {
+            'cities': [[name, list(coords)] for name, coords in coordinates_dict.items()],
+            'symmetric': bool(getattr(matrix, 'symmetric', False)),
+            'info': info or {}
+        }
+        
+        # .npy trước, .json sau: load() cần cả 2 file nên không thấy bản ghi dở
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(matrix, dtype=float))
+        os.replace(tmp_path, npy_path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.json.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(sidecar, f, ensure_ascii=False, default=float)
+        os.replace(tmp_path, json_path)
+        self.saves += 1
+    
+    def get_stats(self):
+        files = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        npy_files = [name for name in files if name.endswith('.npy')]
+        return {
+            'directory': self.directory,
+            'matrices': len(npy_files),
+            'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in npy_files),
+            'loads': self.loads,
+            'saves': self.saves
+        }
@@ -0,0 +1,347 @@
+"""
+Chuỗi provider khoảng cách nhiều tầng: RAM → cache đĩa → graph local → OSRM → ước lượng
+
+Mỗi tầng chỉ được hỏi các ô mà các tầng phía trước chưa trả lời được. Ô lấy được
+ở tầng sau được ghi ngược lên các tầng cache phía trước (trừ ô ước lượng) → lần
+sau dừng ngay ở tầng nhanh nhất. Mỗi tầng tự đếm số lần gọi, số ô được hỏi / trả
+lời và tổng độ trễ; kết quả ghi lại tầng nào đã cho ra từng ô.
+"""
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .cache import get_shared_cache, make_pair_key
+from .distance_calculator import OSRMDistanceCalculator, RoadNetworkDistanceCalculator
+from .distance_matrix import matrix_pairs
+from .geo import estimate_distance_matrix
+from config import (DISTANCE_MATRIX_SYMMETRIC, GEODESIC_METHOD, GEODESIC_MULTIPLIER, MEMORY_CACHE_MAX_ENTRIES,
+                    OSRM_PROFILE, PROVIDER_CHAIN, ROAD_NETWORK_FILE)
+
+
+class DistanceProvider:
+    """
+    1 tầng của chuỗi provider
+    
+    Lớp con cài đặt _lookup(coords, pairs) → {(i, j): km} chỉ gồm các ô tìm được.
+    Tầng cache (cacheable=True) cài đặt thêm store(coords, distances) để nhận lại
+    các ô mà tầng sau đã lấy.
+    """
+    
+    name = 'provider'
+    cacheable = False
+    
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.cells_asked = 0
+        self.hits = 0
+        self.total_seconds = 0.0
+    
+    def lookup(self, coords, pairs):
+        """
+        Args:
+            coords: list [(lat, lng), ...]
+            pairs: list [(i, j), ...]
+        
+        Returns:
+            dict {(i, j): km} - ô không có trong dict để tầng sau trả lời
+        """
+        if not pairs:
+            return {}
+        start = time.perf_counter()
+        found = self._lookup(coords, pairs)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.calls += 1
+            self.cells_asked += len(pairs)
+            self.hits += len(found)
+            self.total_seconds += elapsed
+        return found
+    
+    def _lookup(self, coords, pairs):
+        raise NotImplementedError
+    
+    def store(self, coords, distances):
+        pass
+    
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'calls': self.calls,
+                'cells_asked': self.cells_asked,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.cells_asked * 100, 1) if self.cells_asked else 0.0,
+                'total_ms': round(self.total_seconds * 1000, 1),
+                'avg_ms': round(self.total_seconds * 1000 / self.calls, 2) if self.calls else 0.0
+            }
+
+
+class MemoryLRUProvider(DistanceProvider):
+    """Tầng RAM: LRU {key cặp tọa độ: km}, cùng key với cache đĩa"""
+    
+    name = 'memory'
+    cacheable = True
+    
+    def __init__(self, max_entries=MEMORY_CACHE_MAX_ENTRIES, profile=OSRM_PROFILE):
+        super().__init__()
+        self.max_entries = max_entries
+        self.profile = profile
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _lookup(self, coords, pairs):
+        found = {}
+        with self._lock:
+            for i, j in pairs:
+                key = make_pair_key(coords[i], coords[j], self.profile)
+                distance = self._entries.get(key)
+                if distance is not None:
+                    self._entries.move_to_end(key)
+                    found[(i, j)] = distance
+        return found
+    
+    def store(self, coords, distances):
+        with self._lock:
+            for (i, j), distance in distances.items():
+                key = make_pair_key(coords[i], coords[j], self.profile)
+                self._entries[key] = distance
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        with self._lock:
+            stats['size'] = len(self._entries)
+        return stats
+
+
+class DiskCacheProvider(DistanceProvider):
+    """Tầng cache khoảng cách trên đĩa (JSON / SQLite - get_shared_cache)"""
+    
+    name = 'disk'
+    cacheable = True
+    
+    def __init__(self, cache=None, profile=OSRM_PROFILE):
+        super().__init__()
+        self.cache = cache or get_shared_cache()
+        self.profile = profile
+    
+    def _lookup(self, coords, pairs):
+        found = {}
+        for i, j in pairs:
+            distance = self.cache.get(coords[i], coords[j], self.profile)
+            if distance is not None:
+                found[(i, j)] = distance
+        return found
+    
+    def store(self, coords, distances):
+        if distances:
+            self.cache.set_many([(coords[i], coords[j], distance) for (i, j), distance in distances.items()],
+                                profile=self.profile)
+            self.cache.flush()
+
+
+class RoadNetworkProvider(DistanceProvider):
+    """Tầng graph đường bộ local (RoadNetworkDistanceCalculator, không fallback)"""
+    
+    name = 'road_network'
+    
+    def __init__(self, calculator=None):
+        super().__init__()
+        self.calculator = calculator or RoadNetworkDistanceCalculator()
+    
+    def _lookup(self, coords, pairs):
+        return self.calculator.road_distances(coords, pairs)
+
+
+class OSRMProvider(DistanceProvider):
+    """Tầng OSRM (không đọc/ghi cache - việc đó do tầng 'disk' đảm nhận)"""
+    
+    name = 'osrm'
+    
+    def __init__(self, calculator=None):
+        super().__init__()
+        self.calculator = calculator or OSRMDistanceCalculator(use_cache=False)
+        self.requests = 0
+    
+    def _lookup(self, coords, pairs):
+        found, requests = self.calculator.fetch_distances(coords, pairs)
+        with self._stats_lock:
+            self.requests += requests
+        return found
+    
+    def get_stats(self):
+        stats = super().get_stats()
+        stats['requests'] = self.requests
+        return stats
+
+
+class GeodesicProvider(DistanceProvider):
+    """Tầng cuối: đường chim bay × GEODESIC_MULTIPLIER, luôn trả lời mọi ô"""
+    
+    name = 'haversine'
+    
+    def __init__(self, method=GEODESIC_METHOD, multiplier=GEODESIC_MULTIPLIER):
+        super().__init__()
+        self.method = method
+        self.multiplier = multiplier
+    
+    def _lookup(self, coords, pairs):
+        used = sorted({i for pair in pairs for i in pair})
+        position = {index: k for k, index in enumerate(used)}
+        estimates = estimate_distance_matrix([coords[i] for i in used], self.method, self.multiplier)
+        return {(i, j): float(estimates[position[i]][position[j]]) for i, j in pairs}
+
+
+PROVIDER_TIERS = {
+    'memory': MemoryLRUProvider,
+    'disk': DiskCacheProvider,
+    'road_network': RoadNetworkProvider,
+    'osrm': OSRMProvider,
+    'haversine': GeodesicProvider
+}
+
+
+class ProviderChain:
+    """
+    Hỏi lần lượt các tầng, mỗi tầng chỉ nhận các ô còn thiếu
+    
+    Ô vẫn thiếu sau tầng cuối (chuỗi không có 'haversine') được ước lượng và ghi
+    nguồn 'estimate'. Ước lượng không được ghi ngược lên các tầng cache.
+    """
+    
+    def __init__(self, tiers):
+        self.tiers = list(tiers)
+    
+    def lookup(self, coords, pairs):
+        """
+        Returns:
+            (dict {(i, j): km}, dict {(i, j): tên tầng})
+        """
+        distances, sources = {}, {}
+        remaining = list(pairs)
+        for position, tier in enumerate(self.tiers):
+            if not remaining:
+                break
+            found = tier.lookup(coords, remaining)
+            if not found:
+                continue
+            distances.update(found)
+            sources.update(dict.fromkeys(found, tier.name))
+            if tier.name != GeodesicProvider.name:
+                for upper in self.tiers[:position]:
+                    if upper.cacheable:
+                        upper.store(coords, found)
+            remaining = [pair for pair in remaining if pair not in found]
+        
+        if remaining:
+            estimates = estimate_distance_matrix(coords)
+            for i, j in remaining:
+                distances[(i, j)] = float(estimates[i][j])
+                sources[(i, j)] = 'estimate'
+        return distances, sources
+    
+    def get_stats(self):
+        return {tier.name: tier.get_stats() for tier in self.tiers}
+
+
+def build_provider_chain(names=None):
+    """
+    Tạo ProviderChain theo danh sách tên tầng (mặc định PROVIDER_CHAIN)
+    
+    Tầng 'road_network' bị bỏ qua (kèm cảnh báo) nếu chưa có ROAD_NETWORK_FILE.
+    """
+    tiers = []
+    for name in names or PROVIDER_CHAIN:
+        if name not in PROVIDER_TIERS:
+            raise ValueError(f"Tầng provider không hợp lệ: {name}")
+        if name == 'road_network' and not (Path(__file__).parent.parent / ROAD_NETWORK_FILE).exists():
+            print(f"⚠️ Bỏ qua tầng road_network: không có {ROAD_NETWORK_FILE}")
+            continue
+        tiers.append(PROVIDER_TIERS[name]())
+    return ProviderChain(tiers)
+
+
+_shared_chain = None
+_shared_chain_lock = threading.Lock()
+
+
+def get_provider_chain():
+    """Chuỗi provider dùng chung cho cả process (thống kê từng tầng cộng dồn)"""
+    global _shared_chain
+    with _shared_chain_lock:
+        if _shared_chain is None:
+            _shared_chain = build_provider_chain()
+        return _shared_chain
+
+
+class TieredDistanceCalculator:
+    """
+    Provider 'tiered': cùng interface với OSRMDistanceCalculator, lấy ô qua ProviderChain
+    
+    Sau mỗi lần gọi, cell_sources = {(i, j): tên tầng} của các ô vừa lấy;
+    get_distance_matrix gắn thêm DistanceMatrix.sources.
+    """
+    
+    def __init__(self, chain=None):
+        self.chain = chain or get_provider_chain()
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.approximate_cells = []
+        self.cell_sources = {}
+    
+    def get_distance(self, coord1, coord2):
+        """Khoảng cách (km) giữa 2 điểm"""
+        distances, _ = self.chain.lookup([coord1, coord2], [(0, 1)])
+        return distances[(0, 1)]
+    
+    def get_distances(self, coordinates_dict, pairs, mode=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            pairs: list [(i, j), ...]
+        
+        Returns:
+            dict {(i, j): km}
+        """
+        coords = list(coordinates_dict.values())
+        distances, self.cell_sources = self.chain.lookup(coords, pairs)
+        counts = {}
+        for source in self.cell_sources.values():
+            counts[source] = counts.get(source, 0) + 1
+        self.cache_hits = sum(counts.get(tier.name, 0) for tier in self.chain.tiers if tier.cacheable)
+        self.api_calls = len(pairs) - self.cache_hits
+        if pairs:
+            print(f"  🧱 {len(pairs)} ô theo tầng: " + ", ".join(f"{name} {count}" for name, count in counts.items()))
+        return distances
+    
+    def get_distance_matrix(self, coordinates_dict, mode=None, symmetric=None):
+        """
+        Args:
+            coordinates_dict: {city_name: (lat, lng), ...}
+            symmetric: True → chỉ tính i<j rồi lật (mặc định DISTANCE_MATRIX_SYMMETRIC)
+        
+        Returns:
+            DistanceMatrix: kèm sources = tầng đã cho ra từng ô
+        """
+        if symmetric is None:
+            symmetric = DISTANCE_MATRIX_SYMMETRIC
+        coords = list(coordinates_dict.values())
+        n = len(coords)
+        pairs = matrix_pairs(coords, symmetric)
+        distance_matrix = np.zeros((n, n))
+        sources = np.full((n, n), None, dtype=object)
+        for (i, j), distance in self.get_distances(coordinates_dict, pairs).items():
+            distance_matrix[i][j] = distance
+            sources[i][j] = self.cell_sources[(i, j)]
+            if symmetric:
+                sources[j][i] = sources[i][j]
+        self.cell_sources = {(i, j): sources[i][j] for i in range(n) for j in range(n) if i != j}
+        print(f"\n🧱 Ma trận {n}×{n} qua {len(self.chain.tiers)} tầng provider\n")
+        result = OSRMDistanceCalculator._finish_matrix(distance_matrix, pairs, symmetric)
+        result.sources = sources
+        return result
@@ -0,0 +1,292 @@
+"""
+Mạng lưới đường bộ offline từ bản trích OSM (không cần gọi OSRM qua mạng)
+
+- Đọc graph từ file OSM XML (.osm), OSM PBF (.pbf, cần pyosmium) hoặc file .npz đã
+  tiền xử lý (tools/build_road_network.py) - .npz nhỏ và load nhanh nhất
+- Graph lưu dạng CSR (indptr / indices / weights km) bằng NumPy
+- Gắn tọa độ thành phố vào node gần nhất bằng chỉ mục lưới (grid index)
+- Khoảng cách 1 nguồn → nhiều đích bằng Dijkstra, dừng khi đã chốt hết các đích
+"""
+import heapq
+import math
+import os
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .geo import METERS_PER_DEGREE_LAT, haversine_pairs_km
+
+
+# Các loại đường ô tô đi được (tag highway=*)
+DRIVABLE_HIGHWAYS = frozenset({
+    'motorway', 'motorway_link', 'trunk', 'trunk_link', 'primary', 'primary_link',
+    'secondary', 'secondary_link', 'tertiary', 'tertiary_link', 'unclassified',
+    'residential', 'living_street', 'service', 'road'
+})
+
+
+def _way_direction(tags):
+    """
+    Chiều lưu thông của 1 way: 1 = một chiều xuôi, -1 = một chiều ngược, 0 = hai chiều
+    """
+    oneway = tags.get('oneway', '').lower()
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway == 'no':
+        return 0
+    if tags.get('highway') == 'motorway' or tags.get('junction') in ('roundabout', 'circular'):
+        return 1
+    return 0
+
+
+class RoadNetwork:
+    """
+    Graph đường bộ có hướng dạng CSR
+    
+    Cạnh của node u: indices[indptr[u]:indptr[u + 1]], độ dài tương ứng trong weights (km).
+    
+    Args:
+        lat, lng: tọa độ các node (độ)
+        indptr, indices, weights: mảng CSR
+        cell_size_m: kích thước ô lưới của chỉ mục tìm node gần nhất
+    """
+    
+    def __init__(self, lat, lng, indptr, indices, weights, cell_size_m=1000):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lng = np.asarray(lng, dtype=float)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=float)
+        self.cell_size_m = cell_size_m
+        self._grid = None
+        self._adjacency = None
+        self._lock = threading.Lock()
+    
+    @property
+    def n_nodes(self):
+        return len(self.lat)
+    
+    @property
+    def n_edges(self):
+        return len(self.indices)
+    
+    @classmethod
+    def from_ways(cls, node_coords, ways, **kwargs):
+        """
+        Dựng graph từ các way OSM
+        
+        Args:
+            node_coords: {osm_node_id: (lat, lng)}
+            ways: iterable [(node_ids, direction), ...] - direction như _way_direction
+        """
+        ids = {}
+        src, dst = [], []
+        for node_ids, direction in ways:
+            refs = [ids.setdefault(ref, len(ids)) for ref in node_ids if ref in node_coords]
+            for a, b in zip(refs, refs[1:]):
+                if a == b:
+                    continue
+                if direction >= 0:
+                    src.append(a)
+                    dst.append(b)
+                if direction <= 0:
+                    src.append(b)
+                    dst.append(a)
+        
+        coords = np.zeros((len(ids), 2))
+        for ref, index in ids.items():
+            coords[index] = node_coords[ref]
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        weights = haversine_pairs_km(coords[src, 0], coords[src, 1], coords[dst, 0], coords[dst, 1])
+        
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(ids)), out=indptr[1:])
+        return cls(coords[:, 0], coords[:, 1], indptr, dst[order], weights[order], **kwargs)
+    
+    @classmethod
+    def from_osm_xml(cls, path, **kwargs):
+        """Đọc file OSM XML (.osm) bằng iterparse - không giữ cả cây XML trong RAM"""
+        node_coords = {}
+        ways = []
+        for _, elem in ET.iterparse(path, events=('end',)):
+            if elem.tag == 'node':
+                node_coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+                elem.clear()
+            elif elem.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in elem.iter('tag')}
+                if tags.get('highway') in DRIVABLE_HIGHWAYS:
+                    ways.append(([int(nd.get('ref')) for nd in elem.iter('nd')], _way_direction(tags)))
+                elem.clear()
+        return cls.from_ways(node_coords, ways, **kwargs)
+    
+    @classmethod
+    def from_pbf(cls, path, **kwargs):
+        """Đọc file OSM PBF (.osm.pbf) - cần thư viện pyosmium (pip install osmium)"""
+        try:
+            import osmium
+        except ImportError as e:
+            raise ImportError("Đọc file .pbf cần pyosmium: pip install osmium "
+                              "(hoặc chuyển sang .npz bằng tools/build_road_network.py)") from e
+        
+        class _WayHandler(osmium.SimpleHandler):
+            def __init__(self):
+                super().__init__()
+                self.node_coords = {}
+                self.ways = []
+            
+            def way(self, way):
+                tags = {tag.k: tag.v for tag in way.tags}
+                if tags.get('highway') not in DRIVABLE_HIGHWAYS:
+                    return
+                refs = []
+                for node in way.nodes:
+                    if node.location.valid():
+                        self.node_coords[node.ref] = (node.location.lat, node.location.lon)
+                        refs.append(node.ref)
+                self.ways.append((refs, _way_direction(tags)))
+        
+        handler = _WayHandler()
+        handler.apply_file(path, locations=True)
+        return cls.from_ways(handler.node_coords, handler.ways, **kwargs)
+    
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Đọc file .npz đã tiền xử lý"""
+        with np.load(path) as data:
+            return cls(data['lat'], data['lng'], data['indptr'], data['indices'], data['weights'], **kwargs)
+    
+    def save(self, path):
+        """Ghi graph ra file .npz (nén) để lần sau load nhanh"""
+        np.savez_compressed(path, lat=self.lat, lng=self.lng, indptr=self.indptr,
+                            indices=self.indices, weights=self.weights.astype(np.float32))
+    
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Chọn cách đọc theo đuôi file: .npz, .pbf, còn lại coi là OSM XML"""
+        if path.endswith('.npz'):
+            return cls.load(path, **kwargs)
+        if path.endswith('.pbf'):
+            return cls.from_pbf(path, **kwargs)
+        return cls.from_osm_xml(path, **kwargs)
+    
+    def _grid_index(self):
+        """
+        Chỉ mục lưới: {(row, col): mảng node} - ô cell_size_m × cell_size_m mét
+        
+        Chiều rộng ô theo kinh độ tính tại vĩ độ trung bình của graph (bản trích OSM
+        thường chỉ 1 vùng nên sai lệch nhỏ).
+        """
+        with self._lock:
+            if self._grid is None and not self.n_nodes:
+                self._grid = (1.0, 1.0, {})
+            if self._grid is None:
+                dlat = self.cell_size_m / METERS_PER_DEGREE_LAT
+                ref_lat = float(self.lat.mean()) if self.n_nodes else 0.0
+                dlng = dlat / max(math.cos(math.radians(ref_lat)), 1e-6)
+                rows = np.floor(self.lat / dlat).astype(np.int64)
+                cols = np.floor(self.lng / dlng).astype(np.int64)
+                order = np.lexsort((cols, rows))
+                rows, cols = rows[order], cols[order]
+                starts = np.flatnonzero(np.r_[True, (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])])
+                ends = np.r_[starts[1:], len(order)]
+                cells = {
+                    (int(rows[start]), int(cols[start])): order[start:end]
+                    for start, end in zip(starts, ends)
+                }
+                self._grid = (dlat, dlng, cells)
+            return self._grid
+    
+    def nearest_node(self, coord, max_distance_m=None):
+        """
+        Node gần coord nhất, tìm lan dần theo từng vòng ô lưới
+        
+        Returns:
+            (node, distance_m), hoặc (None, None) nếu không có node nào trong max_distance_m
+        """
+        dlat, dlng, cells = self._grid_index()
+        row = math.floor(coord[0] / dlat)
+        col = math.floor(coord[1] / dlng)
+        max_ring = math.ceil(max_distance_m / self.cell_size_m) + 1 if max_distance_m else 8
+        best_node, best_m = None, math.inf
+        for ring in range(max_ring + 1):
+            # Mọi node từ vòng ring trở đi cách coord ít nhất (ring − 1) ô
+            if best_node is not None and best_m <= (ring - 1) * self.cell_size_m:
+                break
+            candidates = [
+                cells[(row + dr, col + dc)]
+                for dr in range(-ring, ring + 1)
+                for dc in range(-ring, ring + 1)
+                if max(abs(dr), abs(dc)) == ring and (row + dr, col + dc) in cells
+            ]
+            if not candidates:
+                continue
+            nodes = np.concatenate(candidates)
+            distances = haversine_pairs_km(coord[0], coord[1], self.lat[nodes], self.lng[nodes]) * 1000
+            k = int(np.argmin(distances))
+            if distances[k] < best_m:
+                best_node, best_m = int(nodes[k]), float(distances[k])
+        if best_node is None and max_distance_m is None and self.n_nodes:
+            # Không giới hạn khoảng cách và lưới quanh điểm trống → quét toàn bộ node
+            distances = haversine_pairs_km(coord[0], coord[1], self.lat, self.lng) * 1000
+            best_node = int(np.argmin(distances))
+            best_m = float(distances[best_node])
+        if best_node is None or (max_distance_m is not None and best_m > max_distance_m):
+            return None, None
+        return best_node, best_m
+    
+    def _adjacency_lists(self):
+        # Dijkstra duyệt từng cạnh bằng Python → list nhanh hơn index vào ndarray
+        with self._lock:
+            if self._adjacency is None:
+                self._adjacency = (self.indptr.tolist(), self.indices.tolist(), self.weights.tolist())
+            return self._adjacency
+    
+    def shortest_distances(self, source, targets):
+        """
+        Dijkstra từ source, dừng ngay khi mọi node trong targets đã có khoảng cách cuối cùng
+        
+        Returns:
+            dict {target: km} - target không tới được sẽ không có trong dict
+        """
+        indptr, indices, weights = self._adjacency_lists()
+        remaining = set(targets)
+        result = {}
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u in remaining:
+                result[u] = d
+                remaining.discard(u)
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return result
+
+
+_networks = {}
+_networks_lock = threading.Lock()
+
+
+def load_road_network(path):
+    """Graph dùng chung cho cả process theo đường dẫn file (chỉ đọc file 1 lần)"""
+    path = os.path.abspath(path)
+    with _networks_lock:
+        network = _networks.get(path)
+        if network is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Không tìm thấy file mạng lưới đường: {path}")
+            network = _networks[path] = RoadNetwork.from_file(path)
+            print(f"🗺️  Đã tải mạng lưới đường {os.path.basename(path)}: "
+                  f"{network.n_nodes:,} node, {network.n_edges:,} cạnh")
+        return network
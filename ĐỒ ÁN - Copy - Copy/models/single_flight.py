@@ -0,0 +1,86 @@
+"""
+Gộp các lần tính trùng nhau đang chạy song song (single-flight)
+
+2 tab trình duyệt bấm Solve cùng lúc → cùng cần các cặp chưa có trong cache.
+Request đến trước "nhận" key và tự tính, request đến sau chỉ chờ kết quả của
+request trước (Future) thay vì gọi OSRM thêm 1 lần cho cùng cặp.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Bảng các key đang được tính (thread-safe)
+    
+    Attributes:
+        leaders: số key đã được tính thật
+        coalesced: số lần 1 key được dùng chung kết quả thay vì tính lại
+    """
+    
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def claim(self, keys):
+        """
+        Nhận các key chưa có ai tính
+        
+        Returns:
+            (owned, waiting): owned = list key phải tự tính rồi gọi resolve(),
+            waiting = {key: Future} của các key đang được request khác tính
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                future = self._pending.get(key)
+                if future is None:
+                    self._pending[key] = Future()
+                    owned.append(key)
+                else:
+                    waiting[key] = future
+            self.leaders += len(owned)
+            self.coalesced += len(waiting)
+        return owned, waiting
+    
+    def resolve(self, results):
+        """Trả kết quả {key: value} cho các request đang chờ và bỏ key khỏi bảng"""
+        with self._lock:
+            futures = [(self._pending.pop(key), value) for key, value in results.items()]
+        for future, value in futures:
+            future.set_result(value)
+    
+    def fail(self, keys, error):
+        """Báo lỗi cho các request đang chờ các key này"""
+        with self._lock:
+            futures = [self._pending.pop(key) for key in keys]
+        for future in futures:
+            future.set_exception(error)
+    
+    def do(self, key, compute):
+        """
+        Gọi compute() cho key, hoặc chờ kết quả nếu request khác đang tính cùng key
+        
+        Returns:
+            (value, shared): shared=True nếu dùng chung kết quả của request khác
+        """
+        owned, waiting = self.claim([key])
+        if waiting:
+            return waiting[key].result(), True
+        try:
+            value = compute()
+        except BaseException as e:
+            self.fail(owned, e)
+            raise
+        self.resolve({key: value})
+        return value, False
+    
+    def get_stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._pending),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced
+            }
@@ -269,7 +269,8 @@ async function animateSolution(data) {
         
         if (step.candidates && step.candidates.length > 0) {
             const algorithm = document.getElementById('algorithm-select').value;
-            const algName = algorithm === 'greedy' ? 'Greedy BFS' : (algorithm === 'best-first' ? 'UCS' : 'A*');
+            const algNames = { 'greedy': 'Greedy BFS', 'best-first': 'UCS', 'astar': 'A*', 'held-karp': 'Held-Karp' };
+            const algName = algNames[algorithm] || 'A*';
             stepHTML += `<div class="step-candidates">Đánh giá (${algName}):<br>`;
             step.candidates.forEach(c => {
                 const heuristic = c.heuristic !== undefined ? c.heuristic : 'N/A';
@@ -278,7 +279,7 @@ async function animateSolution(data) {
                 stepHTML += `  • ${c.city}:<br>`;
                 if (algorithm === 'greedy') {
                     stepHTML += `    - h(n) = ${heuristic.toFixed(2)} km ⭐<br>`;
-                } else if (algorithm === 'best-first') {
+                } else if (algorithm === 'best-first' || algorithm === 'held-karp') {
                     stepHTML += `    - g(n) = ${g.toFixed(2)} km ⭐<br>`;
                 } else {
                     stepHTML += `    - g(n) = ${g.toFixed(2)} km<br>`;
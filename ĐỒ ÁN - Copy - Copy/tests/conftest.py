@@ -0,0 +1,121 @@
+"""
+Fixture dùng chung: fake OSRM server (tools/fake_osrm_server.py) và cache SQLite tạm
+để test không gọi mạng và không đụng tới distance_cache.db của project
+"""
+import contextlib
+import io
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'tools'))
+
+import fake_osrm_server
+from models import distance_calculator
+from models.cache import SQLiteDistanceCache
+from models.http_client import TokenBucket
+from models.road_network import RoadNetwork
+
+# Thành phố thử (lat, lng) - đủ gần để fake server trả về khoảng cách hợp lý
+CITIES = {
+    'Hà Nội': (21.0285, 105.8542),
+    'Hải Phòng': (20.8449, 106.6881),
+    'Nam Định': (20.4388, 106.1621),
+    'Thanh Hóa': (19.8067, 105.7852),
+    'Vinh': (18.6796, 105.6813),
+    'Lạng Sơn': (21.8537, 106.7615),
+    'Thái Nguyên': (21.5942, 105.8482),
+}
+
+
+@pytest.fixture
+def cities():
+    return dict(CITIES)
+
+
+@pytest.fixture
+def asymmetric_road(monkeypatch):
+    """Fake server trả về khoảng cách 2 chiều khác nhau (chiều 'tăng' dài gấp đôi)"""
+    road_distance = fake_osrm_server.fake_road_distance
+    
+    def asymmetric(coord1, coord2):
+        return road_distance(coord1, coord2) * (2 if coord1 < coord2 else 1)
+    
+    monkeypatch.setattr(fake_osrm_server, 'fake_road_distance', asymmetric)
+    return asymmetric
+
+
+@pytest.fixture
+def fake_server():
+    """Tạo fake OSRM server (tự dừng khi test xong): fake_server(max_table_size=.., error_rate=..)"""
+    servers = []
+    
+    def start(**kwargs):
+        server = fake_osrm_server.FakeOSRMServer(**kwargs).start()
+        servers.append(server)
+        return server
+    
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def road_network():
+    """
+    Lưới đường 6×6 node (~1 km/ô) quanh Hà Nội có vài phố một chiều,
+    kèm 1 đoạn đường rời (node 36, 37) không nối với lưới
+    """
+    rng = np.random.default_rng(0)
+    size = 6
+    node_coords = {
+        row * size + col: (21.0 + row * 0.01 + rng.uniform(-0.002, 0.002), 105.8 + col * 0.01 + rng.uniform(-0.002, 0.002))
+        for row in range(size) for col in range(size)
+    }
+    node_coords[36] = (21.2, 106.0)
+    node_coords[37] = (21.2, 106.01)
+    # Hàng 1 một chiều xuôi, hàng 3 một chiều ngược, cột 2 một chiều xuôi
+    ways = [([row * size + col for col in range(size)], {1: 1, 3: -1}.get(row, 0)) for row in range(size)]
+    ways += [([row * size + col for row in range(size)], 1 if col == 2 else 0) for col in range(size)]
+    ways.append(([36, 37], 0))
+    return RoadNetwork.from_ways(node_coords, ways, cell_size_m=500)
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    """Tạo cache SQLite mới trong tmp_path (mỗi lần gọi 1 file riêng)"""
+    count = [0]
+    
+    def create():
+        count[0] += 1
+        return SQLiteDistanceCache(str(tmp_path / f'cache{count[0]}.db'), str(tmp_path / f'cache{count[0]}.json'))
+    
+    return create
+
+
+@pytest.fixture
+def make_calculator(make_cache, monkeypatch):
+    """OSRMDistanceCalculator trỏ vào server, không giới hạn tốc độ, cache tạm thay cho cache chung"""
+    monkeypatch.setattr(distance_calculator, 'get_shared_cache', lambda: None)
+    
+    def create(server, mode='table', cache=None, **kwargs):
+        kwargs.setdefault('max_table_size', server.httpd.max_table_size)
+        kwargs.setdefault('retries', 0)
+        calculator = distance_calculator.OSRMDistanceCalculator(
+            base_url=server.route_url, table_url=server.table_url, mode=mode,
+            rate_limiter=TokenBucket(1000, capacity=100), **kwargs)
+        calculator.cache = cache if cache is not None else make_cache()
+        return calculator
+    
+    return create
+
+
+@pytest.fixture
+def quiet():
+    """Tắt print của calculator / solver trong test"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
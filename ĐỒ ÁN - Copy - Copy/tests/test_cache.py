@@ -0,0 +1,205 @@
+"""
+Cache khoảng cách: SQLite (WAL, migrate từ JSON), JSON write-behind
+"""
+import json
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from models.cache import DistanceCache, SQLiteDistanceCache, make_pair_key
+from models.geo import haversine_km
+
+HANOI = (21.0285, 105.8542)
+HAIPHONG = (20.8449, 106.6881)
+VINH = (18.6796, 105.6813)
+
+
+def sqlite_cache(tmp_path, name='cache'):
+    return SQLiteDistanceCache(str(tmp_path / f'{name}.db'), str(tmp_path / f'{name}.json'))
+
+
+def json_cache(tmp_path, **kwargs):
+    kwargs.setdefault('flush_interval', 0)
+    return DistanceCache(str(tmp_path / 'cache.json'), **kwargs)
+
+
+def test_sqlite_set_get_persists(tmp_path):
+    cache = sqlite_cache(tmp_path)
+    assert cache.get(HANOI, HAIPHONG) is None
+    cache.set(HANOI, HAIPHONG, 120.5, names=('Hà Nội', 'Hải Phòng'))
+    assert cache.set_many([(HANOI, VINH, 300.0), (VINH, HANOI, 301.0, ('Vinh', 'Hà Nội'))]) == 2
+    
+    reopened = sqlite_cache(tmp_path)
+    assert reopened.get(HANOI, HAIPHONG) == 120.5
+    assert reopened.get(VINH, HANOI) == 301.0
+    assert reopened.has(HANOI, VINH) and not reopened.has(HAIPHONG, HANOI)
+    assert reopened.get_stats()['total_entries'] == 3
+
+
+def test_sqlite_transaction_rolls_back(tmp_path):
+    cache = sqlite_cache(tmp_path)
+    with pytest.raises(RuntimeError):
+        with cache.transaction():
+            cache.set(HANOI, HAIPHONG, 120.5)
+            raise RuntimeError('lỗi giữa transaction')
+    assert cache.get(HANOI, HAIPHONG) is None
+
+
+def test_sqlite_migrates_json_once(tmp_path):
+    json_file = tmp_path / 'cache.json'
+    json_file.write_text(json.dumps({
+        make_pair_key(HANOI, HAIPHONG): {'km': 120.5, 'from': 'Hà Nội', 'to': 'Hải Phòng'},
+        make_pair_key(HANOI, VINH): 300.0,
+        'Hà Nội__to__Vinh': 299.0
+    }), encoding='utf-8')
+    
+    cache = sqlite_cache(tmp_path)
+    assert cache.get(HANOI, HAIPHONG) == 120.5
+    assert cache.get(HANOI, VINH) == 300.0
+    assert cache.get_stats()['total_entries'] == 3
+    
+    # JSON đổi sau khi đã migrate → không import lại
+    json_file.write_text(json.dumps({make_pair_key(VINH, HANOI): 1.0}), encoding='utf-8')
+    assert sqlite_cache(tmp_path).get(VINH, HANOI) is None
+
+
+def test_json_write_behind_batches_writes(tmp_path):
+    cache = json_cache(tmp_path)
+    cache.set(HANOI, HAIPHONG, 120.5)
+    cache.set_many([(HANOI, VINH, 300.0), (VINH, HANOI, 301.0)])
+    # Chưa flush → chưa ghi file
+    assert not cache.cache_file.exists()
+    assert cache.get_stats()['dirty_entries'] == 3
+    
+    cache.flush()
+    cache.flush()
+    assert cache.writes == 1
+    assert json_cache(tmp_path).get(VINH, HANOI) == 301.0
+    # Ghi qua file tạm + os.replace: không để lại file .tmp
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['cache.json']
+
+
+def test_json_write_through(tmp_path):
+    cache = json_cache(tmp_path, write_behind=False)
+    cache.set(HANOI, HAIPHONG, 120.5)
+    assert cache.writes == 1
+    assert json_cache(tmp_path).get(HANOI, HAIPHONG) == 120.5
+
+
+def test_json_corrupt_file_moved_aside(tmp_path, capsys):
+    (tmp_path / 'cache.json').write_text('{"cắt ngang', encoding='utf-8')
+    cache = json_cache(tmp_path)
+    assert cache.get_stats()['total_entries'] == 0
+    assert (tmp_path / 'cache.json.corrupt').read_text(encoding='utf-8') == '{"cắt ngang'
+    assert 'bị hỏng' in capsys.readouterr().out
+
+
+def test_json_two_instances_keep_each_others_writes(tmp_path):
+    first = json_cache(tmp_path)
+    second = json_cache(tmp_path)
+    first.set(HANOI, HAIPHONG, 120.5)
+    first.flush()
+    second.set(HANOI, VINH, 300.0)
+    second.flush()
+    
+    on_disk = json.loads((tmp_path / 'cache.json').read_text(encoding='utf-8'))
+    assert set(on_disk) == {make_pair_key(HANOI, HAIPHONG), make_pair_key(HANOI, VINH)}
+    assert second.get(HANOI, HAIPHONG) == 120.5
+
+
+def test_json_lookup_sees_other_process_write(tmp_path):
+    reader = json_cache(tmp_path, reload_check_interval=0)
+    writer = json_cache(tmp_path)
+    assert reader.get(HANOI, HAIPHONG) is None
+    writer.set(HANOI, HAIPHONG, 120.5)
+    writer.flush()
+    assert reader.get(HANOI, HAIPHONG) == 120.5
+    assert reader.reloads == 1
+
+
+def test_json_reload_keeps_unsaved_entries(tmp_path):
+    reader = json_cache(tmp_path, reload_check_interval=0)
+    writer = json_cache(tmp_path)
+    reader.set(VINH, HANOI, 301.0)
+    writer.set(HANOI, HAIPHONG, 120.5)
+    writer.flush()
+    assert reader.get(HANOI, HAIPHONG) == 120.5
+    assert reader.get(VINH, HANOI) == 301.0
+    assert reader.get_stats()['dirty_entries'] == 1
+
+
+def test_shared_cache_is_one_object(tmp_path, monkeypatch):
+    from models import cache as cache_module
+    monkeypatch.setattr(cache_module, '_shared_caches', {})
+    monkeypatch.setattr(cache_module, 'create_distance_cache', lambda backend=None: json_cache(tmp_path))
+    assert cache_module.get_shared_cache('json') is cache_module.get_shared_cache('json')
+
+
+def test_pair_key_by_rounded_coordinates_and_profile():
+    key = make_pair_key(HANOI, HAIPHONG, 'driving')
+    assert key == '21.02850,105.85420;20.84490,106.68810@driving'
+    # Lệch dưới độ chính xác làm tròn → cùng key; đổi chiều / profile → key khác
+    assert make_pair_key((21.028501, 105.854199), HAIPHONG, 'driving') == key
+    assert make_pair_key(HAIPHONG, HANOI, 'driving') != key
+    assert make_pair_key(HANOI, HAIPHONG, 'cycling') != key
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_migrate_legacy_name_keys(tmp_path, backend):
+    entries = {'Hà Nội__to__Vinh': 299.0, 'Hà Nội__to__Atlantis': 1.0}
+    (tmp_path / 'cache.json').write_text(json.dumps(entries), encoding='utf-8')
+    # SQLite import các key cũ từ JSON lúc mở lần đầu
+    cache = json_cache(tmp_path) if backend == 'json' else sqlite_cache(tmp_path)
+    
+    assert cache.migrate_legacy_keys({'Hà Nội': HANOI, 'Vinh': VINH}) == 1
+    assert cache.get(HANOI, VINH) == 299.0
+    # Cặp không biết tọa độ được giữ nguyên
+    assert cache.get_stats()['total_entries'] == 2
+    assert cache.migrate_legacy_keys({'Hà Nội': HANOI, 'Vinh': VINH}) == 0
+
+
+def open_and_write(paths):
+    db_file, json_file = paths
+    SQLiteDistanceCache(db_file, json_file).set(HANOI, VINH, 300.0)
+    return True
+
+
+def test_sqlite_upgrades_old_schema_from_many_processes(tmp_path):
+    db_file = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE distances (key TEXT PRIMARY KEY, distance REAL NOT NULL) WITHOUT ROWID')
+    conn.execute('INSERT INTO distances VALUES (?, ?)', (make_pair_key(HANOI, HAIPHONG), 120.5))
+    conn.commit()
+    conn.close()
+    
+    with ProcessPoolExecutor(max_workers=6) as executor:
+        assert all(executor.map(open_and_write, [(db_file, str(tmp_path / 'none.json'))] * 6))
+    
+    cache = SQLiteDistanceCache(db_file, str(tmp_path / 'none.json'))
+    columns = {row[1] for row in sqlite3.connect(db_file).execute('PRAGMA table_info(distances)')}
+    assert {name for name, _ in SQLiteDistanceCache.METADATA_COLUMNS} <= columns
+    assert cache.get(HANOI, HAIPHONG) == 120.5
+    assert cache.get(HANOI, VINH) == 300.0
+
+
+def shifted(coord, meters_north):
+    return (coord[0] + meters_north / 111320, coord[1])
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_get_approx_within_tolerance(tmp_path, backend):
+    cache = json_cache(tmp_path) if backend == 'json' else sqlite_cache(tmp_path)
+    cache.set(HANOI, VINH, 400.0)
+    near_hanoi, near_vinh = shifted(HANOI, 60), shifted(VINH, -80)
+    
+    approx = cache.get_approx(near_hanoi, near_vinh, 200)
+    # Giữ nguyên hệ số đường đi / đường chim bay của cặp đã cache
+    expected = 400.0 * haversine_km(near_hanoi, near_vinh) / haversine_km(HANOI, VINH)
+    assert approx['distance'] == pytest.approx(expected)
+    assert approx['cached_distance'] == 400.0
+    assert approx['matched_key'] == make_pair_key(HANOI, VINH)
+    assert max(approx['offset_m']) == pytest.approx(80, abs=1)
+    
+    assert cache.get_approx(near_hanoi, near_vinh, 50) is None
+    assert cache.get_approx(near_vinh, near_hanoi, 200) is None
@@ -0,0 +1,59 @@
+"""
+ContractionHierarchy: truy vấn bucket nhiều-nhiều khớp Dijkstra, lưu / đọc lại bằng mmap
+"""
+import math
+
+import numpy as np
+import pytest
+
+from models.contraction_hierarchy import ContractionHierarchy
+from models.distance_calculator import RoadNetworkDistanceCalculator
+
+
+def dijkstra_table(network, sources, targets):
+    table = np.full((len(sources), len(targets)), np.inf)
+    for i, source in enumerate(sources):
+        found = network.shortest_distances(source, targets)
+        for j, target in enumerate(targets):
+            table[i][j] = found.get(target, math.inf)
+    return table
+
+
+@pytest.mark.parametrize('witness_limit', [50, 1])
+def test_many_to_many_matches_dijkstra(road_network, quiet, witness_limit):
+    hierarchy = ContractionHierarchy.build(road_network, witness_limit=witness_limit)
+    nodes = list(range(road_network.n_nodes))
+    
+    table = hierarchy.many_to_many(nodes, nodes)
+    np.testing.assert_allclose(table, dijkstra_table(road_network, nodes, nodes))
+    # Mỗi cạnh chỉ đi lên node rank cao hơn
+    up_indptr, up_indices, _ = hierarchy.up
+    for u in nodes:
+        assert all(hierarchy.rank[v] > hierarchy.rank[u] for v in up_indices[up_indptr[u]:up_indptr[u + 1]])
+    assert hierarchy.distance(36, 0) == math.inf
+
+
+def test_save_load_mmap(road_network, tmp_path, quiet):
+    hierarchy = ContractionHierarchy.build(road_network)
+    hierarchy.save(str(tmp_path / 'ch'))
+    loaded = ContractionHierarchy.load(str(tmp_path / 'ch'))
+    
+    assert (loaded.n_nodes, loaded.n_edges) == (hierarchy.n_nodes, hierarchy.n_edges)
+    sources, targets = [0, 7, 20, 36], [35, 2, 29, 37]
+    np.testing.assert_array_equal(loaded.many_to_many(sources, targets), hierarchy.many_to_many(sources, targets))
+
+
+def test_calculator_uses_hierarchy(road_network, tmp_path, quiet):
+    graph_file = str(tmp_path / 'grid.npz')
+    road_network.save(graph_file)
+    ch_dir = str(tmp_path / 'ch')
+    dijkstra = RoadNetworkDistanceCalculator(graph_file=graph_file, ch_dir=None)
+    ContractionHierarchy.build(dijkstra.network).save(ch_dir)
+    with_ch = RoadNetworkDistanceCalculator(graph_file=graph_file, ch_dir=ch_dir)
+    assert with_ch.hierarchy is not None
+    
+    cities = {f'N{k}': (road_network.lat[k], road_network.lng[k]) for k in [0, 9, 17, 30, 35]}
+    np.testing.assert_allclose(with_ch.get_distance_matrix(cities, symmetric=False),
+                               dijkstra.get_distance_matrix(cities, symmetric=False))
+    # Cả ma trận bằng 1 truy vấn bucket thay vì 1 lần Dijkstra mỗi nguồn
+    assert (with_ch.api_calls, dijkstra.api_calls) == (1, 5)
@@ -0,0 +1,176 @@
+"""
+OSRMDistanceCalculator trên fake OSRM server: table (chia khối) vs route, cache, bản async
+"""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+import fake_osrm_server
+from models.distance_calculator import pair_flight
+from models.distance_matrix import canonical_pair
+from models.geo import estimate_distance_matrix
+
+
+def server_matrix(cities):
+    """Ma trận km mà fake server trả về (theo đúng chiều i → j)"""
+    coords = [(lng, lat) for lat, lng in cities.values()]
+    return np.array([[0.0 if i == j else fake_osrm_server.fake_road_distance(a, b) / 1000
+                      for j, b in enumerate(coords)] for i, a in enumerate(coords)])
+
+
+@pytest.mark.parametrize('max_table_size', [3, 100])
+def test_table_matches_route_asymmetric(cities, asymmetric_road, fake_server, make_calculator, quiet, max_table_size):
+    server = fake_server(max_table_size=max_table_size)
+    table = make_calculator(server, mode='table').get_distance_matrix(cities, symmetric=False)
+    route = make_calculator(server, mode='route').get_distance_matrix(cities, symmetric=False)
+    
+    expected = server_matrix(cities)
+    assert not np.allclose(expected, expected.T)
+    np.testing.assert_allclose(table, expected)
+    np.testing.assert_allclose(route, expected)
+    if max_table_size < len(cities):
+        assert server.request_counts['table'] > 1
+
+
+def test_table_matches_route_symmetric(cities, asymmetric_road, fake_server, make_calculator, quiet):
+    """Chế độ đối xứng: mỗi cặp lấy đúng 1 chiều (canonical_pair) ở cả table lẫn route"""
+    server = fake_server(max_table_size=3)
+    table_calc = make_calculator(server, mode='table')
+    table = table_calc.get_distance_matrix(cities, symmetric=True)
+    route = make_calculator(server, mode='route').get_distance_matrix(cities, symmetric=True)
+    
+    np.testing.assert_allclose(table, table.T)
+    np.testing.assert_allclose(table, route)
+    
+    coords = list(cities.values())
+    expected = server_matrix(cities)
+    for i in range(len(coords)):
+        for j in range(i + 1, len(coords)):
+            a, b = canonical_pair(i, j, coords)
+            assert table[i][j] == pytest.approx(expected[a][b])
+            # Cache lưu ô theo đúng chiều đã hỏi server
+            assert table_calc.cache.get(coords[a], coords[b], table_calc.profile) == pytest.approx(expected[a][b])
+
+
+@pytest.mark.parametrize('mode', ['table', 'route'])
+def test_outage_falls_back_to_estimates(cities, fake_server, make_calculator, quiet, mode):
+    server = fake_server(error_rate=1.0)
+    calculator = make_calculator(server, mode=mode)
+    matrix = calculator.get_distance_matrix(cities, symmetric=False)
+    
+    n = len(cities)
+    estimates = estimate_distance_matrix(list(cities.values()))
+    np.testing.assert_allclose(matrix, estimates)
+    assert set(calculator.cell_sources.values()) == {'estimate'}
+    assert len(calculator.cell_sources) == n * (n - 1)
+    # Ước lượng không bao giờ được ghi vào cache
+    assert calculator.cache.get_stats()['total_entries'] == 0
+    if mode == 'route':
+        # Breaker mở sau vài lỗi → không gọi server cho từng ô
+        assert server.request_counts['route'] < n * (n - 1)
+
+
+@pytest.mark.parametrize('mode', ['table', 'route'])
+def test_cache_fill(cities, fake_server, make_calculator, quiet, mode):
+    server = fake_server(max_table_size=4)
+    calculator = make_calculator(server, mode=mode)
+    first = calculator.get_distance_matrix(cities, symmetric=False)
+    
+    n = len(cities)
+    assert calculator.cache.get_stats()['total_entries'] == n * (n - 1)
+    assert set(calculator.cell_sources.values()) == {'osrm'}
+    requests = server.request_counts
+    
+    second_calc = make_calculator(server, mode=mode, cache=calculator.cache)
+    second = second_calc.get_distance_matrix(cities, symmetric=False)
+    np.testing.assert_allclose(second, first)
+    assert server.request_counts == requests
+    assert second_calc.api_calls == 0
+    assert set(second_calc.cell_sources.values()) == {'disk'}
+
+
+@pytest.mark.parametrize('mode', ['table', 'route'])
+def test_async_matches_sync(cities, asymmetric_road, fake_server, make_calculator, quiet, mode):
+    server = fake_server(max_table_size=3)
+    sync = make_calculator(server, mode=mode).get_distance_matrix(cities, symmetric=False)
+    requests = server.request_counts
+    
+    calculator = make_calculator(server, mode=mode)
+    matrix = asyncio.run(calculator.get_distance_matrix_async(cities, symmetric=False))
+    np.testing.assert_allclose(matrix, sync)
+    # Chế độ table vẫn gom ô thành request table, không gọi /route từng cặp
+    assert set(server.request_counts) == {mode}
+    assert server.request_counts[mode] - requests[mode] == calculator.api_calls
+
+
+def track_concurrency(calculator):
+    """Bọc _fetch_unit để đếm số request đang chạy cùng lúc: trả về dict thống kê"""
+    stats = {'running': 0, 'peak': 0, 'started': 0}
+    lock = threading.Lock()
+    fetch_unit = calculator._fetch_unit
+    
+    def tracked(*args):
+        with lock:
+            stats['running'] += 1
+            stats['started'] += 1
+            stats['peak'] = max(stats['peak'], stats['running'])
+        try:
+            return fetch_unit(*args)
+        finally:
+            with lock:
+                stats['running'] -= 1
+    
+    calculator._fetch_unit = tracked
+    return stats
+
+
+def test_async_timeout_keeps_concurrency_bound(cities, fake_server, make_calculator, quiet):
+    server = fake_server(latency=0.2)
+    calculator = make_calculator(server, mode='route')
+    stats = track_concurrency(calculator)
+    few = dict(list(cities.items())[:4])
+    
+    matrix = asyncio.run(calculator.get_distance_matrix_async(few, max_concurrency=2, timeout=0.05, symmetric=False))
+    # Mọi request quá hạn → ước lượng, nhưng thread chạy nốt vẫn giữ chỗ
+    assert set(calculator.cell_sources.values()) == {'estimate'}
+    assert stats['peak'] <= 2
+    np.testing.assert_allclose(matrix, estimate_distance_matrix(list(few.values())))
+
+
+def test_async_cancel(cities, fake_server, make_calculator, quiet):
+    server = fake_server(latency=0.2)
+    calculator = make_calculator(server, mode='route')
+    stats = track_concurrency(calculator)
+    
+    async def cancel_early():
+        task = asyncio.ensure_future(calculator.get_distance_matrix_async(cities, max_concurrency=2, symmetric=False))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    
+    asyncio.run(cancel_early())
+    n = len(cities)
+    assert stats['started'] <= 2 < n * (n - 1)
+    # Không để lại cặp nào "đang lấy" trong pair_flight
+    assert pair_flight.get_stats()['in_flight'] == 0
+
+
+def test_snap_tolerance_reuses_nearby_cells(cities, fake_server, make_calculator, quiet):
+    server = fake_server()
+    calculator = make_calculator(server)
+    calculator.get_distance_matrix(cities, symmetric=False)
+    requests = server.request_counts
+    
+    # Mỗi thành phố dịch ~50 m về phía bắc
+    moved = {name: (lat + 0.00045, lng) for name, (lat, lng) in cities.items()}
+    snapping = make_calculator(server, cache=calculator.cache, snap_tolerance_m=200)
+    matrix = snapping.get_distance_matrix(moved, symmetric=False)
+    
+    n = len(cities)
+    assert server.request_counts == requests
+    assert len(snapping.approximate_cells) == n * (n - 1)
+    assert set(snapping.cell_sources.values()) == {'disk'}
+    np.testing.assert_allclose(matrix, server_matrix(moved), rtol=1e-3)
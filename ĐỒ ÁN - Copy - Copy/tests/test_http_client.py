@@ -0,0 +1,68 @@
+"""
+Circuit breaker, timeout thích ứng, retry của request_json (trên fake OSRM server)
+"""
+import pytest
+import requests
+
+from models.http_client import (AdaptiveTimeout, CircuitBreaker, RemoteUnavailable, backoff_delay,
+                                request_json)
+
+
+def test_breaker_opens_probes_and_closes(quiet):
+    breaker = CircuitBreaker('osrm', failure_threshold=3, cooldown=0)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.get_stats()['trips'] == 1
+    
+    # Hết cooldown → đúng 1 request thăm dò
+    assert breaker.allow() and not breaker.allow()
+    assert breaker.state == 'half_open'
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.get_stats()['trips'] == 2
+    
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow() and breaker.allow()
+
+
+def test_adaptive_timeout_bounds():
+    policy = AdaptiveTimeout(min_timeout=0.5, max_timeout=10)
+    assert policy.timeout == 10
+    for _ in range(20):
+        policy.observe(0.01)
+    assert policy.timeout == 0.5
+    policy.observe_timeout()
+    assert policy.timeout == 1.0
+    for _ in range(10):
+        policy.observe_timeout()
+    assert policy.timeout == 10
+
+
+def test_backoff_delay_full_jitter():
+    delays = [backoff_delay(3, base=0.1, cap=0.5) for _ in range(200)]
+    assert 0 <= min(delays) and max(delays) <= 0.5
+    assert max(backoff_delay(1, base=0.1, cap=5) for _ in range(200)) <= 0.2
+
+
+def test_request_json_retries_then_trips(fake_server, quiet):
+    server = fake_server(error_rate=1.0)
+    breaker = CircuitBreaker('fake', failure_threshold=2, cooldown=60)
+    url = f"{server.route_url}/105.8,21.0;106.6,20.8"
+    session = requests.Session()
+    
+    for _ in range(2):
+        with pytest.raises(RemoteUnavailable) as error:
+            request_json(session, url, breaker=breaker, retries=1, max_timeout=1)
+        assert not error.value.circuit_open
+    # Mỗi lỗi = 1 request đã hết số lần thử (1 + 1 retry)
+    assert server.request_counts['route'] == 4
+    
+    with pytest.raises(RemoteUnavailable) as error:
+        request_json(session, url, breaker=breaker, retries=1)
+    assert error.value.circuit_open
+    assert server.request_counts['route'] == 4
+    
+    server.httpd.error_rate = 0.0
+    assert request_json(session, url, breaker=CircuitBreaker('fake2'))['code'] == 'Ok'
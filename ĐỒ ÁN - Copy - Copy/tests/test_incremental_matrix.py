@@ -0,0 +1,66 @@
+"""
+IncrementalDistanceMatrix: thêm / xóa / đổi thứ tự thành phố chỉ lấy các ô cần thiết
+"""
+import numpy as np
+import pytest
+
+from models.incremental_matrix import IncrementalDistanceMatrix
+
+
+def full_matrix(make_calculator, server, cities, symmetric):
+    return make_calculator(server).get_distance_matrix(cities, symmetric=symmetric)
+
+
+@pytest.mark.parametrize('symmetric', [False, True])
+def test_edits_match_full_matrix(cities, asymmetric_road, fake_server, make_calculator, quiet, symmetric):
+    server = fake_server(max_table_size=3)
+    live = IncrementalDistanceMatrix(make_calculator(server), symmetric=symmetric)
+    names = list(cities)
+    
+    live.sync({name: cities[name] for name in names[:4]})
+    fetched = live.cells_fetched
+    assert live.sync(cities) == (names[4:], [])
+    # Chỉ lấy hàng + cột của 3 thành phố mới
+    new_cells = 7 * 6 - 4 * 3
+    assert live.cells_fetched - fetched == (new_cells // 2 if symmetric else new_cells)
+    
+    edited = {name: cities[name] for name in reversed(names) if name != 'Nam Định'}
+    fetched = live.cells_fetched
+    matrix = live.snapshot(edited)
+    assert live.cells_fetched == fetched
+    assert live.names == list(edited)
+    np.testing.assert_allclose(matrix, full_matrix(make_calculator, server, edited, symmetric))
+    assert set(matrix.source_counts()) == {'osrm'}
+
+
+@pytest.mark.parametrize('symmetric', [False, True])
+def test_estimates_refetched_after_outage(cities, fake_server, make_calculator, quiet, symmetric):
+    server = fake_server(error_rate=1.0)
+    live = IncrementalDistanceMatrix(make_calculator(server), symmetric=symmetric)
+    names = list(cities)
+    first = {name: cities[name] for name in names[:5]}
+    
+    assert set(live.snapshot(first).source_counts()) == {'estimate'}
+    
+    # Server hoạt động lại: thêm thành phố → ô ước lượng cũ đi cùng hàng/cột mới
+    server.httpd.error_rate = 0.0
+    matrix = live.snapshot(cities)
+    assert set(matrix.source_counts()) == {'osrm'}
+    np.testing.assert_allclose(matrix, full_matrix(make_calculator, server, cities, symmetric))
+    
+    # Không còn ô ước lượng → sync không gọi thêm
+    fetched = live.cells_fetched
+    live.sync(cities)
+    assert live.cells_fetched == fetched
+
+
+def test_snapshot_without_edits_refetches_estimates(cities, fake_server, make_calculator, quiet):
+    server = fake_server(error_rate=1.0)
+    live = IncrementalDistanceMatrix(make_calculator(server), symmetric=False)
+    assert set(live.snapshot(cities).source_counts()) == {'estimate'}
+    
+    server.httpd.error_rate = 0.0
+    n = len(cities)
+    # Cùng danh sách thành phố → vẫn lấy lại các ô ước lượng
+    assert live.snapshot(cities).source_counts() == {'osrm': n * (n - 1)}
+    assert live.refresh_estimates() == 0
@@ -0,0 +1,72 @@
+"""
+Memo ma trận (MatrixCache): LRU, dựng 1 lần cho request đồng thời, không giữ ma trận ước lượng
+"""
+import threading
+import time
+
+import numpy as np
+
+from models.distance_matrix import DistanceMatrix
+from models.matrix_cache import MatrixCache, matrix_fingerprint
+
+
+def matrix_with_sources(source):
+    sources = np.full((3, 3), source, dtype=object)
+    np.fill_diagonal(sources, None)
+    return DistanceMatrix(np.ones((3, 3)) - np.eye(3), sources=sources)
+
+
+def test_fingerprint_depends_on_order_and_context():
+    cities = {'A': (21.0, 105.8), 'B': (20.8, 106.7)}
+    key = matrix_fingerprint(cities, 'osrm', True)
+    assert matrix_fingerprint(dict(cities), 'osrm', True) == key
+    assert matrix_fingerprint(dict(reversed(list(cities.items()))), 'osrm', True) != key
+    assert matrix_fingerprint(cities, 'osrm', False) != key
+
+
+def test_lru_eviction_and_read_only():
+    cache = MatrixCache(max_size=2)
+    for key in 'abc':
+        cache.put(key, np.zeros((2, 2)))
+    assert cache.get('a') is None
+    matrix, info = cache.get('b')
+    assert not matrix.flags.writeable and info == {}
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['hit_rate'] == 50.0
+
+
+def test_concurrent_requests_compute_once():
+    cache = MatrixCache()
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return matrix_with_sources('osrm'), {}
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('k', compute)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(hit for _, _, hit in results) == [False, True, True, True]
+
+
+def test_matrix_with_estimates_not_memoized():
+    cache = MatrixCache()
+    sources = iter(['estimate', 'haversine', 'osrm'])
+    
+    def compute():
+        return matrix_with_sources(next(sources)), {}
+    
+    # Provider lỗi → ô ước lượng: lần sau phải dựng lại để lấy số thật
+    assert cache.get_or_compute('k', compute)[2] is False
+    assert cache.get_or_compute('k', compute)[2] is False
+    matrix, _, hit = cache.get_or_compute('k', compute)
+    assert not hit and matrix.source_counts() == {'osrm': 6}
+    assert cache.get_or_compute('k', compute)[2] is True
+    assert cache.get_stats()['skipped'] == 2
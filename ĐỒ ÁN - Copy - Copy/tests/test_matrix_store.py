@@ -0,0 +1,72 @@
+"""
+MatrixStore: ma trận .npy + file JSON, đọc lại bằng mmap; app không lưu ma trận có ô ước lượng
+"""
+import numpy as np
+
+import app
+from models.distance_matrix import DistanceMatrix
+from models.matrix_store import MatrixStore
+
+CITIES = {'Hà Nội': (21.0285, 105.8542), 'Hải Phòng': (20.8449, 106.6881), 'Vinh': (18.6796, 105.6813)}
+
+
+def make_matrix(source='osrm'):
+    sources = np.full((3, 3), source, dtype=object)
+    np.fill_diagonal(sources, None)
+    data = np.array([[0.0, 120.5, 300.0], [121.0, 0.0, 350.0], [301.0, 349.0, 0.0]])
+    return DistanceMatrix(data, sources=sources)
+
+
+def mapped_from_file(array):
+    """True nếu array là view (qua các lớp .base) của 1 np.memmap"""
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_save_load_mmap(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    matrix = DistanceMatrix(make_matrix(), symmetric=True)
+    store.save('abc', matrix, CITIES, {'approximate_cells': []})
+    
+    loaded, info = store.load('abc', CITIES)
+    np.testing.assert_array_equal(loaded, matrix)
+    assert loaded.symmetric and info == {'approximate_cells': []}
+    # Dữ liệu trỏ vào file đã map, không copy và không sửa được
+    assert mapped_from_file(loaded) and not loaded.flags.writeable
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['abc.json', 'abc.npy']
+    assert store.get_stats()['matrices'] == 1
+
+
+def test_load_rejects_other_cities_and_bad_files(tmp_path):
+    store = MatrixStore(str(tmp_path))
+    store.save('abc', make_matrix(), CITIES)
+    
+    assert store.load('missing') is None
+    moved = dict(CITIES, Vinh=(18.7, 105.7))
+    assert store.load('abc', moved) is None
+    # File .npy sai kích thước (vd bị ghi đè) → coi như chưa lưu
+    np.save(tmp_path / 'abc.npy', np.zeros((2, 2)))
+    assert store.load('abc', CITIES) is None
+
+
+def test_app_does_not_store_estimated_matrix(tmp_path, monkeypatch, capsys):
+    store = MatrixStore(str(tmp_path))
+    monkeypatch.setattr(app, 'matrix_store', store)
+    sources = iter(['estimate', 'osrm'])
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        return make_matrix(next(sources)), {'approximate_cells': []}
+    
+    # Provider lỗi → không lưu, lần sau tính lại
+    app.load_or_build_matrix('abc', CITIES, compute)
+    assert not store.has('abc')
+    app.load_or_build_matrix('abc', CITIES, compute)
+    assert store.has('abc')
+    
+    matrix, info = app.load_or_build_matrix('abc', CITIES, compute)
+    assert len(calls) == 2
+    assert info['distance_sources'] == {'osrm': 6}
+    assert info['neighbors'].nearest[0] == [1, 2]
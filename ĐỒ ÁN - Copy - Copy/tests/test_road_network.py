@@ -0,0 +1,110 @@
+"""
+RoadNetwork (graph CSR, node gần nhất, Dijkstra) và provider RoadNetworkDistanceCalculator
+"""
+import math
+
+import numpy as np
+import pytest
+
+from models.distance_calculator import RoadNetworkDistanceCalculator
+from models.geo import estimate_distance_matrix, haversine_km
+from models.road_network import RoadNetwork
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="21.00" lon="105.80"/>
+  <node id="2" lat="21.00" lon="105.81"/>
+  <node id="3" lat="21.01" lon="105.81"/>
+  <node id="4" lat="21.01" lon="105.80"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="primary"/></way>
+  <way id="11"><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/><tag k="oneway" v="yes"/></way>
+  <way id="12"><nd ref="3"/><nd ref="4"/><nd ref="1"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+def all_pairs_km(network):
+    """Floyd-Warshall trên graph CSR - đáp án chuẩn cho Dijkstra / CH"""
+    n = network.n_nodes
+    dist = np.full((n, n), np.inf)
+    np.fill_diagonal(dist, 0.0)
+    for u in range(n):
+        for k in range(network.indptr[u], network.indptr[u + 1]):
+            v = network.indices[k]
+            dist[u][v] = min(dist[u][v], network.weights[k])
+    for k in range(n):
+        dist = np.minimum(dist, dist[:, k:k + 1] + dist[k:k + 1, :])
+    return dist
+
+
+def test_dijkstra_matches_all_pairs(road_network):
+    expected = all_pairs_km(road_network)
+    # Phố một chiều → graph có hướng
+    assert not np.allclose(expected[:36, :36], expected[:36, :36].T)
+    for source in range(road_network.n_nodes):
+        found = road_network.shortest_distances(source, range(road_network.n_nodes))
+        reachable = {target for target in range(road_network.n_nodes) if math.isfinite(expected[source][target])}
+        assert set(found) == reachable
+        for target, km in found.items():
+            assert km == pytest.approx(expected[source][target])
+
+
+def test_nearest_node(road_network):
+    rng = np.random.default_rng(1)
+    for lat, lng in rng.uniform([20.99, 105.79], [21.06, 105.86], (20, 2)):
+        node, meters = road_network.nearest_node((lat, lng))
+        distances = [haversine_km((lat, lng), (road_network.lat[k], road_network.lng[k])) for k in range(road_network.n_nodes)]
+        assert node == int(np.argmin(distances))
+        assert meters == pytest.approx(min(distances) * 1000)
+    
+    assert road_network.nearest_node((21.1, 105.9), max_distance_m=1000) == (None, None)
+    # Không giới hạn khoảng cách → vẫn tìm được node dù ngoài vùng lưới quanh điểm
+    assert road_network.nearest_node((21.1, 105.9))[0] is not None
+
+
+def test_osm_xml_drivable_ways_and_oneway(tmp_path):
+    path = tmp_path / 'mini.osm'
+    path.write_text(OSM_XML, encoding='utf-8')
+    network = RoadNetwork.from_file(str(path))
+    
+    # footway bị bỏ → node 4 không có trong graph
+    assert network.n_nodes == 3
+    assert network.n_edges == 3
+    a, b, c = (network.nearest_node(coord)[0] for coord in [(21.0, 105.8), (21.0, 105.81), (21.01, 105.81)])
+    assert network.shortest_distances(a, [c])[c] == pytest.approx(
+        haversine_km((21.0, 105.8), (21.0, 105.81)) + haversine_km((21.0, 105.81), (21.01, 105.81)))
+    assert network.shortest_distances(c, [a, b]) == {}
+
+
+def test_save_load_roundtrip(road_network, tmp_path):
+    path = str(tmp_path / 'grid.npz')
+    road_network.save(path)
+    loaded = RoadNetwork.from_file(path)
+    np.testing.assert_array_equal(loaded.indices, road_network.indices)
+    # Trọng số lưu float32 → sai số rất nhỏ
+    np.testing.assert_allclose(loaded.weights, road_network.weights, rtol=1e-6)
+    assert loaded.shortest_distances(0, [35])[35] == pytest.approx(road_network.shortest_distances(0, [35])[35], rel=1e-6)
+
+
+def test_calculator_road_distances_and_fallback(road_network, tmp_path, quiet):
+    path = str(tmp_path / 'grid.npz')
+    road_network.save(path)
+    calculator = RoadNetworkDistanceCalculator(graph_file=path, snap_max_m=300, ch_dir=None)
+    expected = all_pairs_km(RoadNetwork.load(path))
+    
+    nodes = [0, 14, 35, 36]
+    cities = {f'N{k}': (road_network.lat[k], road_network.lng[k]) for k in nodes}
+    cities['Xa'] = (21.5, 106.5)
+    matrix = calculator.get_distance_matrix(cities, symmetric=False)
+    
+    estimates = estimate_distance_matrix(list(cities.values()))
+    for i, a in enumerate(nodes):
+        for j, b in enumerate(nodes):
+            if i != j:
+                reachable = math.isfinite(expected[a][b])
+                assert matrix[i][j] == pytest.approx(expected[a][b] if reachable else estimates[i][j])
+                assert calculator.cell_sources[(i, j)] == ('road_network' if reachable else 'estimate')
+    # Thành phố xa graph hơn snap_max_m → ước lượng
+    assert all(calculator.cell_sources[(4, j)] == 'estimate' for j in range(4))
+    # Dijkstra gom theo nguồn: 1 lần cho mỗi thành phố gắn được vào graph
+    assert calculator.api_calls == 4
@@ -0,0 +1,82 @@
+"""
+SingleFlight: gộp các lần tính trùng đang chạy song song; pair_flight giữa nhiều calculator
+"""
+import threading
+import time
+
+import pytest
+
+from models.distance_calculator import pair_flight
+from models.single_flight import SingleFlight
+
+
+def run_threads(count, target):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(target())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_claim_and_resolve():
+    flight = SingleFlight()
+    owned, waiting = flight.claim(['a', 'b', 'a'])
+    assert owned == ['a', 'b'] and waiting == {}
+    
+    owned, waiting = flight.claim(['b', 'c'])
+    assert owned == ['c'] and set(waiting) == {'b'}
+    flight.resolve({'a': 1, 'b': 2, 'c': 3})
+    assert waiting['b'].result(timeout=1) == 2
+    assert flight.get_stats() == {'in_flight': 0, 'leaders': 3, 'coalesced': 1}
+
+
+def test_do_computes_once_for_concurrent_callers():
+    flight = SingleFlight()
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'matrix'
+    
+    results = run_threads(5, lambda: flight.do('key', compute))
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert {value for value, _ in results} == {'matrix'}
+
+
+def test_do_error_reaches_waiters_and_frees_key():
+    flight = SingleFlight()
+    started = threading.Event()
+    
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError('OSRM sập')
+    
+    leader = threading.Thread(target=lambda: pytest.raises(RuntimeError, flight.do, 'key', failing))
+    leader.start()
+    started.wait()
+    with pytest.raises(RuntimeError):
+        flight.do('key', lambda: 'không được gọi')
+    leader.join()
+    # Key đã được bỏ → lần sau tính lại
+    assert flight.do('key', lambda: 'ok') == ('ok', False)
+
+
+def test_concurrent_calculators_share_pair_fetches(cities, fake_server, make_calculator, quiet):
+    server = fake_server(latency=0.05)
+    calculators = [make_calculator(server, mode='route') for _ in range(3)]
+    before = pair_flight.get_stats()
+    
+    matrices = run_threads(3, lambda: calculators.pop().get_distance_matrix(cities, symmetric=False))
+    
+    n = len(cities)
+    # Mỗi calculator có cache riêng nhưng mỗi cặp chỉ được hỏi server 1 lần
+    assert server.request_counts['route'] == n * (n - 1)
+    assert all((matrix == matrices[0]).all() for matrix in matrices)
+    stats = pair_flight.get_stats()
+    assert stats['in_flight'] == 0
+    assert stats['coalesced'] - before['coalesced'] == 2 * n * (n - 1)
@@ -0,0 +1,133 @@
+"""
+Solver TSP: Held-Karp / A* tối ưu so với vét cạn, UCS / Greedy giữ nguyên kết quả của bản trước khi đổi sang state bitmask + NodeArena
+"""
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+from models.algorithms import AStarTSP, GreedyBestFirstSearchTSP, HeldKarpTSP, UniformCostSearchTSP
+from models.algorithms.heuristics import MSTHeuristic
+from models.algorithms.neighbors import NeighborLists
+from models.algorithms.state import NodeArena, visit
+
+# Kết quả của UCS / Greedy bản dùng frozenset + list đường đi trong state
+# (solver, n, seed, bất đối xứng, route, total_cost, nodes_explored, operations)
+REFERENCE_RESULTS = [
+    ('ucs', 6, 0, False, [0, 5, 4, 1, 2, 3, 0], 1499.150684, 60, 208),
+    ('ucs', 7, 1, False, [0, 5, 3, 1, 6, 4, 2, 0], 1428.787066, 170, 719),
+    ('ucs', 8, 2, False, [0, 6, 7, 3, 1, 4, 2, 5, 0], 1330.145507, 374, 1829),
+    ('ucs', 6, 0, True, [0, 5, 4, 1, 2, 3, 0], 1846.635962, 54, 188),
+    ('ucs', 7, 1, True, [0, 4, 2, 6, 3, 1, 5, 0], 1700.576545, 169, 720),
+    ('ucs', 8, 2, True, [0, 6, 7, 3, 1, 4, 2, 5, 0], 1589.20228, 369, 1788),
+    ('greedy', 6, 0, False, [0, 3, 2, 1, 4, 5, 0], 1499.150684, 29, 110),
+    ('greedy', 7, 1, False, [0, 5, 3, 1, 6, 2, 4, 0], 1396.427829, 76, 326),
+    ('greedy', 8, 2, False, [0, 5, 2, 4, 1, 3, 7, 6, 0], 1330.145507, 205, 1012),
+    ('greedy', 6, 0, True, [0, 3, 2, 1, 4, 5, 0], 2038.914383, 29, 110),
+    ('greedy', 7, 1, True, [0, 5, 3, 1, 6, 2, 4, 0], 1867.057235, 96, 423),
+    ('greedy', 8, 2, True, [0, 5, 2, 4, 1, 3, 6, 7, 0], 1766.088814, 205, 1002),
+]
+
+SOLVERS = {'ucs': UniformCostSearchTSP, 'greedy': GreedyBestFirstSearchTSP}
+
+
+def random_matrix(n, seed, asymmetric=False):
+    """Ma trận khoảng cách Euclid giữa n điểm ngẫu nhiên, tùy chọn nhân hệ số khác nhau mỗi chiều"""
+    rng = np.random.default_rng(seed)
+    points = rng.integers(0, 500, (n, 2))
+    matrix = np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+    if asymmetric:
+        matrix = matrix * rng.uniform(1, 1.5, (n, n))
+        np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def tour_cost(matrix, route):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def brute_force(matrix, start_city=0):
+    """Chi phí tour tối ưu bằng cách thử mọi hoán vị"""
+    others = [city for city in range(len(matrix)) if city != start_city]
+    return min(tour_cost(matrix, [start_city, *order, start_city]) for order in permutations(others))
+
+
+def solve(cls, matrix, start_city=0, **kwargs):
+    solver = cls(matrix, [str(i) for i in range(len(matrix))], {}, **kwargs)
+    route, cost = solver.solve(start_city=start_city)
+    return solver, route, cost
+
+
+def assert_valid_tour(route, n, start_city=0):
+    assert route[0] == route[-1] == start_city
+    assert sorted(route[:-1]) == list(range(n))
+
+
+@pytest.mark.parametrize('asymmetric', [False, True])
+@pytest.mark.parametrize('n', range(1, 9))
+def test_held_karp_matches_brute_force(n, asymmetric):
+    matrix = random_matrix(n, seed=n, asymmetric=asymmetric)
+    start_city = n // 2
+    _, route, cost = solve(HeldKarpTSP, matrix, start_city)
+    assert_valid_tour(route, n, start_city)
+    assert cost == pytest.approx(tour_cost(matrix, route))
+    assert cost == pytest.approx(brute_force(matrix, start_city))
+
+
+@pytest.mark.parametrize('asymmetric', [False, True])
+@pytest.mark.parametrize('n', range(3, 9))
+def test_astar_matches_brute_force(n, asymmetric):
+    matrix = random_matrix(n, seed=10 + n, asymmetric=asymmetric)
+    _, route, cost = solve(AStarTSP, matrix)
+    assert_valid_tour(route, n)
+    assert cost == pytest.approx(tour_cost(matrix, route))
+    assert cost == pytest.approx(brute_force(matrix))
+
+
+@pytest.mark.parametrize('asymmetric', [False, True])
+def test_mst_heuristic_is_admissible(asymmetric):
+    matrix = random_matrix(8, seed=3, asymmetric=asymmetric)
+    heuristic = MSTHeuristic(matrix.tolist(), 8)
+    assert heuristic(0, visit(0, 0), 0) <= brute_force(matrix) + 1e-9
+
+
+def test_mst_heuristic_memo_by_visited_set():
+    matrix = random_matrix(6, seed=5)
+    heuristic = MSTHeuristic(matrix.tolist(), 6, max_entries=1)
+    visited = visit(visit(0, 0), 2)
+    first = heuristic(2, visited, 0)
+    # Cùng tập đã thăm, thành phố hiện tại khác → dùng lại MST, chỉ tính lại cạnh nối
+    assert heuristic(2, visited, 0) == first
+    heuristic(0, visited, 0)
+    heuristic(1, visit(visit(0, 0), 1), 0)
+    stats = heuristic.get_stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 1)
+    assert stats['hit_rate'] == 50.0
+
+
+@pytest.mark.parametrize('name, n, seed, asymmetric, route, cost, nodes, operations', REFERENCE_RESULTS)
+def test_matches_reference(name, n, seed, asymmetric, route, cost, nodes, operations):
+    solver, result_route, result_cost = solve(SOLVERS[name], random_matrix(n, seed, asymmetric))
+    assert result_route == route
+    assert result_cost == pytest.approx(cost)
+    assert solver.nodes_explored == nodes
+    assert solver.operations == operations
+
+
+@pytest.mark.parametrize('asymmetric', [False, True])
+def test_greedy_neighbor_lists_same_result(asymmetric):
+    matrix = random_matrix(8, seed=4, asymmetric=asymmetric)
+    _, route, cost = solve(GreedyBestFirstSearchTSP, matrix)
+    _, neighbor_route, neighbor_cost = solve(GreedyBestFirstSearchTSP, matrix, neighbors=NeighborLists(matrix))
+    assert neighbor_route == route
+    assert neighbor_cost == pytest.approx(cost)
+
+
+def test_node_arena_path():
+    arena = NodeArena()
+    root = arena.add(2)
+    left = arena.add(0, root)
+    arena.add(1, root)
+    assert arena.path(arena.add(3, left)) == [2, 0, 3]
+    assert arena.path(root) == [2]
+    assert len(arena) == 4
@@ -0,0 +1,50 @@
+"""
+Benchmark số lần ghi file của DistanceCache (JSON) khi điền 1 ma trận N thành phố
+
+- before: write_behind=False → mỗi set() ghi lại toàn bộ file (cách cũ)
+- after:  write_behind=True  → set() chỉ buffer, flush() 1 lần ở cuối ma trận
+
+Cách chạy:
+    python tools/bench_cache_writes.py --sizes 10 20 30
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.cache import DistanceCache
+
+
+def fill_matrix(cache, n):
+    """Giả lập get_distance_matrix: set() từng cặp rồi flush() ở cuối"""
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                cache.set((10.0 + i * 0.01, 106.0), (10.0 + j * 0.01, 106.0), float(i * n + j),
+                          names=(f"City {i}", f"City {j}"))
+    cache.flush()
+
+
+def run(n, write_behind):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = DistanceCache(os.path.join(tmp_dir, 'cache.json'), write_behind=write_behind, flush_interval=0)
+        start = time.perf_counter()
+        fill_matrix(cache, n)
+        elapsed = time.perf_counter() - start
+        return cache.writes, cache.bytes_written, elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='So sánh số lần ghi cache JSON trước/sau write-behind')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 30])
+    args = parser.parse_args()
+    
+    print(f"{'N':>4} | {'mode':<12} | {'writes':>7} | {'bytes':>12} | {'time':>9}")
+    print('-' * 56)
+    for n in args.sizes:
+        for label, write_behind in (('before', False), ('write-behind', True)):
+            writes, bytes_written, elapsed = run(n, write_behind)
+            print(f"{n:>4} | {label:<12} | {writes:>7} | {bytes_written:>12,} | {elapsed*1000:>7.1f}ms")
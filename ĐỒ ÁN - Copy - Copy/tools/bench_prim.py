@@ -0,0 +1,77 @@
+"""
+Benchmark Prim's algorithm của heuristic A* theo số node k của tập cần tính MST
+
+- ndarray: vòng lặp cũ của AStarTSP.heuristic, đọc từng ô distance_matrix[u][v] trên ndarray
+- list:    prim_mst_cost - cùng vòng lặp trên list lồng nhau
+- numpy:   prim_mst_cost_vectorized - ma trận con + 1 np.minimum mỗi vòng
+
+Cách chạy:
+    python tools/bench_prim.py --sizes 5 10 20 30 40 60
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.algorithms.heuristics import prim_mst_cost, prim_mst_cost_vectorized
+
+
+def prim_mst_cost_ndarray(matrix, nodes):
+    """Prim như AStarTSP.heuristic bản gốc: in_mst / min_edge list, đọc ndarray từng ô"""
+    mst_cost = 0
+    in_mst = [False] * len(nodes)
+    min_edge = [float('inf')] * len(nodes)
+    min_edge[0] = 0
+    for _ in range(len(nodes)):
+        u = -1
+        for i in range(len(nodes)):
+            if not in_mst[i] and (u == -1 or min_edge[i] < min_edge[u]):
+                u = i
+        in_mst[u] = True
+        mst_cost += min_edge[u]
+        for v in range(len(nodes)):
+            if not in_mst[v]:
+                edge_cost = matrix[nodes[u]][nodes[v]]
+                if edge_cost < min_edge[v]:
+                    min_edge[v] = edge_cost
+    return mst_cost
+
+
+def time_per_call(func, matrix, nodes, min_seconds=0.2):
+    """Thời gian trung bình 1 lần gọi (µs), lặp đủ min_seconds"""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func(matrix, nodes)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='So sánh Prim đọc ndarray từng ô / list / NumPy vector hóa')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 10, 15, 20, 25, 30, 40, 50, 60])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    print(f"{'k':>4} | {'ndarray':>10} | {'list':>10} | {'numpy':>10} | {'numpy vs ndarray':>16}")
+    print('-' * 62)
+    for k in args.sizes:
+        points = rng.random((k, 2)) * 500
+        matrix = np.sqrt(((points[:, None] - points[None]) ** 2).sum(-1))
+        rows = matrix.tolist()
+        nodes = list(range(k))
+        
+        costs = (prim_mst_cost_ndarray(matrix, nodes), prim_mst_cost(rows, nodes), prim_mst_cost_vectorized(matrix, nodes))
+        assert max(costs) - min(costs) < 1e-6, costs
+        
+        ndarray_us = time_per_call(prim_mst_cost_ndarray, matrix, nodes)
+        list_us = time_per_call(prim_mst_cost, rows, nodes)
+        numpy_us = time_per_call(prim_mst_cost_vectorized, matrix, nodes)
+        print(f"{k:>4} | {ndarray_us:>8.1f}µs | {list_us:>8.1f}µs | {numpy_us:>8.1f}µs | {ndarray_us / numpy_us:>15.1f}×")
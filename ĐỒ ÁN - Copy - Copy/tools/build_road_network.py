@@ -0,0 +1,44 @@
+"""
+Chuyển bản trích OSM (.osm XML hoặc .osm.pbf) thành file .npz gọn cho provider 'road_network'
+
+File .npz chỉ giữ các node nằm trên đường ô tô đi được + graph CSR, nhỏ hơn và
+load nhanh hơn nhiều so với đọc lại file OSM mỗi lần khởi động server.
+
+Tùy chọn --ch: tiền xử lý thêm contraction hierarchy (lâu hơn nhiều, chỉ cần chạy 1 lần)
+để provider tính ma trận hàng trăm thành phố bằng 1 truy vấn nhiều-nhiều.
+
+Cách chạy:
+    python tools/build_road_network.py vietnam-latest.osm.pbf road_network.npz --ch road_network.ch
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.contraction_hierarchy import ContractionHierarchy
+from models.road_network import RoadNetwork
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tiền xử lý bản trích OSM thành graph .npz')
+    parser.add_argument('source', help='file .osm (XML) hoặc .osm.pbf')
+    parser.add_argument('output', help='file .npz đầu ra')
+    parser.add_argument('--ch', metavar='DIR', help='thư mục lưu chỉ mục contraction hierarchy')
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    network = RoadNetwork.from_file(args.source)
+    network.save(args.output)
+    elapsed = time.perf_counter() - start
+    
+    print(f"✓ {network.n_nodes:,} node, {network.n_edges:,} cạnh → {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB, {elapsed:.1f}s)")
+    
+    if args.ch:
+        start = time.perf_counter()
+        hierarchy = ContractionHierarchy.build(network)
+        hierarchy.save(args.ch)
+        elapsed = time.perf_counter() - start
+        print(f"✓ Contraction hierarchy: {hierarchy.n_edges:,} cạnh (kể cả shortcut) → {args.ch} ({elapsed:.1f}s)")
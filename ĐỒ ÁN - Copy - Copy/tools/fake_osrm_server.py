@@ -0,0 +1,187 @@
+"""
+Fake OSRM server chạy local - dùng để thử OSRMDistanceCalculator khi không có mạng
+
+Hỗ trợ 2 service giống OSRM thật:
+- GET /route/v1/driving/{lng,lat;lng,lat}
+- GET /table/v1/driving/{lng,lat;...}?sources=..&destinations=..&annotations=distance
+
+Khoảng cách = đường chim bay (haversine) × 1.3, nên kết quả luôn cố định.
+
+Cách dùng:
+    python tools/fake_osrm_server.py --port 5001 --max-table-size 100
+
+hoặc trong code:
+    with FakeOSRMServer(max_table_size=20) as server:
+        calculator = OSRMDistanceCalculator(base_url=server.route_url, table_url=server.table_url)
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+EARTH_RADIUS_M = 6371008.8
+ROAD_FACTOR = 1.3
+
+
+def fake_road_distance(coord1, coord2):
+    """Khoảng cách giả lập (mét) giữa 2 điểm (lng, lat)"""
+    lng1, lat1 = map(math.radians, coord1)
+    lng2, lat2 = map(math.radians, coord2)
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a)) * ROAD_FACTOR
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Xử lý request /route và /table"""
+    
+    def log_message(self, format, *args):
+        # Tắt log mặc định của http.server
+        pass
+    
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        
+        parsed = urlsplit(self.path)
+        parts = parsed.path.strip('/').split('/')
+        # /{service}/v1/{profile}/{coordinates}
+        if len(parts) != 4 or parts[1] != 'v1':
+            return self._send_json(400, {'code': 'InvalidUrl', 'message': 'URL string malformed'})
+        
+        service, coord_str = parts[0], parts[3]
+        try:
+            coords = [tuple(map(float, c.split(','))) for c in coord_str.split(';')]
+        except ValueError:
+            return self._send_json(400, {'code': 'InvalidQuery', 'message': 'Query string malformed'})
+        
+        with server.lock:
+            server.request_counts[service] = server.request_counts.get(service, 0) + 1
+        
+        if server.error_rate and random.random() < server.error_rate:
+            return self._send_json(503, {'code': 'ServiceUnavailable', 'message': 'Simulated outage'})
+        
+        if service == 'route':
+            return self._send_json(200, {
+                'code': 'Ok',
+                'routes': [{'distance': fake_road_distance(coords[0], coords[-1]), 'duration': 0}]
+            })
+        
+        if service == 'table':
+            if len(coords) > server.max_table_size:
+                return self._send_json(400, {'code': 'TooBig', 'message': 'Too many table coordinates'})
+            
+            query = parse_qs(parsed.query)
+            sources = self._parse_indices(query.get('sources', ['all'])[0], len(coords))
+            destinations = self._parse_indices(query.get('destinations', ['all'])[0], len(coords))
+            distances = [
+                [0.0 if s == d else fake_road_distance(coords[s], coords[d]) for d in destinations]
+                for s in sources
+            ]
+            return self._send_json(200, {'code': 'Ok', 'distances': distances})
+        
+        return self._send_json(400, {'code': 'InvalidService', 'message': f'Service {service} not found'})
+    
+    @staticmethod
+    def _parse_indices(value, n):
+        if value == 'all':
+            return list(range(n))
+        return [int(i) for i in value.split(';')]
+
+
+class _Server(ThreadingHTTPServer):
+    # Backlog mặc định (5) tràn khi calculator gửi song song nhiều request →
+    # kết nối bị bỏ, client chờ hết connect timeout
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeOSRMServer:
+    """
+    Fake OSRM HTTP server chạy trên thread riêng
+    
+    Args:
+        host, port: địa chỉ lắng nghe (port=0 → tự chọn port trống)
+        max_table_size: số tọa độ tối đa cho 1 request /table (giống --max-table-size của osrm-routed)
+        latency: độ trễ giả lập cho mỗi request (giây)
+        error_rate: tỉ lệ request trả về HTTP 503 (1.0 = giả lập server sập)
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, max_table_size=100, latency=0.0, error_rate=0.0):
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.max_table_size = max_table_size
+        self.httpd.latency = latency
+        self.httpd.error_rate = error_rate
+        self.httpd.request_counts = {}
+        self.httpd.lock = threading.Lock()
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    @property
+    def route_url(self):
+        return f"{self.base_url}/route/v1/driving"
+    
+    @property
+    def table_url(self):
+        return f"{self.base_url}/table/v1/driving"
+    
+    @property
+    def request_counts(self):
+        """Số request đã nhận theo từng service, vd {'table': 1, 'route': 0}"""
+        with self.httpd.lock:
+            return dict(self.httpd.request_counts)
+    
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake OSRM server (route + table)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--max-table-size', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help='độ trễ mỗi request (giây)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='tỉ lệ request trả về HTTP 503')
+    args = parser.parse_args()
+    
+    server = FakeOSRMServer(args.host, args.port, args.max_table_size, args.latency, args.error_rate)
+    print(f"🛰️  Fake OSRM đang chạy tại {server.base_url}")
+    print(f"   OSRM_BASE_URL  = {server.route_url}")
+    print(f"   OSRM_TABLE_URL = {server.table_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Dừng fake OSRM")
+        server.httpd.server_close()